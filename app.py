@@ -1,5 +1,298 @@
+import json
 import os
+import threading
+from functools import partial
 from sdk_machine_module.integrator_manager import IntegratorManager
+from connection.config import invalidate_config, load_config
+from dispatcher import CallFunctionDispatcher
+from error_aggregator import FIRST, ErrorAggregator, error_class, last_line
+from logger_setup import LoggerSetup
+from redis_driver import RedisDriver
+from rpc_server import create_rpc_server
+import stream_sink
+from sharding import ShardRouter, shard_channel
+from signal_catalog import load_signals_config
+
+COALESCING_FUNCTIONS = ("send_signal",)
+
+
+class S7commIntegratorManager(IntegratorManager):
+    """
+        IntegratorManager that hands call-function messages to a worker pool
+        instead of executing them on the Redis subscriber thread, and
+        subscribes with blocking reads instead of the SDK's poll-and-sleep loop.
+
+        With `shard_count` set and no `shard` the manager is the front process:
+        it serves XML-RPC and routes every message to the worker owning the
+        machine. With `shard` set it is a worker: it only listens to its own
+        shard channels and does not bind the XML-RPC port.
+
+        With `rpc_workers` set XML-RPC requests are served by a fixed pool
+        instead of a thread per request (see `rpc_server.PooledXMLRPCServer`).
+        With `streams` set monitor events and errors are also appended to
+        Redis Streams (see `stream_sink.StreamSink`); `streams["pubsub"]`
+        False stops publishing monitor events on `event_queue`.
+
+        Errors go through `error_aggregator.ErrorAggregator`: repeats of the
+        same error of a machine and function are published as periodic
+        summaries and a success publishes a `recovered` notice.
+    """
+
+    def __init__(self, *args, call_function_workers=8, calls_per_plc=1, shard=None, shard_count=0,
+                 rpc_workers=0, rpc_queue_size=64, rpc_batch_workers=8, streams=None,
+                 error_summary_interval=60.0, **kwargs):
+        self.__rpc_options = {
+            "workers": rpc_workers,
+            "queue_size": rpc_queue_size,
+            "batch_workers": rpc_batch_workers
+        }
+        self.__machine_listeners = []
+        self.__removal_listeners = []
+        self.shard = shard
+        self.shard_count = shard_count
+        self.router = None
+        self.subscriptions_ready = []
+        self.__superseded = threading.local()
+        self.error_aggregator = ErrorAggregator(self.__publish_error_notice, summary_interval=error_summary_interval)
+        self.dispatcher = CallFunctionDispatcher(
+            handler=self._run_call_function,
+            max_workers=call_function_workers,
+            max_per_plc=calls_per_plc,
+            plc_key=self._plc_key,
+            coalesce=self._coalesce_key
+        )
+        super().__init__(*args, **kwargs)
+        LoggerSetup.make_async(self._IntegratorManager__logger)
+        self.stream_sink = None
+        self.__publish_events = True
+        if streams is not None:
+            streams = dict(streams)
+            self.__publish_events = streams.pop("pubsub", True)
+            self.stream_sink = stream_sink.StreamSink(self.redis_server, **streams)
+
+    @property
+    def is_worker(self):
+        return self.shard is not None
+
+    @property
+    def module_name(self):
+        return self._IntegratorManager__module_name
+
+    @property
+    def config_file_path(self):
+        return self._IntegratorManager__config_file_path
+
+    @property
+    def redis_server(self):
+        return self._IntegratorManager__redis_driver._server
+
+    @property
+    def rpc_server(self):
+        # Workers do not serve XML-RPC
+        return getattr(self, "_IntegratorManager__server", None)
+
+    def get_machine_config(self, uid: str):
+        # Served from the parsed file until it changes on disk
+        return dict(load_config(self.config_file_path).get(uid, {}))
+
+    def get_all_machine(self):
+        return dict(load_config(self.config_file_path))
+
+    def add_machine_config(self, uid: str, machine_name: str, config: dict):
+        resp = super().add_machine_config(uid, machine_name, config)
+        invalidate_config(self.config_file_path)
+        return resp
+
+    def delete_machine_config(self, uid: str):
+        resp = super().delete_machine_config(uid)
+        invalidate_config(self.config_file_path)
+        return resp
+
+    def add_machine_listener(self, listener):
+        """`listener(uid)` is called after a machine is added or its config is replaced"""
+        self.__machine_listeners.append(listener)
+
+    def add_machine(self, uid: str, machine_name: str, config: str):
+        resp = super().add_machine(uid, machine_name, config)
+        for listener in self.__machine_listeners:
+            listener(uid)
+        return resp
+
+    def add_removal_listener(self, listener):
+        """`listener(uid)` is called after a machine is deleted"""
+        self.__removal_listeners.append(listener)
+
+    def delete_machine(self, uid):
+        resp = super().delete_machine(uid)
+        self.error_aggregator.forget(uid)
+        for listener in self.__removal_listeners:
+            listener(uid)
+        return resp
+
+    def _plc_key(self, message):
+        machine_id = message.get("machine_id")
+        config = self.get_machine_config(machine_id)
+        if not config or "host" not in config:
+            return str(machine_id)
+        return f"{config['host']}:{config.get('rack', 0)}:{config.get('slot', 1)}"
+
+    def _coalesce_key(self, message):
+        """Writes to a signal with a `coalesce_window` (seconds) in its config collapse to the last value"""
+        if message.get("function_name") not in COALESCING_FUNCTIONS:
+            return None
+        kargs = message.get("args")
+        if isinstance(kargs, str):
+            kargs = json.loads(kargs)
+        signal = kargs.get("signal")
+        config = self.get_machine_config(message.get("machine_id"))
+        if not config or signal is None:
+            return None
+        # Catalog records carry no coalesce_window, so only signals_configuration can enable it
+        signal_config = load_signals_config(config).get(signal) or {}
+        window = float(signal_config.get("coalesce_window", 0))
+        return (message.get("function_name"), signal), window
+
+    def _run_call_function(self, message, superseded=()):
+        """Execute `message`; callers of `superseded` messages get the same result"""
+        self.__superseded.messages = superseded
+        try:
+            self._IntegratorManager__call_function_response(message)
+        finally:
+            self.__superseded.messages = ()
+
+    def __superseded_contexts(self):
+        for message in getattr(self.__superseded, "messages", ()):
+            yield {
+                "sync_id": message.get("sync_id"),
+                "node_id": message.get("node_id"),
+                "flow_id": message.get("flow_id")
+            }
+
+    def send_call_function_response(self, event_name, machine_id, sync_context, response):
+        super().send_call_function_response(event_name, machine_id, sync_context, response)
+        if not (isinstance(response, dict) and response.get("error")):
+            self.resolve_error(machine_id, event_name[:-len("_response")] if event_name.endswith("_response") else event_name)
+        for context in self.__superseded_contexts():
+            if isinstance(response, dict):
+                response = dict(response, coalesced=True)
+            super().send_call_function_response(event_name, machine_id, context, response)
+
+    def send_event(self, event_name, machine_id, response):
+        if self.stream_sink is not None and event_name.startswith("monitor_"):
+            self.stream_sink.add_event(event_name, machine_id, response)
+            if not self.__publish_events:
+                return
+        super().send_event(event_name, machine_id, response)
+
+    def send_error(self, error_message, event_name, machine_id, event_args, event_type, node_id="", flow_id="", sync_id=""):
+        self.__send_error(error_message, event_name, machine_id, event_args, event_type, node_id, flow_id, sync_id)
+        for context in self.__superseded_contexts():
+            self.__send_error(error_message, event_name, machine_id, event_args, event_type, **context)
+
+    def __send_error(self, error_message, event_name, machine_id, event_args, event_type, node_id="", flow_id="", sync_id=""):
+        context = {
+            "event_args": event_args,
+            "event_type": event_type,
+            "node_id": node_id,
+            "flow_id": flow_id,
+            "sync_id": sync_id
+        }
+        if self.error_aggregator.report(machine_id, event_name, error_class(error_message), error_message, context):
+            return
+        if sync_id:
+            # A caller is waiting on this sync_id, so repeats are still answered, just without the traceback
+            self.__publish_error(dict(
+                context,
+                error_message=last_line(error_message),
+                error_class=error_class(error_message),
+                event_name=event_name,
+                machine_id=machine_id,
+                status="repeat"
+            ))
+
+    def __publish_error_notice(self, status, machine_id, function, error_class, details):
+        payload = dict(details, error_class=error_class, status=status)
+        payload["error_message"] = payload.pop("message")
+        payload["event_name"] = function
+        payload["machine_id"] = machine_id
+        if status != FIRST:
+            # Summaries and recoveries answer no particular call and skip the traceback
+            payload["sync_id"] = ""
+            payload["error_message"] = last_line(payload["error_message"])
+        self.__publish_error(payload)
+
+    def __publish_error(self, payload):
+        payload["machine_module_name"] = self.module_name
+        self.publish_to_some_other_topic("error_queue", json.dumps(payload, default=str))
+        if self.stream_sink is not None:
+            self.stream_sink.add_error(payload["machine_id"], payload)
+
+    def report_error(self, machine_id, function, error):
+        """Aggregated report of a failure no caller is waiting on, such as a monitor cycle"""
+        self.error_aggregator.report(machine_id, function, type(error).__name__, f"{type(error).__name__}: {error}", {
+            "event_args": {},
+            "event_type": "monitor"
+        })
+
+    def resolve_error(self, machine_id, function):
+        self.error_aggregator.resolve(machine_id, function)
+
+    def __subscribe(self, channel, handler):
+        if self.is_worker:
+            channel = shard_channel(channel, self.shard)
+        elif self.shard_count:
+            if self.router is None:
+                self.router = ShardRouter(self.shard_count, self.publish_to_some_other_topic)
+            handler = partial(self.router.route, channel)
+        ready = threading.Event()
+        self.subscriptions_ready.append(ready)
+        RedisDriver.start_subscriber(channel, handler, server=self.redis_server, ready=ready)
+
+    def _IntegratorManager__subscribe_to_call_function(self):
+        self.__subscribe(f"{self.module_name}_call_functions", self.dispatcher.submit)
+
+    def _IntegratorManager__subscribe_to_monitor_function(self):
+        self.__subscribe(f"{self.module_name}_monitor_functions", self._IntegratorManager__monitor_function_response)
+
+    def _IntegratorManager__create_server(self):
+        if not self.is_worker:
+            self._IntegratorManager__server = create_rpc_server(
+                ("0.0.0.0", self._IntegratorManager__port), allow_none=True, **self.__rpc_options
+            )
+
+    def _IntegratorManager__register_functions(self):
+        if not self.is_worker:
+            super()._IntegratorManager__register_functions()
+
+
+class LazyManager:
+    """
+        Stands in for the manager until something first uses it.
+
+        Building the manager binds the XML-RPC port and connects to Redis, so
+        modules can import `app` freely and the process pays that cost only
+        once it actually starts serving.
+    """
+
+    def __init__(self, factory):
+        self.__factory = factory
+        self.__instance = None
+        self.__lock = threading.Lock()
+
+    @property
+    def is_built(self):
+        return self.__instance is not None
+
+    def instance(self):
+        if self.__instance is None:
+            with self.__lock:
+                if self.__instance is None:
+                    self.__instance = self.__factory()
+        return self.__instance
+
+    def __getattr__(self, name):
+        return getattr(self.instance(), name)
+
 
 env = os.environ.get("ENV", "dev")
 port = 1029
@@ -8,7 +301,26 @@ if env == "dev" or env ==  "LOCAL":
     port  = 1030
 REDIS_HOSTNAME = os.environ.get('REDIS_HOSTNAME', "localhost")
 REDIS_PORT = os.environ.get('REDIS_PORT', "6379")
-app = IntegratorManager(
+CALL_FUNCTION_WORKERS = int(os.environ.get('CALL_FUNCTION_WORKERS', 8))
+CALLS_PER_PLC = int(os.environ.get('CALLS_PER_PLC', 1))
+S7COMM_WORKERS = int(os.environ.get('S7COMM_WORKERS', 0))
+S7COMM_SHARD = os.environ.get('S7COMM_SHARD')
+WARMUP_WORKERS = int(os.environ.get('WARMUP_WORKERS', 8))
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 16))
+FANOUT_TIMEOUT = float(os.environ.get('FANOUT_TIMEOUT', 5.0))
+FANOUT_IN_FLIGHT = int(os.environ.get('FANOUT_IN_FLIGHT', 1))
+STREAM_OPTIONS = {
+    "prefix": os.environ.get('STREAM_PREFIX', "s7comm"),
+    "maxlen": int(os.environ.get('STREAM_MAXLEN', 100000)),
+    "per_machine": os.environ.get('STREAM_PER_MACHINE', "1").lower() in ("1", "true", "yes"),
+    "pubsub": os.environ.get('STREAM_PUBSUB', "1").lower() in ("1", "true", "yes"),
+}
+ERROR_SUMMARY_INTERVAL = float(os.environ.get('ERROR_SUMMARY_INTERVAL', 60))
+RPC_WORKERS = int(os.environ.get('RPC_WORKERS', 0))
+RPC_QUEUE_SIZE = int(os.environ.get('RPC_QUEUE_SIZE', 64))
+RPC_BATCH_WORKERS = int(os.environ.get('RPC_BATCH_WORKERS', 8))
+app = LazyManager(partial(
+    S7commIntegratorManager,
     module_name='s7comm',
     module_setup_file_path=f'{cd}/machine_detail.yml',
     machine_config_file_path=f'{cd}/config.json',
@@ -16,7 +328,16 @@ app = IntegratorManager(
     redis_hostname=REDIS_HOSTNAME,
     redis_port=REDIS_PORT,
     logger_identifier='s7comm',
-    logger_file_path=f"{cd}/system.log",
+    logger_file_path=os.environ.get('LOG_FILE', f"{cd}/system.log"),
     log_level='DEBUG',
-    run_call_function_rate=0.001
-)
\ No newline at end of file
+    run_call_function_rate=0.001,
+    call_function_workers=CALL_FUNCTION_WORKERS,
+    calls_per_plc=CALLS_PER_PLC,
+    shard=int(S7COMM_SHARD) if S7COMM_SHARD is not None else None,
+    shard_count=S7COMM_WORKERS,
+    rpc_workers=RPC_WORKERS,
+    rpc_queue_size=RPC_QUEUE_SIZE,
+    rpc_batch_workers=RPC_BATCH_WORKERS,
+    streams=STREAM_OPTIONS if stream_sink.enabled() else None,
+    error_summary_interval=ERROR_SUMMARY_INTERVAL
+))
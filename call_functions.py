@@ -1,88 +1,128 @@
 import json
+import threading
 import time
-from app import app
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app import app, FANOUT_IN_FLIGHT, FANOUT_TIMEOUT, FANOUT_WORKERS
 from response import create_response
 from logger_setup import LoggerSetup
 from typing import Dict, Any, Union, List, Tuple
-from plc import PLC, PLCConnectionError, PLCOperationError
+from plc import PLC, PLCConnectionError, PLCOperationError, READ_PDU_OVERHEAD, block_connections
+from read_plan import AREA_GROUP_PREFIX, GroupPlans, ReadPlan, signal_area
+from request_queue import RequestPriority, request_priority
+from signal_catalog import SignalCatalog, load_signals_config, lookup_signal, with_catalog
+from snapshot import SignalSnapshot
 
 logger = LoggerSetup.get_logger()
 
-def write_helper(signal_config, plc, value):
+def signal_location(signal_config):
+    """`(area, db_number, offset)` of a signal; signals outside the DBs need no db_number"""
+    area = signal_area(signal_config)
+    db_number = signal_config.get("db_number", 0 if area != "DB" else None)
+    offset = signal_config.get("offset")
+    if db_number is None or offset is None or signal_config.get("type") is None:
+        raise ValueError(f"Invalid signal configuration: {signal_config}")
+    return area, int(db_number), int(offset)
+
+def write_helper(signal_config, plc, value, uid=None):
     try:
-        db_number = signal_config.get("db_number")
-        offset = signal_config.get("offset")
+        area, db_number, offset = signal_location(signal_config)
         signal_type = signal_config.get("type")
         bit_pos = signal_config.get("bit_pos")
         max_string_length = signal_config.get("max_length", 254) 
-
-        if db_number is None or offset is None or signal_type is None:
-            raise ValueError(f"Invalid signal configuration: {signal_config}")
-        
-        db_number = int(db_number)
-        offset = int(offset)
         
         if signal_type == "bool":
             if bit_pos is None:
                 raise ValueError("Bit position not specified for boolean signal")
             bit_pos = int(bit_pos)
             value = bool(value)
-            plc.write_bool(db_number, offset, bit_pos, value)
+            plc.write_bool(db_number, offset, bit_pos, value, area=area)
         elif signal_type == "int":
             value = int(value)
-            plc.write_int(db_number, offset, value, is_dint=False)
+            plc.write_int(db_number, offset, value, is_dint=False, area=area)
         elif signal_type == "dint":
             value = int(value)
-            plc.write_int(db_number, offset, value, is_dint=True)
+            plc.write_int(db_number, offset, value, is_dint=True, area=area)
         elif signal_type == "real":   
             value = float(value)
-            plc.write_real(db_number, offset, value)
+            plc.write_real(db_number, offset, value, area=area)
         elif signal_type == "string":
             value = str(value)
-            plc.write_string(db_number, offset, value, max_length=max_string_length)
+            plc.write_string(db_number, offset, value, max_length=max_string_length, area=area)
         else:
             raise ValueError(f"Unsupported signal type: {signal_type}")
         
         return True
         
     except Exception as e:
-        logger.error(f"Error in write_helper: {e}")
+        logger.error("Error in write_helper: %s", e, extra={"machine_id": uid or plc.key, "error_key": "write_helper"})
         raise
 
-def read_helper(signal_config, plc):
+def encode_helper(signal_config, value):
+    """`(db_number, offset, data, bit_pos[, area])` for PLC.write_multi, converting `value` like write_helper"""
+    area, db_number, offset = signal_location(signal_config)
+    signal_type = signal_config.get("type")
+    bit_pos = signal_config.get("bit_pos")
+    # PLC.write_multi items only name their area outside the DBs
+    suffix = () if area == "DB" else (area,)
+
+    if signal_type == "bool":
+        if bit_pos is None:
+            raise ValueError("Bit position not specified for boolean signal")
+        return (db_number, offset, bool(value), int(bit_pos)) + suffix
+    if signal_type in ("int", "dint"):
+        value = int(value)
+    elif signal_type == "real":
+        value = float(value)
+    elif signal_type == "string":
+        value = str(value)
+    return (db_number, offset, PLC.encode(signal_type, value, signal_config.get("max_length", 254)), None) + suffix
+
+def parse_max_age(kargs):
+    max_age = kargs.get("max_age")
+    if max_age is None or max_age == "":
+        return None
+    return float(max_age)
+
+def read_helper(signal_config, plc, max_age=None, uid=None):
+    value, _ = read_helper_sample(signal_config, plc, max_age=max_age, uid=uid)
+    return value
+
+def read_helper_sample(signal_config, plc, max_age=None, uid=None):
+    """
+        Returns `(value, timestamp)`. With `max_age` set, a monitor sample no
+        older than `max_age` seconds is served instead of reading the PLC.
+    """
     try:
-        db_number = signal_config.get("db_number")
-        offset = signal_config.get("offset")
+        if max_age is not None:
+            sample = SignalSnapshot.get(plc.key, signal_config, max_age)
+            if sample is not None:
+                return sample
+
+        area, db_number, offset = signal_location(signal_config)
         signal_type = signal_config.get("type")
         bit_pos = signal_config.get("bit_pos")
         max_string_length = signal_config.get("max_length", 254) 
-
-        if db_number is None or offset is None or signal_type is None:
-            raise ValueError(f"Invalid signal configuration: {signal_config}")
-        
-        db_number = int(db_number)
-        offset = int(offset)
         
         if signal_type == "bool":
             if bit_pos is None:
                 raise ValueError("Bit position not specified for boolean signal")
             bit_pos = int(bit_pos)
-            value = plc.read_bool(db_number, offset, bit_pos)
+            value = plc.read_bool(db_number, offset, bit_pos, area=area)
         elif signal_type == "int":
-            value = plc.read_int(db_number, offset)
+            value = plc.read_int(db_number, offset, area=area)
         elif signal_type == "dint":
-            value = plc.read_dint(db_number, offset)
+            value = plc.read_dint(db_number, offset, area=area)
         elif signal_type == "real":
-            value = plc.read_real(db_number, offset)
+            value = plc.read_real(db_number, offset, area=area)
         elif signal_type == "string":
-            value = plc.read_string(db_number, offset, max_length=max_string_length)
+            value = plc.read_string(db_number, offset, max_length=max_string_length, area=area)
         else:
             raise ValueError(f"Unsupported signal type: {signal_type}")
         
-        return value
+        return value, time.time()
         
     except Exception as e:
-        logger.error(f"Error in read_helper: {e}")
+        logger.error("Error in read_helper: %s", e, extra={"machine_id": uid or plc.key, "error_key": "read_helper"})
         raise
 
 def send_signal(uid, kargs):
@@ -94,7 +134,7 @@ def send_signal(uid, kargs):
         host = machine_config['host']
         rack = int(machine_config.get('rack', 0))
         slot = int(machine_config.get('slot', 1))
-        signals_config = json.loads(machine_config["signals_configuration"])
+        signals_config = load_signals_config(machine_config)
         
         signal_name = kargs.get("signal")
         value = kargs.get("value")
@@ -112,23 +152,25 @@ def send_signal(uid, kargs):
                 except (ValueError, TypeError):
                     value = bool(value)
         
-        plc = PLC(host, rack, slot)
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
         
-        signal_config = signals_config.get(signal_name)
+        signal_config = lookup_signal(machine_config, signals_config, signal_name)
         if signal_config is None:
             raise ValueError(f"Invalid signal: {signal_name}")
 
-        success = write_helper(signal_config, plc, value)
+        with request_priority(RequestPriority.CALL):
+            success = write_helper(signal_config, plc, value, uid=uid)
         
         response_json = {
             "signal": str(signal_name),
-            "success": bool(success)
+            "success": bool(success),
+            "value": value
         }
         
         return create_response("send_signal_response", response=response_json, uid=uid)
     
     except Exception as e:
-        logger.error(f"Error sending signal: {e}")
+        logger.error(f"Error sending signal: {e}", extra={"machine_id": uid, "error_key": "send_signal"})
         response_json = {
             "signal": str(kargs.get("signal", "")),
             "success": False,
@@ -145,27 +187,30 @@ def read_signal(uid, kargs):
         host = machine_config['host']
         rack = int(machine_config.get('rack', 0)) 
         slot = int(machine_config.get('slot', 1)) 
-        signals_config = json.loads(machine_config["signals_configuration"])
+        signals_config = load_signals_config(machine_config)
         
         signal_name = kargs.get("signal")
+        max_age = parse_max_age(kargs)
         
-        plc = PLC(host, rack, slot)
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
         
-        signal_config = signals_config.get(signal_name)
+        signal_config = lookup_signal(machine_config, signals_config, signal_name)
         if signal_config is None:
             raise ValueError(f"Invalid signal: {signal_name}")
         
-        value = read_helper(signal_config, plc)
+        with request_priority(RequestPriority.CALL):
+            value, timestamp = read_helper_sample(signal_config, plc, max_age=max_age, uid=uid)
         
         response_json = {
             "signal": str(signal_name),
-            "value": value
+            "value": value,
+            "timestamp": timestamp
         }
         
         return create_response("read_signal_response", response=response_json, uid=uid)
     
     except Exception as e:
-        logger.error(f"Error reading signal: {e}")
+        logger.error(f"Error reading signal: {e}", extra={"machine_id": uid, "error_key": "read_signal"})
         response_json = {
             "signal": str(kargs.get("signal", "")),
             "value": None,
@@ -197,21 +242,22 @@ def send_multiple_signals(uid, kargs):
         host = machine_config['host']
         rack = int(machine_config.get('rack', 0))
         slot = int(machine_config.get('slot', 1))
-        signals_config = json.loads(machine_config["signals_configuration"])
+        signals_config = load_signals_config(machine_config)
         
-        plc = PLC(host, rack, slot)
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
         
         results = {}
         for signal_name, value in zip(signals, values):
             try:
-                signal_config = signals_config.get(signal_name)
+                signal_config = lookup_signal(machine_config, signals_config, signal_name)
                 if signal_config is None:
                     raise ValueError(f"Invalid signal: {signal_name}")
 
-                success = write_helper(signal_config, plc, value)
+                with request_priority(RequestPriority.CALL):
+                    success = write_helper(signal_config, plc, value, uid=uid)
                 results[signal_name] = success
             except Exception as e:
-                logger.error(f"Error sending signal {signal_name}: {e}")
+                logger.error(f"Error sending signal {signal_name}: {e}", extra={"machine_id": uid, "error_key": "send_multiple_signals"})
                 results[signal_name] = False
         
         success = all(results.values())
@@ -224,7 +270,7 @@ def send_multiple_signals(uid, kargs):
         return create_response("send_multiple_signals_response", response=response_json, uid=uid)
     
     except Exception as e:
-        logger.error(f"Error sending multiple signals: {e}")
+        logger.error(f"Error sending multiple signals: {e}", extra={"machine_id": uid, "error_key": "send_multiple_signals"})
         response_json = {
             "success": False,
             "error": str(e)
@@ -243,41 +289,329 @@ def read_multiple_signals(uid, kargs):
             signals = json.loads(signals)
         if not isinstance(signals, list):
             signals = [signals]
+        max_age = parse_max_age(kargs)
         
         host = machine_config['host']
         rack = int(machine_config.get('rack', 0))
         slot = int(machine_config.get('slot', 1))
-        signals_config = json.loads(machine_config["signals_configuration"])
+        signals_config = load_signals_config(machine_config)
         
-        plc = PLC(host, rack, slot)
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
         
         results = {}
+        timestamps = {}
+        failed = False
         for signal_name in signals:
             try:
-                signal_config = signals_config.get(signal_name)
+                signal_config = lookup_signal(machine_config, signals_config, signal_name)
                 if signal_config is None:
                     raise ValueError(f"Invalid signal: {signal_name}")
 
-                value = read_helper(signal_config, plc)
+                with request_priority(RequestPriority.CALL):
+                    value, timestamp = read_helper_sample(signal_config, plc, max_age=max_age, uid=uid)
                 results[signal_name] = value
+                timestamps[signal_name] = timestamp
             except Exception as e:
-                logger.error(f"Error reading signal {signal_name}: {e}")
+                logger.error(f"Error reading signal {signal_name}: {e}", extra={"machine_id": uid, "error_key": "read_multiple_signals"})
                 results[signal_name] = None
+                timestamps[signal_name] = None
+                failed = True
         
-        response_json = results
+        response_json = {
+            "success": not failed,
+            "results": results,
+            "timestamps": timestamps
+        }
         
         return create_response("read_multiple_signals_response", response=response_json, uid=uid)
     
     except Exception as e:
-        logger.error(f"Error reading multiple signals: {e}")
+        logger.error(f"Error reading multiple signals: {e}", extra={"machine_id": uid, "error_key": "read_multiple_signals"})
         response_json = {
+            "success": False,
             "error": str(e)
         }
         return create_response("read_multiple_signals_response", response=response_json, uid=uid)
 
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+# Fan-out reads still running per machine, including ones the caller already gave up on
+_fanout_in_flight: Dict[str, int] = {}
+
+def fanout_executor():
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="read-fanout")
+        return _fanout_executor
+
+def claim_fanout_slot(machine_uid):
+    """Keep a hung PLC from tying up more than FANOUT_IN_FLIGHT fan-out workers"""
+    with _fanout_lock:
+        if _fanout_in_flight.get(machine_uid, 0) >= FANOUT_IN_FLIGHT:
+            return False
+        _fanout_in_flight[machine_uid] = _fanout_in_flight.get(machine_uid, 0) + 1
+        return True
+
+def release_fanout_slot(machine_uid):
+    with _fanout_lock:
+        count = _fanout_in_flight.get(machine_uid, 0) - 1
+        if count > 0:
+            _fanout_in_flight[machine_uid] = count
+        else:
+            _fanout_in_flight.pop(machine_uid, None)
+
+def read_machine_signals(machine_uid, signals, max_age=None):
+    """`(values, timestamp, error)` of `signals` on one machine, read in as few requests as its PDU allows"""
+    machine_config = app.get_machine_config(machine_uid)
+    if not machine_config:
+        raise ValueError(f"Machine not found: {machine_uid}")
+    signals_config = with_catalog(machine_config, load_signals_config(machine_config), signals)
+    plc = PLC(machine_config['host'], int(machine_config.get('rack', 0)), int(machine_config.get('slot', 1)), uid=machine_uid,
+              block_connections=block_connections(machine_config))
+
+    known = [signal for signal in signals if signal in signals_config]
+    missing = [signal for signal in signals if signal not in signals_config]
+    values = {signal: None for signal in signals}
+    error = f"Invalid signals: {', '.join(missing)}" if missing else None
+
+    if max_age is not None:
+        samples = {signal: SignalSnapshot.get(plc.key, signals_config[signal], max_age) for signal in known}
+        if known and all(sample is not None for sample in samples.values()):
+            values.update({signal: sample[0] for signal, sample in samples.items()})
+            return values, min(sample[1] for sample in samples.values()), error
+
+    plan = ReadPlan(signals_config, known, max_range=plc.pdu_size - READ_PDU_OVERHEAD)
+    with request_priority(RequestPriority.CALL):
+        buffers = plc.read_ranges(plan.ranges)
+    values.update(plan.decode(buffers))
+    return values, time.time(), error
+
+def read_fanout(uid, kargs):
+    """
+        Read the same signals from many machines in parallel:
+
+            {"machines": ["line1_plc01", "line1_plc02", ...], "signals": ["state", "counter"], "timeout": 5}
+
+        Every machine gets `timeout` seconds from the moment its read starts;
+        machines that fail or time out are reported in `errors` without
+        holding back the others. A machine whose earlier reads are still
+        hanging (FANOUT_IN_FLIGHT of them) fails right away instead of
+        taking another worker.
+    """
+    try:
+        machines = kargs.get("machines") or [uid]
+        signals = kargs.get("signals")
+        if isinstance(machines, str):
+            machines = json.loads(machines)
+        if isinstance(signals, str):
+            signals = json.loads(signals)
+        if not isinstance(signals, list):
+            signals = [signals]
+        max_age = parse_max_age(kargs)
+        timeout = float(kargs.get("timeout") or FANOUT_TIMEOUT)
+
+        results = {machine_uid: None for machine_uid in machines}
+        timestamps = {machine_uid: None for machine_uid in machines}
+        errors = {}
+
+        def fail(machine_uid, error):
+            logger.error(f"Error reading {machine_uid} in fan-out: {error}", extra={"machine_id": machine_uid, "error_key": "read_fanout"})
+            errors[machine_uid] = str(error)
+
+        started = {}
+
+        def read_one(machine_uid):
+            started[machine_uid] = time.monotonic()
+            try:
+                return read_machine_signals(machine_uid, signals, max_age)
+            finally:
+                release_fanout_slot(machine_uid)
+
+        executor = fanout_executor()
+        futures = {}
+        for machine_uid in dict.fromkeys(machines):
+            if not claim_fanout_slot(machine_uid):
+                fail(machine_uid, "Previous fan-out read still in progress")
+                continue
+            try:
+                futures[executor.submit(read_one, machine_uid)] = machine_uid
+            except Exception:
+                release_fanout_slot(machine_uid)
+                raise
+
+        # Every machine's clock starts when a worker picks it up; machines queued
+        # behind slow ones get as long as the queue ahead of them can take
+        submitted = time.monotonic()
+        queue_deadline = submitted + timeout * (len(futures) // FANOUT_WORKERS + 1)
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            deadlines = {}
+            for future in pending:
+                machine_uid = futures[future]
+                deadline = started[machine_uid] + timeout if machine_uid in started else queue_deadline
+                if deadline <= now:
+                    # A read that already started keeps its slot until the PLC returns
+                    if future.cancel():
+                        release_fanout_slot(machine_uid)
+                    fail(machine_uid, f"No response within {timeout} seconds" if machine_uid in started
+                         else f"Not started within {queue_deadline - submitted:.1f} seconds")
+                else:
+                    deadlines[future] = deadline
+            pending = set(deadlines)
+            if not pending:
+                break
+
+            done, _ = wait(pending, timeout=min(deadlines.values()) - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                machine_uid = futures[future]
+                try:
+                    values, timestamp, error = future.result()
+                except Exception as e:
+                    fail(machine_uid, e)
+                    continue
+                results[machine_uid] = values
+                timestamps[machine_uid] = timestamp
+                if error:
+                    errors[machine_uid] = error
+
+        response_json = {
+            "success": not errors,
+            "results": results,
+            "timestamps": timestamps,
+            "errors": errors
+        }
+        return create_response("read_fanout_response", response=response_json, uid=uid)
+
+    except Exception as e:
+        logger.error(f"Error in fan-out read: {e}", extra={"machine_id": uid, "error_key": "read_fanout"})
+        response_json = {
+            "success": False,
+            "error": str(e)
+        }
+        return create_response("read_fanout_response", response=response_json, uid=uid)
+
+def read_group(uid, kargs):
+    """
+        Read a named group of `signals_configuration["groups"]`:
+
+            "groups": {"drive_status": ["drive1_*", "drive2_*", "line_speed"]}
+
+        The group's read plan is compiled once per configuration.
+    """
+    machine_config = app.get_machine_config(uid)
+    if machine_config is None:
+        raise Exception("Machine configuration is missing")
+
+    try:
+        group = kargs.get("group")
+        max_age = parse_max_age(kargs)
+
+        host = machine_config['host']
+        rack = int(machine_config.get('rack', 0))
+        slot = int(machine_config.get('slot', 1))
+
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
+        plan = GroupPlans.get(
+            uid, group, machine_config.get("signals_configuration") or "{}", plc.pdu_size,
+            catalog=SignalCatalog.for_machine(machine_config)
+        )
+
+        if max_age is not None:
+            samples = {name: SignalSnapshot.get(plc.key, config, max_age) for name, config in plan.signals.items()}
+            if all(sample is not None for sample in samples.values()):
+                response_json = {
+                    "group": group,
+                    "success": True,
+                    "values": {name: sample[0] for name, sample in samples.items()},
+                    "timestamp": min((sample[1] for sample in samples.values()), default=time.time())
+                }
+                return create_response("read_group_response", response=response_json, uid=uid)
+
+        with request_priority(RequestPriority.CALL):
+            buffers = plc.read_ranges(plan.ranges)
+
+        response_json = {
+            "group": group,
+            "success": True,
+            "values": plan.decode(buffers),
+            "timestamp": time.time()
+        }
+        return create_response("read_group_response", response=response_json, uid=uid)
+
+    except Exception as e:
+        logger.error(f"Error reading group: {e}", extra={"machine_id": uid, "error_key": "read_group"})
+        response_json = {
+            "group": str(kargs.get("group", "")),
+            "success": False,
+            "error": str(e)
+        }
+        return create_response("read_group_response", response=response_json, uid=uid)
+
+def read_process_image(uid, kargs):
+    """
+        Snapshot of every signal in the input and output images (or the `areas` asked for):
+
+            {"areas": ["PE", "PA"]}
+
+        Each image is fetched as one byte range and all of them share a
+        request when they fit one PDU, so the values come from one PLC cycle.
+    """
+    machine_config = app.get_machine_config(uid)
+    if machine_config is None:
+        raise Exception("Machine configuration is missing")
+
+    try:
+        areas = kargs.get("areas") or ["PE", "PA"]
+        if isinstance(areas, str):
+            areas = json.loads(areas) if areas.startswith("[") else [area.strip() for area in areas.split(",")]
+
+        host = machine_config['host']
+        rack = int(machine_config.get('rack', 0))
+        slot = int(machine_config.get('slot', 1))
+
+        plc = PLC(host, rack, slot, uid=uid, block_connections=block_connections(machine_config))
+        catalog = SignalCatalog.for_machine(machine_config)
+        raw_config = machine_config.get("signals_configuration") or "{}"
+        plans = [
+            GroupPlans.get(uid, f"{AREA_GROUP_PREFIX}{area}", raw_config, plc.pdu_size, catalog=catalog)
+            for area in areas
+        ]
+
+        ranges = [range_ for plan in plans for range_ in plan.ranges]
+        with request_priority(RequestPriority.CALL):
+            buffers = plc.read_ranges(ranges)
+
+        values, position = {}, 0
+        for plan in plans:
+            values.update(plan.decode(buffers[position:position + len(plan.ranges)]))
+            position += len(plan.ranges)
+
+        response_json = {
+            "areas": areas,
+            "success": True,
+            "values": values,
+            "timestamp": time.time()
+        }
+        return create_response("read_process_image_response", response=response_json, uid=uid)
+
+    except Exception as e:
+        logger.error(f"Error reading process image: {e}", extra={"machine_id": uid, "error_key": "read_process_image"})
+        response_json = {
+            "areas": kargs.get("areas") or ["PE", "PA"],
+            "success": False,
+            "error": str(e)
+        }
+        return create_response("read_process_image_response", response=response_json, uid=uid)
+
 CALL_FUNCTIONS_MAP = {
     "send_signal": send_signal,
     "read_signal": read_signal,
     "send_multiple_signals": send_multiple_signals,
-    "read_multiple_signals": read_multiple_signals
+    "read_multiple_signals": read_multiple_signals,
+    "read_fanout": read_fanout,
+    "read_group": read_group,
+    "read_process_image": read_process_image
 }
\ No newline at end of file
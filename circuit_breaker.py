@@ -0,0 +1,71 @@
+import threading
+from typing import Callable, List
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+
+class CircuitBreaker:
+    """
+        Tracks whether a PLC is reachable.
+
+        While the breaker is open callers fail fast instead of queueing for a
+        connection that is being re-established in the background. Listeners
+        are called with `True` when the breaker closes and `False` when it opens.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, name: str):
+        self._name = name
+        self._state = self.OPEN
+        self._closed_event = threading.Event()
+        self._listeners: List[Callable[[bool], None]] = []
+        self._lock = threading.Lock()
+        self.failures = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self._state == self.OPEN
+
+    def add_listener(self, listener: Callable[[bool], None]) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[bool], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def record_success(self) -> None:
+        with self._lock:
+            changed = self._state != self.CLOSED
+            self._state = self.CLOSED
+            self.failures = 0
+            self._closed_event.set()
+        if changed:
+            self._notify(True)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            changed = self._state != self.OPEN
+            self._state = self.OPEN
+            self.failures += 1
+            self._closed_event.clear()
+        if changed:
+            self._notify(False)
+
+    def wait_closed(self, timeout: float = None) -> bool:
+        return self._closed_event.wait(timeout)
+
+    def _notify(self, online: bool) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(online)
+            except Exception as e:
+                logger.error(f"Error in health listener for {self._name}: {str(e)}")
@@ -1,4 +1,30 @@
 import json
+import os
+import threading
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def load_config(path='config.json'):
+    """
+        Parsed machine config file, re-read only when its mtime or size changed.
+        Callers must not mutate the returned dict.
+    """
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+    with open(path, 'r') as file:
+        data = json.load(file)
+    with _cache_lock:
+        _cache[path] = (version, data)
+    return data
+
+def invalidate_config(path='config.json'):
+    with _cache_lock:
+        _cache.pop(path, None)
 
 def add_machine_config(uid:str,machine_name:str,config:str):
     config = json.loads(config)
@@ -11,6 +37,7 @@ def add_machine_config(uid:str,machine_name:str,config:str):
         data[uid] = config
         with open('config.json','w+') as out:
             json.dump(data,out)
+        invalidate_config()
     return True
 
 def delete_machine_config(uid:str):
@@ -22,14 +49,12 @@ def delete_machine_config(uid:str):
             del data[uid]
             with open('config.json','w+') as out:
                 json.dump(data,out)
+            invalidate_config()
         return value
     return None
 
 def get_machine_config(uid:str):
-    with open('config.json','r+') as file:
-        return json.load(file).get(uid,{})
+    return dict(load_config().get(uid,{}))
 
 def get_all_machines():
-    with open('config.json','r+') as file:
-        file = json.load(file)
-        return file.items()
\ No newline at end of file
+    return load_config().items()
\ No newline at end of file
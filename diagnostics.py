@@ -0,0 +1,261 @@
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List
+from logger_setup import LoggerSetup
+from monitor_functions import StoppableThread
+from plc import PLC
+from polling import AdaptivePoller
+from read_plan import GroupPlans
+from signal_catalog import SignalCatalog
+from snapshot import SignalSnapshot
+
+logger = LoggerSetup.get_logger()
+
+MAX_STACK_SAMPLES = 200
+MAX_STACK_DEPTH = 40
+MAX_MEMORY_ENTRIES = 100
+# XML-RPC <int> is 32 bit; thread ids and byte counts can exceed it
+XMLRPC_MAX_INT = 2 ** 31 - 1
+
+_memory_lock = threading.Lock()
+_memory_baseline = None
+
+
+def xmlrpc_safe(value: Any) -> Any:
+    """String keys and no ints XML-RPC cannot marshal"""
+    if isinstance(value, dict):
+        return {str(key): xmlrpc_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [xmlrpc_safe(item) for item in value]
+    if isinstance(value, int) and not isinstance(value, bool) and abs(value) > XMLRPC_MAX_INT:
+        return str(value)
+    return value
+
+
+def _built(app) -> bool:
+    # A LazyManager that has not been built yet has no queues to report, and diagnostics must not build it
+    return app is not None and getattr(app, "is_built", True)
+
+
+def thread_names() -> Dict[int, str]:
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+def monitor_threads() -> List[dict]:
+    """Registered monitor threads with the poll state of the group each one runs"""
+    pollers = AdaptivePoller.by_thread()
+    now = time.time()
+    monitors = []
+    for monitor in StoppableThread.snapshot():
+        poller = pollers.get(monitor["thread"])
+        if poller is not None:
+            monitor["group"] = poller.group
+            monitor["interval"] = poller.interval
+            monitor["cycles"] = poller.cycles
+            monitor["last_cycle"] = poller.last_cycle
+            monitor["last_cycle_age"] = None if poller.last_cycle is None else now - poller.last_cycle
+        monitors.append(monitor)
+    return monitors
+
+
+def threads() -> dict:
+    live = threading.enumerate()
+    return {
+        "count": len(live),
+        "threads": [
+            {"name": thread.name, "thread": thread.ident, "daemon": thread.daemon, "alive": thread.is_alive()}
+            for thread in live
+        ],
+        "monitors": monitor_threads()
+    }
+
+
+def plc_locks() -> Dict[str, dict]:
+    """Who holds each PLC's request slot, for how long, and who is queued behind it"""
+    names = thread_names()
+    registry = PLC.registry_stats()
+    stats = {}
+    for key, queue in PLC.request_stats().items():
+        queue["owner_name"] = names.get(queue["owner"])
+        for waiter in queue["waiters"]:
+            waiter["name"] = names.get(waiter["thread"])
+        stats[key] = dict(registry.get(key, {}), **queue)
+    return stats
+
+
+def caches(app) -> dict:
+    plc_stats = PLC.request_stats()
+    snapshot_sizes = SignalSnapshot.size()
+    sizes = {
+        "plcs": len(plc_stats),
+        "plc_signal_cache": sum(stats["cache_entries"] for stats in plc_stats.values()),
+        "signal_snapshots": sum(snapshot_sizes.values()),
+        "signal_snapshot_plcs": len(snapshot_sizes),
+        "group_plans": GroupPlans.size(),
+        "signal_catalogs": SignalCatalog.loaded(),
+        "monitor_pollers": len(AdaptivePoller.by_thread()),
+    }
+    if _built(app):
+        sizes["active_errors"] = len(app.error_aggregator.active())
+    return sizes
+
+
+def queues(app) -> dict:
+    if not _built(app):
+        return {}
+    pending = app.dispatcher.pending()
+    busiest = sorted(pending.items(), key=lambda item: item[1], reverse=True)[:10]
+    rpc_server = app.rpc_server
+    return {
+        "call_functions": sum(pending.values()),
+        "call_functions_by_machine": dict(busiest),
+        "rpc": rpc_server.pending() if hasattr(rpc_server, "pending") else None,
+        "stream_sink": app.stream_sink.stats() if app.stream_sink is not None else None,
+    }
+
+
+def summary(app) -> dict:
+    monitors = monitor_threads()
+    return {
+        "time": time.time(),
+        "threads": threading.active_count(),
+        "monitors": len(monitors),
+        "monitors_alive": sum(1 for monitor in monitors if monitor["alive"]),
+        "plc_locks": {
+            key: {
+                "owner_name": stats["owner_name"],
+                "held_seconds": stats["held_seconds"],
+                "waiters": len(stats["waiters"]),
+            }
+            for key, stats in plc_locks().items()
+        },
+        "caches": caches(app),
+        "queues": queues(app),
+        "errors": app.error_aggregator.active() if _built(app) else [],
+        "memory_tracing": tracemalloc.is_tracing(),
+    }
+
+
+def stacks(samples: int = 1, interval: float = 0.01, name_filter: str = "") -> Dict[str, dict]:
+    """
+        Sample every thread's stack `samples` times, `interval` seconds apart.
+
+        Identical stacks are counted together, so with a few dozen samples the
+        most common stack of a thread shows where it spends its time.
+    """
+    samples = max(1, min(int(samples), MAX_STACK_SAMPLES))
+    interval = max(0.001, float(interval))
+    own = threading.get_ident()
+    counts: Counter = Counter()
+    for i in range(samples):
+        if i:
+            time.sleep(interval)
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = tuple(traceback.format_list(traceback.extract_stack(frame, limit=MAX_STACK_DEPTH)))
+            counts[(ident, stack)] += 1
+
+    names = thread_names()
+    result = {}
+    for (ident, stack), count in counts.most_common():
+        name = names.get(ident, str(ident))
+        if name_filter and name_filter not in name:
+            continue
+        entry = result.setdefault(f"{name} ({ident})", {"samples": samples, "stacks": []})
+        entry["stacks"].append({"count": count, "stack": [line.rstrip() for line in stack]})
+    return result
+
+
+def memory_top(limit: int = 20, frames: int = 1, compare: bool = True) -> dict:
+    """
+        Allocation hot spots from `tracemalloc`.
+
+        The first call starts tracing (with `frames` frames per allocation) and
+        returns; later calls list the top `limit` lines by size, or with
+        `compare` by growth since the previous call. Tracing costs CPU and
+        memory while it is on, so stop it with `memory_stop` when done.
+    """
+    global _memory_baseline
+    limit = max(1, min(int(limit), MAX_MEMORY_ENTRIES))
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, int(frames)))
+            _memory_baseline = None
+            logger.info("Started tracemalloc for diagnostics")
+            return {"tracing": True, "started": True, "top": []}
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if compare and _memory_baseline is not None:
+            top = [
+                {
+                    "location": str(stat.traceback),
+                    "size_kib": stat.size / 1024,
+                    "size_diff_kib": stat.size_diff / 1024,
+                    "count": stat.count,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in snapshot.compare_to(_memory_baseline, "lineno")[:limit]
+            ]
+        else:
+            top = [
+                {"location": str(stat.traceback), "size_kib": stat.size / 1024, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:limit]
+            ]
+        _memory_baseline = snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "started": False,
+            "compared": bool(compare),
+            "traced_kib": current / 1024,
+            "peak_kib": peak / 1024,
+            "top": top,
+        }
+
+
+def memory_stop() -> bool:
+    global _memory_baseline
+    with _memory_lock:
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.stop()
+        _memory_baseline = None
+    if was_tracing:
+        logger.info("Stopped tracemalloc")
+    return was_tracing
+
+
+def register(app) -> None:
+    """Expose the diagnostics on the module's XML-RPC server"""
+
+    def diagnostics_summary():
+        return xmlrpc_safe(summary(app))
+
+    def diagnostics_threads():
+        return xmlrpc_safe(threads())
+
+    def diagnostics_plc_locks():
+        return xmlrpc_safe(plc_locks())
+
+    def diagnostics_caches():
+        return xmlrpc_safe(dict(caches(app), queues=queues(app)))
+
+    def diagnostics_stacks(samples=1, interval=0.01, name_filter=""):
+        return xmlrpc_safe(stacks(samples, interval, name_filter))
+
+    def diagnostics_memory(limit=20, frames=1, compare=True):
+        return xmlrpc_safe(memory_top(limit, frames, compare))
+
+    def diagnostics_memory_stop():
+        return memory_stop()
+
+    for func in (diagnostics_summary, diagnostics_threads, diagnostics_plc_locks, diagnostics_caches,
+                 diagnostics_stacks, diagnostics_memory, diagnostics_memory_stop):
+        app.register_xml_function(func)
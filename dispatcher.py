@@ -0,0 +1,138 @@
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+
+class CallFunctionDispatcher:
+    """
+        Runs call-function messages on a worker pool.
+
+        Messages are queued per `machine_id` and each queue is drained by at
+        most one worker at a time, so calls to one machine keep their order
+        while different machines are served in parallel. `max_per_plc` bounds
+        how many machines sharing the same PLC may talk to it concurrently.
+
+        `coalesce(message)` may return `(key, window)` for messages that can be
+        collapsed: consecutive messages of a machine with the same key, queued
+        until `window` seconds after the first one arrived, are run once as the
+        last of them and the handler is given the earlier ones as `superseded`.
+    """
+
+    def __init__(self,
+                 handler: Callable[..., None],
+                 max_workers: int = 8,
+                 max_per_plc: int = 1,
+                 plc_key: Callable[[dict], str] = None,
+                 drain_batch: int = 16,
+                 coalesce: Callable[[dict], Optional[Tuple[Hashable, float]]] = None):
+        self._handler = handler
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="call-dispatch")
+        self._max_per_plc = max_per_plc
+        self._plc_key = plc_key
+        self._drain_batch = drain_batch
+        self._coalesce = coalesce
+        self._pending: Dict[str, Deque[tuple]] = {}
+        self._active: Set[str] = set()
+        self._plc_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._arrived = threading.Condition(self._lock)
+
+    def submit(self, message: dict) -> None:
+        machine_id = str(message.get("machine_id"))
+        entry = (time.monotonic(), message, self._coalesce_spec(message))
+        with self._lock:
+            self._pending.setdefault(machine_id, deque()).append(entry)
+            self._arrived.notify_all()
+            if machine_id in self._active:
+                return
+            self._active.add(machine_id)
+        self._executor.submit(self._drain, machine_id)
+
+    def _coalesce_spec(self, message: dict) -> Optional[Tuple[Hashable, float]]:
+        if self._coalesce is None:
+            return None
+        try:
+            spec = self._coalesce(message)
+        except Exception as e:
+            logger.warning(f"Could not resolve coalescing for {message.get('function_name')}: {e}")
+            return None
+        if spec is None or not spec[1] or spec[1] <= 0:
+            return None
+        return spec
+
+    def pending(self) -> Dict[str, int]:
+        with self._lock:
+            return {machine_id: len(queue) for machine_id, queue in self._pending.items()}
+
+    def _next_message(self, machine_id: str):
+        with self._lock:
+            queue = self._pending.get(machine_id)
+            if not queue:
+                self._pending.pop(machine_id, None)
+                self._active.discard(machine_id)
+                return None
+            return queue.popleft()
+
+    def _drain(self, machine_id: str) -> None:
+        for _ in range(self._drain_batch):
+            entry = self._next_message(machine_id)
+            if entry is None:
+                return
+            received, message, spec = entry
+            superseded = []
+            if spec is not None:
+                message, superseded = self._collect(machine_id, message, received, spec)
+            self._run(message, superseded)
+        # Yield the worker so a busy machine cannot monopolise the pool
+        self._executor.submit(self._drain, machine_id)
+
+    def _collect(self, machine_id: str, message: dict, received: float, spec: tuple) -> Tuple[dict, List[dict]]:
+        """Absorb the messages that supersede `message` until its window closes or another call is queued behind it"""
+        key, window = spec
+        deadline = received + window
+        superseded = []
+        with self._arrived:
+            while True:
+                queue = self._pending.get(machine_id)
+                while queue and queue[0][2] is not None and queue[0][2][0] == key:
+                    superseded.append(message)
+                    message = queue.popleft()[1]
+                remaining = deadline - time.monotonic()
+                if queue or remaining <= 0:
+                    break
+                self._arrived.wait(remaining)
+        if superseded:
+            logger.debug(f"Coalesced {len(superseded) + 1} {message.get('function_name')} calls for {machine_id}")
+        return message, superseded
+
+    def _plc_slot(self, message: dict) -> threading.BoundedSemaphore:
+        key = str(message.get("machine_id"))
+        if self._plc_key:
+            try:
+                key = self._plc_key(message)
+            except Exception as e:
+                logger.warning(f"Could not resolve PLC for {key}: {e}")
+        with self._lock:
+            if key not in self._plc_slots:
+                self._plc_slots[key] = threading.BoundedSemaphore(self._max_per_plc)
+            return self._plc_slots[key]
+
+    def _run(self, message: dict, superseded: List[dict] = None) -> None:
+        with self._plc_slot(message):
+            try:
+                if superseded:
+                    self._handler(message, superseded)
+                else:
+                    self._handler(message)
+            except Exception as e:
+                logger.critical(f"Error dispatching {message.get('function_name')} for {message.get('machine_id')}: {e}")
+                logger.error(''.join(traceback.format_tb(e.__traceback__)))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
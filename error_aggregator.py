@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+FIRST = "error"
+SUMMARY = "summary"
+RECOVERED = "recovered"
+
+
+def error_class(error_message: str) -> str:
+    """Exception name from the last line of a formatted traceback, e.g. `PLCOfflineError`"""
+    lines = [line for line in str(error_message).strip().splitlines() if line.strip()]
+    if not lines:
+        return "Error"
+    name = lines[-1].split(":", 1)[0].strip()
+    return name.rsplit(".", 1)[-1] if name and " " not in name else "Error"
+
+
+def last_line(error_message: str) -> str:
+    lines = [line for line in str(error_message).strip().splitlines() if line.strip()]
+    return lines[-1].strip() if lines else ""
+
+
+class _ErrorRecord:
+    __slots__ = ("first_seen", "last_seen", "last_emitted", "count", "suppressed", "message", "context")
+
+    def __init__(self, now: float, message: str, context: dict):
+        self.first_seen = now
+        self.last_seen = now
+        self.last_emitted = now
+        self.count = 1
+        self.suppressed = 0
+        self.message = message
+        self.context = context
+
+    def as_dict(self) -> dict:
+        return {
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "occurrences": self.count,
+            "suppressed": self.suppressed,
+            "message": self.message,
+        }
+
+
+class ErrorAggregator:
+    """
+        Collapses repeated errors of a machine into first / summary / recovered notices.
+
+        Errors are keyed by `(machine_id, error_class, function)`. The first
+        occurrence is emitted straight away; repeats are only counted and a
+        summary with the count is emitted every `summary_interval` seconds
+        while they keep coming. `resolve(machine_id, function)` after a
+        success emits one `recovered` notice per open key and forgets it.
+
+        `emit(status, machine_id, function, error_class, details)` does the
+        actual publishing.
+    """
+
+    def __init__(self, emit: Callable[[str, str, str, str, dict], None], summary_interval: float = 60.0):
+        self._emit = emit
+        self.summary_interval = summary_interval
+        self._records: Dict[Tuple[str, str, str], _ErrorRecord] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._summary_loop, name="error-aggregator", daemon=True)
+            self._thread.start()
+
+    def report(self, machine_id: str, function: str, error_class: str, message: str, context: dict = None) -> bool:
+        """Count an error; True when it is the first of its key and has been emitted"""
+        key = (str(machine_id), error_class, function)
+        now = time.time()
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                record = self._records[key] = _ErrorRecord(now, message, context or {})
+                details = record.as_dict()
+                self._start()
+            else:
+                record.count += 1
+                record.suppressed += 1
+                record.last_seen = now
+                record.message = message
+                record.context = context or record.context
+                return False
+        self._publish(FIRST, key, details, context or {})
+        return True
+
+    def resolve(self, machine_id: str, function: str) -> int:
+        """Close every open error of `function` on `machine_id`, emitting one recovered notice each"""
+        if not self._records:
+            return 0
+        machine_id = str(machine_id)
+        with self._lock:
+            keys = [key for key in self._records if key[0] == machine_id and key[2] == function]
+            closed = [(key, self._records.pop(key)) for key in keys]
+        now = time.time()
+        for key, record in closed:
+            details = record.as_dict()
+            details["duration"] = now - record.first_seen
+            self._publish(RECOVERED, key, details, record.context)
+        return len(closed)
+
+    def forget(self, machine_id: str) -> None:
+        """Drop the open errors of a removed machine without announcing a recovery"""
+        machine_id = str(machine_id)
+        with self._lock:
+            for key in [key for key in self._records if key[0] == machine_id]:
+                del self._records[key]
+
+    def flush(self, now: float = None) -> int:
+        """Emit summaries for keys with suppressed repeats whose interval has passed"""
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            for key, record in self._records.items():
+                if record.suppressed and now - record.last_emitted >= self.summary_interval:
+                    due.append((key, record.as_dict(), record.context))
+                    record.suppressed = 0
+                    record.last_emitted = now
+        for key, details, context in due:
+            self._publish(SUMMARY, key, details, context)
+        return len(due)
+
+    def _summary_loop(self) -> None:
+        while True:
+            time.sleep(min(self.summary_interval, 1.0))
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing error summaries: {e}")
+
+    def _publish(self, status: str, key: Tuple[str, str, str], details: dict, context: dict) -> None:
+        machine_id, error_class, function = key
+        if status == FIRST:
+            logger.error(f"{function} failed on {machine_id}: {last_line(details['message'])}")
+        elif status == SUMMARY:
+            logger.error(f"{function} on {machine_id}: {error_class} repeated {details['suppressed']} times")
+        else:
+            logger.info(f"{function} on {machine_id} recovered from {error_class} after {details['occurrences']} errors")
+        try:
+            self._emit(status, machine_id, function, error_class, dict(details, **context))
+        except Exception as e:
+            logger.error(f"Error publishing {status} notice for {machine_id}: {e}")
+
+    def active(self) -> List[dict]:
+        with self._lock:
+            return [
+                dict(record.as_dict(), machine_id=key[0], error_class=key[1], function=key[2])
+                for key, record in self._records.items()
+            ]
@@ -1,25 +1,20 @@
-from redis_driver import RedisDriver
-import json
+from app import app
+from logger_setup import LoggerSetup
 
-def send_error(uid: str, error_code:str, error_message: str, error_name: str, error_args: dict):
+logger = LoggerSetup.get_logger()
+
+def send_error(uid: str, error_code:str, error_message: str, error_name: str, error_args: dict = None):
     """
-        Used for registering error on machine module
+        Used for registering error on machine module. Goes through the app's
+        error aggregator, so repeats are counted instead of published again.
     """
-    # client = RPCCLient.get_client()
     try:
-        # client.register_error(
-        #     uid,
-        #     error_message,
-        #     json.dumps(error_args),
-        #     error_code,
-        #     error_name
-        # )
-        RedisDriver.publish('error_queue', json.dumps({
-            'error_name': error_name,
-            'error_code': error_code,
-            'error_args': error_args,
-            'error_message': error_message,
-            "machine_id": uid
-        }))
+        app.send_error(
+            error_message=error_message,
+            event_name=error_name,
+            machine_id=uid,
+            event_args=dict(error_args or {}, error_code=error_code),
+            event_type="call_function"
+        )
     except Exception as e:
-        print(f"Issue while registering error: {e}")
\ No newline at end of file
+        logger.error(f"Issue while registering error: {e}", extra={"machine_id": uid, "error_key": error_name})
@@ -0,0 +1,291 @@
+import argparse
+import ctypes
+import json
+import os
+import random
+import threading
+import time
+import uuid
+import xmlrpc.client
+from typing import Dict, List, Optional
+import redis
+
+RESPONSE_CHANNEL = "call_function_response"
+ERROR_CHANNEL = "error_queue"
+SIM_DB = 1
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def signal_table(count: int) -> Dict[str, dict]:
+    """`count` int signals laid out back to back in the simulated DB"""
+    return {f"load_{i}": {"type": "int", "db_number": SIM_DB, "offset": i * 2} for i in range(count)}
+
+
+def start_simulator(signal_count: int):
+    """snap7 server on port 102 with the load signals' DB registered"""
+    import snap7
+    server = snap7.server.Server()
+    data = (ctypes.c_uint8 * max(2, signal_count * 2))()
+    server.register_area(snap7.types.srvAreaDB, SIM_DB, data)
+    server.start()
+    return server, data
+
+
+class LoadTest:
+    """
+        Open-loop load generator for the call-function pipeline.
+
+        Publishes call messages for `machines` simulated machines at `rate`
+        messages per second, matches every `call_function_response` (and
+        every error carrying a sync_id) to its request and reports
+        throughput, latency percentiles and error rates.
+    """
+
+    def __init__(self, server: redis.Redis, module_name: str = "s7comm", machines: List[str] = (),
+                 signals: List[str] = (), mix: Dict[str, float] = None, batch: int = 5):
+        self._server = server
+        self._channel = f"{module_name}_call_functions"
+        self.machines = list(machines)
+        self.signals = list(signals)
+        self.mix = mix or {"read_multiple_signals": 1.0}
+        self.batch = batch
+        self._lock = threading.Lock()
+        self._sent: Dict[str, tuple] = {}
+        self._latencies: Dict[str, List[float]] = {}
+        self._errors: Dict[str, int] = {}
+        self._received = 0
+        self._unmatched = 0
+        self._subscribed = threading.Event()
+        self._stop = threading.Event()
+
+    def _kargs(self, function_name: str) -> dict:
+        if function_name == "send_signal":
+            return {"signal": random.choice(self.signals), "value": random.randint(0, 32000)}
+        if function_name == "read_signal":
+            return {"signal": random.choice(self.signals)}
+        if function_name == "send_multiple_signals":
+            signals = random.sample(self.signals, min(self.batch, len(self.signals)))
+            return {"signals": signals, "values": [random.randint(0, 32000) for _ in signals]}
+        return {"signals": random.sample(self.signals, min(self.batch, len(self.signals)))}
+
+    def _message(self, function_name: str, machine_id: str) -> dict:
+        sync_id = uuid.uuid4().hex
+        return {
+            "function_name": function_name,
+            "machine_id": machine_id,
+            "args": json.dumps(self._kargs(function_name)),
+            "sync_id": sync_id,
+            "node_id": "loadtest",
+            "flow_id": "loadtest",
+            "time": time.time()
+        }
+
+    def _listen(self) -> None:
+        pubsub = self._server.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(RESPONSE_CHANNEL, ERROR_CHANNEL)
+        self._subscribed.set()
+        while not self._stop.is_set():
+            message = pubsub.get_message(timeout=0.2)
+            if message is None:
+                continue
+            received = time.perf_counter()
+            try:
+                payload = json.loads(message["data"])
+            except (TypeError, ValueError):
+                continue
+            self._record(message["channel"], payload, received)
+        pubsub.close()
+
+    def _record(self, channel: str, payload: dict, received: float) -> None:
+        sync_id = payload.get("sync_id")
+        with self._lock:
+            sent = self._sent.pop(sync_id, None)
+            if sent is None:
+                if channel == RESPONSE_CHANNEL:
+                    self._unmatched += 1
+                return
+            function_name, sent_at = sent
+            self._received += 1
+            self._latencies.setdefault(function_name, []).append(received - sent_at)
+            data = payload.get("event_data")
+            failed = channel == ERROR_CHANNEL or (
+                isinstance(data, dict) and (data.get("error") or data.get("success") is False)
+            )
+            if failed:
+                self._errors[function_name] = self._errors.get(function_name, 0) + 1
+
+    def run(self, rate: float, duration: float, grace: float = 5.0) -> dict:
+        listener = threading.Thread(target=self._listen, name="loadtest-listener", daemon=True)
+        listener.start()
+        self._subscribed.wait(5)
+
+        functions = list(self.mix)
+        weights = [self.mix[name] for name in functions]
+        interval = 1.0 / rate
+        started = time.perf_counter()
+        deadline = started + duration
+        next_send = started
+        sent = 0
+        pipe = self._server.pipeline(transaction=False)
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            # Publish everything that is due, pipelined, so the generator keeps up at high rates
+            due = 0
+            while next_send <= now and due < 1000:
+                function_name = random.choices(functions, weights)[0]
+                message = self._message(function_name, self.machines[sent % len(self.machines)])
+                with self._lock:
+                    self._sent[message["sync_id"]] = (function_name, time.perf_counter())
+                pipe.publish(self._channel, json.dumps(message))
+                next_send += interval
+                sent += 1
+                due += 1
+            if due:
+                pipe.execute()
+            time.sleep(max(0.0, min(next_send - time.perf_counter(), 0.01)))
+        send_time = time.perf_counter() - started
+
+        grace_deadline = time.perf_counter() + grace
+        while time.perf_counter() < grace_deadline:
+            with self._lock:
+                if not self._sent:
+                    break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        self._stop.set()
+        listener.join(2)
+        return self.report(sent, send_time, elapsed)
+
+    def report(self, sent: int, send_time: float, elapsed: float) -> dict:
+        with self._lock:
+            timed_out = {}
+            for function_name, _ in self._sent.values():
+                timed_out[function_name] = timed_out.get(function_name, 0) + 1
+            latencies = {name: list(values) for name, values in self._latencies.items()}
+            errors = dict(self._errors)
+            received = self._received
+            unmatched = self._unmatched
+
+        def summary(values: List[float]) -> dict:
+            return {
+                "count": len(values),
+                "p50_ms": _ms(percentile(values, 0.50)),
+                "p90_ms": _ms(percentile(values, 0.90)),
+                "p99_ms": _ms(percentile(values, 0.99)),
+                "max_ms": _ms(max(values) if values else None),
+            }
+
+        all_latencies = [value for values in latencies.values() for value in values]
+        failures = sum(errors.values()) + sum(timed_out.values())
+        return {
+            "sent": sent,
+            "received": received,
+            "offered_rate": round(sent / send_time, 1) if send_time else None,
+            "throughput": round(received / elapsed, 1) if elapsed else None,
+            "error_rate": round(failures / sent, 4) if sent else None,
+            "errors": errors,
+            "timed_out": timed_out,
+            "unmatched_responses": unmatched,
+            "latency": summary(all_latencies),
+            "by_function": {name: summary(values) for name, values in latencies.items()},
+        }
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 2)
+
+
+def register_machines(rpc_url: str, count: int, host: str, signals: Dict[str, dict]) -> List[str]:
+    """Add `count` machines pointing at `host` through the module's XML-RPC `add_machine`"""
+    proxy = xmlrpc.client.ServerProxy(rpc_url, allow_none=True)
+    machines = []
+    for i in range(count):
+        uid = f"loadtest_{i}"
+        # Distinct rack/slot pairs give every machine its own PLC connection on the simulator
+        config = {
+            "host": host,
+            "rack": (i // 32) % 8,
+            "slot": i % 32,
+            "signals_configuration": json.dumps(signals)
+        }
+        proxy.add_machine(uid, uid, json.dumps(config))
+        machines.append(uid)
+    return machines
+
+
+def remove_machines(rpc_url: str, machines: List[str]) -> None:
+    proxy = xmlrpc.client.ServerProxy(rpc_url, allow_none=True)
+    for uid in machines:
+        proxy.delete_machine(uid)
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency"]
+    print(f"sent {report['sent']} at {report['offered_rate']}/s, received {report['received']}, "
+          f"throughput {report['throughput']}/s, error rate {report['error_rate']}")
+    print(f"latency ms  p50 {latency['p50_ms']}  p90 {latency['p90_ms']}  p99 {latency['p99_ms']}  max {latency['max_ms']}")
+    for name, summary in report["by_function"].items():
+        print(f"  {name:<24} n={summary['count']:<7} p50 {summary['p50_ms']}  p99 {summary['p99_ms']}  "
+              f"errors {report['errors'].get(name, 0)}  timed out {report['timed_out'].get(name, 0)}")
+    if report["unmatched_responses"]:
+        print(f"{report['unmatched_responses']} responses did not belong to this run")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the call-function pipeline through Redis")
+    parser.add_argument("--redis-host", default=os.environ.get("REDIS_HOSTNAME", "localhost"))
+    parser.add_argument("--redis-port", type=int, default=int(os.environ.get("REDIS_PORT", 6379)))
+    parser.add_argument("--module", default="s7comm")
+    parser.add_argument("--rpc-url", default="http://127.0.0.1:1030", help="XML-RPC address of the running module")
+    parser.add_argument("--machines", type=int, default=10)
+    parser.add_argument("--signals", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=5, help="signals per read/send_multiple_signals call")
+    parser.add_argument("--rate", type=float, default=100, help="messages per second over all machines")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--grace", type=float, default=5, help="seconds to wait for late responses")
+    parser.add_argument("--mix", default="read_multiple_signals:0.7,send_signal:0.3")
+    parser.add_argument("--plc-host", default="127.0.0.1")
+    parser.add_argument("--simulate", action="store_true", help="serve the signals from a local snap7 server on port 102")
+    parser.add_argument("--keep-machines", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    arguments = parser.parse_args()
+
+    signals = signal_table(arguments.signals)
+    simulator = start_simulator(arguments.signals) if arguments.simulate else None
+    machines = register_machines(arguments.rpc_url, arguments.machines, arguments.plc_host, signals)
+    try:
+        test = LoadTest(
+            redis.Redis(host=arguments.redis_host, port=arguments.redis_port, decode_responses=True),
+            module_name=arguments.module,
+            machines=machines,
+            signals=list(signals),
+            mix=parse_mix(arguments.mix),
+            batch=arguments.batch
+        )
+        report = test.run(arguments.rate, arguments.duration, arguments.grace)
+        if arguments.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_report(report)
+    finally:
+        if not arguments.keep_machines:
+            remove_machines(arguments.rpc_url, machines)
+        if simulator is not None:
+            simulator[0].stop()
@@ -1,12 +1,53 @@
+import atexit
 import logging
 import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
 
 # path = os.path.dirname(os.path.realpath(__file__))
 
 # file_path = f"/system.log"
 # if os.environ.get("ENV") == "LOCAL":
 #     file_path = "./system.log"
-file_path = "./system.log"
+file_path = os.environ.get("LOG_FILE", "./system.log")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+        Lets the first record for a (machine, message) pair through and drops
+        repeats for `interval` seconds. The next record passed after the
+        interval carries a count of what was suppressed.
+
+        Callers can pass `extra={"machine_id": ..., "error_key": ...}` to
+        group messages whose text differs between occurrences.
+    """
+
+    def __init__(self, interval: float = 30.0, max_keys: int = 1000):
+        super().__init__()
+        self._interval = interval
+        self._max_keys = max_keys
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        error_key = getattr(record, "error_key", None)
+        if error_key is None and isinstance(record.args, tuple):
+            error_key = next((type(arg).__name__ for arg in record.args if isinstance(arg, BaseException)), None)
+        key = (getattr(record, "machine_id", None), record.msg, error_key)
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is not None and now - state[0] < self._interval:
+                state[1] += 1
+                return False
+            if state is not None and state[1]:
+                record.msg = f"{record.msg} (suppressed {state[1]} repeats in the last {now - state[0]:.0f}s)"
+            self._state[key] = [now, 0]
+            if len(self._state) > self._max_keys:
+                self._state = {k: v for k, v in self._state.items() if now - v[0] < self._interval}
+        return True
 
 
 class LoggerSetup:
@@ -14,26 +55,73 @@ class LoggerSetup:
     __logger = logging.getLogger(
         name='s7comm_logger'
     )
-    __stream_handler = logging.FileHandler(
-        filename=file_path,
-        mode='w'
-    )
+    __queue = queue.SimpleQueue()
+    __rate_limit = RateLimitFilter(interval=float(os.environ.get("LOG_RATE_LIMIT_INTERVAL", 30)))
+    __listeners = []
+    __configured = False
+    __setup_lock = threading.Lock()
 
     @classmethod
     def get_logger(cls):
+        if not cls.__configured:
+            cls.setup()
         return cls.__logger
 
     @classmethod
     def setup(cls):
-        current_level = os.environ.get('LOG_LEVEL')
-        if current_level == "DEBUG":
-            cls.__logger.setLevel(logging.DEBUG)
-        else:
-            cls.__logger.setLevel(logging.INFO)
-        cls.__stream_handler.setFormatter(
-            logging.Formatter(
-                '%(asctime)s - %(levelname)s - %(message)s',
-                datefmt='%d/%m/%Y %I:%M:%S %p'
+        with cls.__setup_lock:
+            if cls.__configured:
+                return
+            current_level = os.environ.get('LOG_LEVEL')
+            if current_level == "DEBUG":
+                cls.__logger.setLevel(logging.DEBUG)
+            else:
+                cls.__logger.setLevel(logging.INFO)
+            file_handler = logging.FileHandler(
+                filename=file_path,
+                mode='w'
+            )
+            file_handler.setFormatter(
+                logging.Formatter(
+                    '%(asctime)s - %(levelname)s - %(message)s',
+                    datefmt='%d/%m/%Y %I:%M:%S %p'
+                )
             )
-        )
-        cls.__logger.addHandler(cls.__stream_handler)
+            cls.__logger.addHandler(cls.__queue_handler())
+            cls.__start_listener(file_handler)
+            cls.__configured = True
+
+    @classmethod
+    def make_async(cls, logger: logging.Logger):
+        """Move the handlers of an externally configured logger behind a background log queue"""
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            return logger
+        log_queue = queue.SimpleQueue()
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(cls.__queue_handler(log_queue))
+        cls.__start_listener(*handlers, log_queue=log_queue)
+        return logger
+
+    @classmethod
+    def __queue_handler(cls, log_queue=None):
+        handler = QueueHandler(cls.__queue if log_queue is None else log_queue)
+        handler.addFilter(cls.__rate_limit)
+        return handler
+
+    @classmethod
+    def __start_listener(cls, *handlers, log_queue=None):
+        listener = QueueListener(cls.__queue if log_queue is None else log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        cls.__listeners.append(listener)
+
+    @classmethod
+    def shutdown(cls):
+        """Flush every queued record to disk"""
+        for listener in cls.__listeners:
+            listener.stop()
+        cls.__listeners = []
+
+
+atexit.register(LoggerSetup.shutdown)
@@ -1,13 +1,18 @@
 import json
 import time
 import threading
-import logging
-from plc import PLC, PLCConnectionError, PLCOperationError
-from call_functions import read_helper, write_helper
+from plc import PLC, PLCConnectionError, PLCOfflineError, PLCOperationError, READ_PDU_OVERHEAD, block_connections
+from call_functions import encode_helper, read_helper_sample
+from request_queue import RequestPriority, request_priority
 from sdk_machine_module.integrator_manager import IntegratorManager
+from logger_setup import LoggerSetup
+from signal_catalog import with_catalog
+from snapshot import SignalSnapshot
+import shared_values
+from polling import AdaptivePoller
+from read_plan import GroupPlans, ReadPlan
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = LoggerSetup.get_logger()
 
 class StoppableThread(threading.Thread):
     __monitor_threads = {}
@@ -36,14 +41,144 @@ class StoppableThread(threading.Thread):
             thread.stop_event.set()
             del cls.__monitor_threads[key]
     
+    @classmethod
+    def keys_for(cls, uid):
+        with cls.__lock:
+            return [key for key, thread in cls.__monitor_threads.items() if thread.uid == uid]
+    
     @staticmethod
-    def reconnect(uid):
-        print(uid, "========")
+    def reconfigure(uid):
+        """Ask the monitors of `uid` to reload their machine configuration"""
         with StoppableThread.__lock:
-            print("acquire lock")
-            for thread in StoppableThread.__monitor_threads.values():
-                print(thread, "=======", thread.uid)
-                thread.refresh_event.set()
+            threads = [thread for thread in StoppableThread.__monitor_threads.values() if thread.uid == uid]
+        for thread in threads:
+            thread.refresh_event.set()
+        logger.info(f"Reconfiguring {len(threads)} monitor threads for {uid}")
+        return len(threads)
+
+    @classmethod
+    def snapshot(cls):
+        with cls.__lock:
+            threads = list(cls.__monitor_threads.items())
+        return [
+            {
+                "key": key,
+                "uid": thread.uid,
+                "name": thread.name,
+                "thread": thread.ident,
+                "alive": thread.is_alive(),
+                "stopping": thread.stop_event.is_set(),
+                "refresh_pending": thread.refresh_event.is_set()
+            }
+            for key, thread in threads
+        ]
+
+def connection_params(machine_config):
+    return (
+        machine_config["host"],
+        int(machine_config.get("rack", 0)),
+        int(machine_config.get("slot", 1))
+    )
+
+def monitor_signal_names(group_config):
+    names = set(group_config)
+    for config in group_config.values():
+        if isinstance(config, dict):
+            if config.get("ack_signal"):
+                names.add(config["ack_signal"])
+            names.update(config.get("signals", []))
+    return names
+
+def load_monitor_signals(machine_config, group):
+    """
+        `(signals_config, group_config)`, with the catalog signals of every
+        monitor group merged in. All groups of a machine get the same signal
+        set, so the shared value table built from it keeps its layout.
+    """
+    signals_config = json.loads(machine_config.get("signals_configuration") or "{}")
+    monitor_config = signals_config.get("monitor_signals", {})
+    names = set()
+    for name, config in monitor_config.items():
+        if name != "polling" and isinstance(config, dict):
+            names |= monitor_signal_names(config)
+    return with_catalog(machine_config, signals_config, sorted(names)), monitor_config.get(group) or {}
+
+def reload_monitor_plan(uid, group, signals_config, monitor_signals, machine_config, prev_values):
+    """
+        Diff a freshly loaded signal plan against the running one.
+
+        Prior values survive for signals whose definition did not change;
+        signals that were removed or re-addressed start from scratch.
+    """
+    new_signals_config, new_monitor_signals = load_monitor_signals(machine_config, group)
+
+    for signal in list(prev_values):
+        if signal not in new_monitor_signals or new_signals_config.get(signal) != signals_config.get(signal):
+            del prev_values[signal]
+
+    added = set(new_monitor_signals) - set(monitor_signals)
+    removed = set(monitor_signals) - set(new_monitor_signals)
+    changed = {
+        signal for signal in set(new_monitor_signals) & set(monitor_signals)
+        if new_signals_config.get(signal) != signals_config.get(signal)
+        or new_monitor_signals[signal] != monitor_signals[signal]
+    }
+    logger.info(f"Reloaded {group} plan for {uid}: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+    return new_signals_config, new_monitor_signals
+
+def refresh_monitor(app, uid, group, plc, signals_config, monitor_signals, prev_values):
+    """Apply the current machine config to a running monitor, switching PLC only if its address changed or it was closed"""
+    machine_config = app.get_machine_config(uid=uid)
+    if not machine_config:
+        logger.warning(f"Machine {uid} has no configuration, keeping current {group} plan")
+        return plc, signals_config, monitor_signals
+
+    signals_config, monitor_signals = reload_monitor_plan(
+        uid, group, signals_config, monitor_signals, machine_config, prev_values
+    )
+    params = connection_params(machine_config)
+    if plc.is_closed:
+        # Released or re-tracked while this monitor still held it
+        logger.info(f"PLC of {uid} was closed, reconnecting to {params[0]}")
+        prev_values.clear()
+    elif params != (plc._host, plc._rack, plc._slot):
+        logger.info(f"Connection parameters for {uid} changed, reconnecting to {params[0]}")
+        prev_values.clear()
+    # Same instance when the address is unchanged; picks up a new block_connections
+    plc = PLC(*params, uid=uid, block_connections=block_connections(machine_config))
+    return plc, signals_config, monitor_signals
+
+def wait_for_plc(plc, stop_event, refresh_event):
+    """Wait for `plc` to come back online, leaving early when the monitor is stopped or reconfigured or the PLC closed"""
+    while not stop_event.is_set() and not refresh_event.is_set() and not plc.is_closed:
+        if plc.wait_online(timeout=1.0):
+            return
+
+def publish_samples(uid, plc, signals_config, samples):
+    """Make one monitor cycle's `{signal: (value, timestamp)}` visible to readers outside the monitor"""
+    SignalSnapshot.publish(plc.key, {
+        SignalSnapshot.address(signals_config[signal]): sample for signal, sample in samples.items()
+    })
+    if shared_values.enabled():
+        shared_values.SharedValueTable.publish(uid, signals_config, samples)
+
+def flush_acks(plc, signals_config, acks, written_acks):
+    """Write a cycle's `{ack_signal: value}` in one batch, skipping values already written"""
+    pending = {
+        signal: value for signal, value in acks.items()
+        if signal not in written_acks or written_acks[signal] != value
+    }
+    if not pending:
+        return
+    items = []
+    for signal, value in pending.items():
+        ack_signal_config = signals_config.get(signal)
+        if ack_signal_config is None:
+            raise ValueError(f"Invalid ack signal: {signal}")
+        items.append(encode_helper(ack_signal_config, value))
+    with request_priority(RequestPriority.ACK):
+        plc.write_multi(items)
+    written_acks.update(pending)
 
 def stop_thread(uid, function_name, signal=None):
     key = uid + function_name
@@ -55,15 +190,23 @@ def stop_thread(uid, function_name, signal=None):
         return [True, f"Thread {key} stopped"]
     return [False, f"Thread {key} not found"]
 
+def release_machine(uid):
+    """Stop everything running for a removed machine and let go of its PLC connection"""
+    stop_all_threads(uid)
+    key = PLC.release_machine(uid)
+    if key is not None:
+        SignalSnapshot.discard(key)
+    GroupPlans.discard(uid)
+    logger.info(f"Released machine {uid}")
+
 def stop_all_threads(uid):
-    with StoppableThread.__lock:
-        keys_to_remove = [key for key, thread in StoppableThread.__monitor_threads.items() 
-                          if thread.uid == uid]
+    keys_to_remove = StoppableThread.keys_for(uid)
     
     stopped_count = 0
     for key in keys_to_remove:
         StoppableThread.discard_thread(key)
         stopped_count += 1
+    shared_values.SharedValueTable.discard(uid)
     
     return [True, f"Stopped {stopped_count} threads"]
 
@@ -72,33 +215,39 @@ def monitor_on_change(app: IntegratorManager, uid, kargs):
 
     def __monitor_on_change(stop_event, refresh_event, uid, kargs, machine_config):
         app.log_statement(f"Monitoring On Change")
+        poller = None
         try:
-            host = machine_config["host"]
-            rack = int(machine_config.get("rack", 0))  
-            slot = int(machine_config.get("slot", 1))  
-            signals_config = json.loads(machine_config["signals_configuration"])
+            signals_config, _ = load_monitor_signals(machine_config, "on_change")
             
-            plc = PLC(host, rack, slot)
+            plc = PLC(*connection_params(machine_config), uid=uid, block_connections=block_connections(machine_config))
             
             monitor_config = signals_config.get("monitor_signals", {})
             if not monitor_config:
-                logger.error("No monitor_on_change configuration found")
+                logger.error("No monitor_on_change configuration found", extra={"machine_id": uid, "error_key": "monitor_on_change"})
                 return
                 
             monitor_on_change_signals = monitor_config.get("on_change")
+            poller = AdaptivePoller.for_monitor(uid, "on_change", monitor_config)
             prev_values = {}
+            written_acks = {}
             
             while not stop_event.is_set():
                 try:
-                    if refresh_event.is_set():
-                        logger.info("Refreshing Connection")
-                        plc = PLC(host, rack, slot)
+                    if refresh_event.is_set() or plc.is_closed:
                         refresh_event.clear()
+                        plc, signals_config, monitor_on_change_signals = refresh_monitor(
+                            app, uid, "on_change", plc, signals_config, monitor_on_change_signals, prev_values
+                        )
+                        written_acks.clear()
+                        poller.configure(signals_config.get("monitor_signals", {}).get("polling", {}).get("on_change"))
                         
                     response = {}
+                    samples = {}
+                    acks = {}
                     for signal, config in monitor_on_change_signals.items():
                         signal_config = signals_config.get(signal)
-                        result = read_helper(signal_config, plc)
+                        result, timestamp = read_helper_sample(signal_config, plc, uid=uid)
+                        samples[signal] = (result, timestamp)
                         prev_value = prev_values.get(signal)
                         
                         if prev_value is None or prev_value != result:
@@ -113,24 +262,35 @@ def monitor_on_change(app: IntegratorManager, uid, kargs):
                                 if ack_value == "same":
                                     value = result
                                     
-                                ack_signal_config = signals_config.get(ack_signal)
-                                write_helper(ack_signal_config, plc, value)
+                                acks[ack_signal] = value
                                 
+                    flush_acks(plc, signals_config, acks, written_acks)
+                    publish_samples(uid, plc, signals_config, samples)
                     if response:
                         app.send_event(event_name="monitor_on_change_response", 
                                       response=json.dumps(response), 
                                       machine_id=uid)
-                    time.sleep(2)
+                    # A change still being debounced already counts, so the next reads come quickly
+                    poller.record_cycle(changed=plc.take_raw_change() or bool(response))
+                    app.resolve_error(uid, "monitor_on_change")
+                    poller.wait(stop_event, refresh_event)
+                    
+                except PLCOfflineError as e:
+                    app.report_error(uid, "monitor_on_change", e)
+                    wait_for_plc(plc, stop_event, refresh_event)
+                    # The PLC may have restarted with its ack signals reset
+                    written_acks.clear()
                     
                 except Exception as e:
-                    logger.error(f"Error monitoring on change: {e}")
-                    print(f"Error monitoring on change: {e}")
+                    app.report_error(uid, "monitor_on_change", e)
                     time.sleep(1)
                     
         except (PLCConnectionError, PLCOperationError) as e:
-            logger.error(f"PLC connection error: {e}")
-            print(f"PLC connection error: {e}")
+            logger.error(f"PLC connection error: {e}", extra={"machine_id": uid, "error_key": "monitor_on_change"})
             time.sleep(1)
+        finally:
+            if poller is not None:
+                poller.close()
             
     try:
         key = uid + "monitor_on_change"
@@ -155,46 +315,51 @@ def monitor_on_change(app: IntegratorManager, uid, kargs):
             logger.info(f"Started Monitoring thread for {uid}")
         else:
             logger.info(f"Monitoring thread for {uid} already running")
-            StoppableThread.reconnect(uid)
+            StoppableThread.reconfigure(uid)
     except Exception as e:
-        logger.error(f"Error starting monitoring thread: {e}")
-        print(f"Error starting monitoring thread: {e}")
+        logger.error(f"Error starting monitoring thread: {e}", extra={"machine_id": uid, "error_key": "monitor_on_change"})
         return [False, str(e)]
         
     return [True, f"Monitoring thread started for {uid}"]
 
 def monitor_continuously(app: IntegratorManager, uid, kargs):
     machine_config = app.get_machine_config(uid=uid)
-    print("monitor_continuously_running==================================")
     
     def __monitor_continuously(stop_event, refresh_event, uid, kargs, machine_config):
         app.log_statement(f"Monitoring Continuously")
+        poller = None
         try:
-            host = machine_config["host"]
-            rack = int(machine_config.get("rack", 0))
-            slot = int(machine_config.get("slot", 1)) 
-            signals_config = json.loads(machine_config["signals_configuration"])
+            signals_config, _ = load_monitor_signals(machine_config, "continuous")
             
-            plc = PLC(host, rack, slot)
+            plc = PLC(*connection_params(machine_config), uid=uid, block_connections=block_connections(machine_config))
             
             monitor_config = signals_config.get("monitor_signals", {})
             if not monitor_config:
-                logger.error("No monitor_continuous configuration found")
+                logger.error("No monitor_continuous configuration found", extra={"machine_id": uid, "error_key": "monitor_continuous"})
                 return
                 
             monitor_continuous_signals = monitor_config.get("continuous")
+            poller = AdaptivePoller.for_monitor(uid, "continuous", monitor_config)
+            written_acks = {}
+            last_response = None
             
             while not stop_event.is_set():
                 try:
-                    if refresh_event.is_set():
-                        logger.info("Refreshing Connection")
-                        plc = PLC(host, rack, slot)
+                    if refresh_event.is_set() or plc.is_closed:
                         refresh_event.clear()
+                        plc, signals_config, monitor_continuous_signals = refresh_monitor(
+                            app, uid, "continuous", plc, signals_config, monitor_continuous_signals, {}
+                        )
+                        written_acks.clear()
+                        poller.configure(signals_config.get("monitor_signals", {}).get("polling", {}).get("continuous"))
                         
                     response = {}
+                    samples = {}
+                    acks = {}
                     for signal, config in monitor_continuous_signals.items():
                         signal_config = signals_config.get(signal)
-                        result = read_helper(signal_config, plc)
+                        result, timestamp = read_helper_sample(signal_config, plc, uid=uid)
+                        samples[signal] = (result, timestamp)
                         response[signal] = result
                         
                         if config.get('ack'):
@@ -205,24 +370,34 @@ def monitor_continuously(app: IntegratorManager, uid, kargs):
                             if ack_value == "same":
                                 value = result
                                 
-                            ack_signal_config = signals_config.get(ack_signal)
-                            write_helper(ack_signal_config, plc, value)
+                            acks[ack_signal] = value
                             
-                    print("sending event----------", response)
+                    flush_acks(plc, signals_config, acks, written_acks)
+                    publish_samples(uid, plc, signals_config, samples)
                     app.send_event(event_name="monitor_continuously_response", 
                                   response=json.dumps(response), 
                                   machine_id=uid)
-                    time.sleep(5)
+                    poller.record_cycle(changed=plc.take_raw_change() or response != last_response)
+                    app.resolve_error(uid, "monitor_continuously")
+                    last_response = response
+                    poller.wait(stop_event, refresh_event)
+                    
+                except PLCOfflineError as e:
+                    app.report_error(uid, "monitor_continuously", e)
+                    wait_for_plc(plc, stop_event, refresh_event)
+                    # The PLC may have restarted with its ack signals reset
+                    written_acks.clear()
                     
                 except Exception as e:
-                    logger.error(f"Error monitoring continuously: {e}")
-                    print(f"Error monitoring continuously: {e}")
+                    app.report_error(uid, "monitor_continuously", e)
                     time.sleep(1)
                     
         except (PLCConnectionError, PLCOperationError) as e:
-            logger.error(f"PLC connection error: {e}")
-            print(f"PLC connection error: {e}")
+            logger.error(f"PLC connection error: {e}", extra={"machine_id": uid, "error_key": "monitor_continuous"})
             time.sleep(1)
+        finally:
+            if poller is not None:
+                poller.close()
             
     try:
         key = uid + "monitor_continuously"
@@ -247,10 +422,163 @@ def monitor_continuously(app: IntegratorManager, uid, kargs):
             logger.info(f"Started Monitoring thread for {uid}")
         else:
             logger.info(f"Monitoring thread for {uid} already running")
-            StoppableThread.reconnect(uid)
+            StoppableThread.reconfigure(uid)
+    except Exception as e:
+        logger.error(f"Error starting monitoring thread: {e}", extra={"machine_id": uid, "error_key": "monitor_continuous"})
+        return [False, str(e)]
+        
+    return [True, f"Monitoring thread started for {uid}"]
+
+def plan_triggers(plc, signals_config, triggers):
+    """One read plan covering every trigger signal, and one per trigger for its data signals"""
+    max_range = plc.pdu_size - READ_PDU_OVERHEAD
+    trigger_plan = ReadPlan(signals_config, triggers.keys(), max_range=max_range)
+    data_plans = {
+        trigger: ReadPlan(signals_config, config.get("signals", []), max_range=max_range)
+        for trigger, config in triggers.items()
+    }
+    return trigger_plan, data_plans
+
+def trigger_fired(edge, previous, value):
+    if edge == "falling":
+        return bool(previous) and not value
+    if edge == "change":
+        return previous is not None and previous != value
+    if edge == "both":
+        return bool(previous) != bool(value)
+    return not previous and bool(value)
+
+def capture_trigger(app, uid, plc, signals_config, trigger, config, plan, value):
+    """Read a trigger's data as one snapshot, acknowledge it and publish it as a single event"""
+    timestamp = time.time()
+    values = plan.decode(plc.read_ranges(plan.ranges))
+    
+    if config.get("ack"):
+        ack_value = config.get("ack_value", True)
+        if ack_value == "same":
+            ack_value = value
+        with request_priority(RequestPriority.ACK):
+            plc.write_multi([encode_helper(signals_config[config["ack_signal"]], ack_value)])
+    
+    publish_samples(uid, plc, signals_config, {name: (result, timestamp) for name, result in values.items()})
+    app.send_event(event_name="monitor_on_trigger_response", 
+                  response=json.dumps({
+                      "trigger": trigger,
+                      "value": value,
+                      "timestamp": timestamp,
+                      "values": values
+                  }), 
+                  machine_id=uid)
+
+def reset_trigger_ack(plc, signals_config, config):
+    with request_priority(RequestPriority.ACK):
+        plc.write_multi([encode_helper(signals_config[config["ack_signal"]], config.get("ack_reset_value", False))])
+
+def monitor_on_trigger(app: IntegratorManager, uid, kargs):
+    """
+        Polls only the trigger signals of `monitor_signals.on_trigger`:
+
+            "on_trigger": {
+                "part_complete": {
+                    "edge": "rising",
+                    "signals": ["part_id", "torque", "angle"],
+                    "ack": true, "ack_signal": "part_ack", "ack_value": true, "ack_reset": true
+                }
+            }
+
+        On the configured edge (rising, falling, both, or change for non-bool
+        triggers) the trigger's data signals are read together in as few
+        requests as possible and published as one event. With `ack_reset` the
+        ack is written back to `ack_reset_value` once the trigger falls.
+    """
+    machine_config = app.get_machine_config(uid=uid)
+    
+    def __monitor_on_trigger(stop_event, refresh_event, uid, kargs, machine_config):
+        app.log_statement(f"Monitoring On Trigger")
+        poller = None
+        try:
+            signals_config, _ = load_monitor_signals(machine_config, "on_trigger")
+            
+            plc = PLC(*connection_params(machine_config), uid=uid, block_connections=block_connections(machine_config))
+            
+            monitor_config = signals_config.get("monitor_signals", {})
+            triggers = monitor_config.get("on_trigger")
+            if not triggers:
+                logger.error("No monitor_on_trigger configuration found", extra={"machine_id": uid, "error_key": "monitor_on_trigger"})
+                return
+            
+            poller = AdaptivePoller.for_monitor(uid, "on_trigger", monitor_config)
+            trigger_plan, data_plans = plan_triggers(plc, signals_config, triggers)
+            states = {}
+            
+            while not stop_event.is_set():
+                try:
+                    if refresh_event.is_set() or plc.is_closed:
+                        refresh_event.clear()
+                        plc, signals_config, triggers = refresh_monitor(
+                            app, uid, "on_trigger", plc, signals_config, triggers, states
+                        )
+                        poller.configure(signals_config.get("monitor_signals", {}).get("polling", {}).get("on_trigger"))
+                        trigger_plan, data_plans = plan_triggers(plc, signals_config, triggers)
+                    
+                    levels = trigger_plan.decode(plc.read_ranges(trigger_plan.ranges))
+                    fired = False
+                    for trigger, config in triggers.items():
+                        value = levels[trigger]
+                        previous = states.get(trigger)
+                        # The state only advances once the edge is handled, so a failed capture is retried
+                        if trigger_fired(config.get("edge", "rising"), previous, value):
+                            capture_trigger(app, uid, plc, signals_config, trigger, config, data_plans[trigger], value)
+                            fired = True
+                        elif previous and not value and config.get("ack") and config.get("ack_reset"):
+                            reset_trigger_ack(plc, signals_config, config)
+                        states[trigger] = value
+                    
+                    poller.record_cycle(changed=fired)
+                    app.resolve_error(uid, "monitor_on_trigger")
+                    poller.wait(stop_event, refresh_event)
+                    
+                except PLCOfflineError as e:
+                    app.report_error(uid, "monitor_on_trigger", e)
+                    wait_for_plc(plc, stop_event, refresh_event)
+                    
+                except Exception as e:
+                    app.report_error(uid, "monitor_on_trigger", e)
+                    time.sleep(1)
+                    
+        except (PLCConnectionError, PLCOperationError) as e:
+            logger.error(f"PLC connection error: {e}", extra={"machine_id": uid, "error_key": "monitor_on_trigger"})
+            time.sleep(1)
+        finally:
+            if poller is not None:
+                poller.close()
+            
+    try:
+        key = uid + "monitor_on_trigger"
+        if not StoppableThread.check_thread(key):
+            stop_event, refresh_event = threading.Event(), threading.Event()
+            thread = StoppableThread(
+                uid=uid,
+                stop_event=stop_event,
+                refresh_event=refresh_event,
+                target=__monitor_on_trigger,
+                kwargs={
+                    "stop_event": stop_event,
+                    "refresh_event": refresh_event,
+                    "uid": uid,
+                    "kargs": kargs,
+                    "machine_config": machine_config
+                }
+            )
+            StoppableThread.set_thread(key, thread)
+            thread.daemon = True
+            thread.start()
+            logger.info(f"Started Monitoring thread for {uid}")
+        else:
+            logger.info(f"Monitoring thread for {uid} already running")
+            StoppableThread.reconfigure(uid)
     except Exception as e:
-        logger.error(f"Error starting monitoring thread: {e}")
-        print(f"Error starting monitoring thread: {e}")
+        logger.error(f"Error starting monitoring thread: {e}", extra={"machine_id": uid, "error_key": "monitor_on_trigger"})
         return [False, str(e)]
         
     return [True, f"Monitoring thread started for {uid}"]
@@ -258,4 +586,5 @@ def monitor_continuously(app: IntegratorManager, uid, kargs):
 MONITOR_FUNCTIONS_MAP = {
     "monitor_on_change": monitor_on_change,
     "monitor_continuously": monitor_continuously,
+    "monitor_on_trigger": monitor_on_trigger,
 }
\ No newline at end of file
@@ -1,58 +1,333 @@
-from logging import getLogger
-from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import POINTER, byref, c_int32, c_uint8, cast
+import os
+import random
+import threading
 import time
-from typing import Dict, Any, Tuple, Union, List
+from typing import Callable, Dict, Any, Optional, Tuple, Union, List
 import snap7
-from snap7.util import get_bool, get_int, get_real, get_string, set_bool, set_int, set_real, set_string
+from snap7.common import check_error
+from snap7.types import Areas, S7DataItem, S7WLBit, S7WLByte
+from snap7.util import get_bool, get_dint, get_int, get_real, set_bool, set_dint, set_int, set_real, set_string
+from circuit_breaker import CircuitBreaker
+from logger_setup import LoggerSetup
+from request_queue import PLCRequestQueue, RequestPriority, RequestQueueFullError
 
-logger = getLogger(__name__)
+logger = LoggerSetup.get_logger()
+
+# S7 protocol overhead per PDU for a single-item read response / write request
+READ_PDU_OVERHEAD = 18
+WRITE_PDU_OVERHEAD = 28
+# S7 limit on variables in one multi-variable request, and the request bytes
+# each variable costs on top of its data
+MAX_MULTI_VARS = 20
+MULTI_WRITE_ITEM_OVERHEAD = 16
+MULTI_READ_ITEM_OVERHEAD = 12
+
+# Open connections kept across all PLCs, and how long an unused one stays open
+MAX_PLC_CONNECTIONS = int(os.environ.get("PLC_MAX_CONNECTIONS", 128))
+PLC_IDLE_TIMEOUT = float(os.environ.get("PLC_IDLE_TIMEOUT", 600))
+REAP_INTERVAL = 30.0
+# Connections a large block transfer is spread over, main connection included;
+# machines override it with "block_connections" in their config
+PLC_BLOCK_CONNECTIONS = int(os.environ.get("PLC_BLOCK_CONNECTIONS", 1))
+
+# Memory areas a signal can live in: data blocks, process inputs (I),
+# process outputs (Q) and markers (M). Signals without an area are in a DB.
+AREAS = {"DB": Areas.DB, "PE": Areas.PE, "PA": Areas.PA, "MK": Areas.MK}
+
+def area_code(area: str) -> Areas:
+    try:
+        return AREAS[area]
+    except KeyError:
+        raise ValueError(f"Unsupported area: {area}")
+
+def block_connections(machine_config: dict) -> int:
+    return max(1, int(machine_config.get("block_connections", PLC_BLOCK_CONNECTIONS)))
+
+def item_area(item: tuple, index: int) -> str:
+    """Area of a read range or write item, which leaves it out for DBs"""
+    return item[index] if len(item) > index else "DB"
 
 class PLCConnectionError(Exception):
     pass
 
+class PLCOfflineError(PLCConnectionError):
+    pass
+
 class PLCOperationError(Exception):
     pass
 
 class PLC:
+    """
+        One shared instance per PLC address.
+
+        Machines register with `PLC(..., uid=uid)`; an instance is closed once
+        the last machine using it is released or moves to another address.
+        A background reaper disconnects connections that have been idle for
+        PLC_IDLE_TIMEOUT and the least recently used ones beyond
+        MAX_PLC_CONNECTIONS; they reconnect on their next request. Instances
+        no machine has registered for are dropped instead.
+
+        Block transfers larger than one PDU are spread over `block_connections`
+        connections (PLC_BLOCK_CONNECTIONS, or "block_connections" in the
+        machine config); the extra ones are opened on the first such transfer.
+    """
     __instances: Dict[str, 'PLC'] = {}
+    __instances_lock = threading.Lock()
+    __machines: Dict[str, str] = {}
+    __reaper: Optional[threading.Thread] = None
+    __reaper_wakeup = threading.Event()
     __signal_cache: Dict[str, Tuple[float, Any, int]] = {} 
     
-    def __new__(cls, host: str, rack: int, slot: int, *args, **kwargs) -> 'PLC':
+    def __new__(cls, host: str, rack: int, slot: int, *args, uid: str = None, **kwargs) -> 'PLC':
         key = f"{host}:{rack}:{slot}"
-        if key not in cls.__instances:
-            instance = super().__new__(cls)
-            instance.__initialized = False
-            instance._host = host
-            instance._rack = rack
-            instance._slot = slot
-            instance._lock = Lock()
-            instance._plc = None
-            instance._max_retries = kwargs.get('max_retries', 3)
-            instance._retry_delay = kwargs.get('retry_delay', 1.0)
-            instance._signal_params = {
-                'cache_time': kwargs.get('cache_time', 0.05), 
-                'consecutive_reads': kwargs.get('consecutive_reads', 3),
-                'max_cache_entries': kwargs.get('max_cache_entries', 1000)  
-            }
-            
-            try:
-                instance._initialize_connection()
+        released = None
+        with cls.__instances_lock:
+            if key not in cls.__instances:
+                instance = super().__new__(cls)
+                instance.__initialized = False
+                instance._key = key
+                instance._host = host
+                instance._rack = rack
+                instance._slot = slot
+                instance._request_queue = PLCRequestQueue(
+                    max_depth=kwargs.get('max_queue_depth', 64),
+                    aging_interval=kwargs.get('queue_aging_interval', 0.5)
+                )
+                instance._request_timeout = kwargs.get('request_timeout', 5.0)
+                instance._plc = None
+                instance._max_retries = kwargs.get('max_retries', 3)
+                instance._retry_delay = kwargs.get('retry_delay', 1.0)
+                instance._max_retry_delay = kwargs.get('max_retry_delay', 30.0)
+                instance._connect_timeout = kwargs.get('connect_timeout', 5.0)
+                instance._pdu_size = 240
+                instance._block_connections = PLC_BLOCK_CONNECTIONS
+                instance._block_clients = []
+                instance._block_lock = threading.Lock()
+                instance._block_executor = None
+                instance._block_workers = 0
+                instance._raw_change = threading.local()
+                instance._signal_params = {
+                    'cache_time': kwargs.get('cache_time', 0.05), 
+                    'consecutive_reads': kwargs.get('consecutive_reads', 3),
+                    'max_cache_entries': kwargs.get('max_cache_entries', 1000)  
+                }
+                instance._breaker = CircuitBreaker(key)
+                instance._first_attempt = threading.Event()
+                instance._closed = threading.Event()
+                instance._reconnect_guard = threading.Lock()
+                instance._reconnect_thread = None
+                instance._users = set()
+                instance._last_used = time.monotonic()
+                instance._dormant = False
+                
                 cls.__instances[key] = instance
-            except PLCConnectionError as e:
-                logger.error(f"Failed to initialize PLC connection: {str(e)}")
-                raise
+                instance._schedule_reconnect()
+                cls.__start_reaper()
+                if len(cls.__instances) > MAX_PLC_CONNECTIONS:
+                    cls.__reaper_wakeup.set()
             
-        return cls.__instances[key]
-    
-    def _initialize_connection(self) -> None:
+            instance = cls.__instances[key]
+            if 'block_connections' in kwargs:
+                # Shared instance, so the machine registering last decides
+                instance._block_connections = max(1, int(kwargs['block_connections']))
+            if uid is not None:
+                released = cls.__track(uid, instance)
+        if released is not None:
+            released.close()
+        return instance
+
+    @classmethod
+    def __track(cls, uid: str, instance: 'PLC') -> Optional['PLC']:
+        """Point `uid` at `instance`; returns its previous PLC if nothing else uses that one. Caller holds the registry lock."""
+        instance._users.add(uid)
+        previous_key = cls.__machines.get(uid)
+        cls.__machines[uid] = instance._key
+        if previous_key is None or previous_key == instance._key:
+            return None
+        previous = cls.__instances.get(previous_key)
+        if previous is None:
+            return None
+        previous._users.discard(uid)
+        if previous._users:
+            return None
+        del cls.__instances[previous_key]
+        return previous
+
+    @classmethod
+    def release_machine(cls, uid: str) -> Optional[str]:
+        """Drop `uid`'s claim on its PLC and close the PLC if no other machine uses it; returns the closed key"""
+        with cls.__instances_lock:
+            key = cls.__machines.pop(uid, None)
+            instance = cls.__instances.get(key)
+            if instance is None:
+                return None
+            instance._users.discard(uid)
+            if instance._users:
+                return None
+            del cls.__instances[key]
+        instance.close()
+        return key
+
+    @classmethod
+    def registry_stats(cls) -> Dict[str, dict]:
+        now = time.monotonic()
+        with cls.__instances_lock:
+            instances = list(cls.__instances.values())
+        return {
+            instance._key: {
+                "machines": sorted(instance._users),
+                "online": instance.is_online,
+                "connected": instance._plc is not None,
+                "idle_seconds": round(now - instance._last_used, 1)
+            }
+            for instance in instances
+        }
+
+    @classmethod
+    def request_stats(cls) -> Dict[str, dict]:
+        """Request-queue owner and waiters plus debounce cache size of every PLC"""
+        with cls.__instances_lock:
+            instances = list(cls.__instances.values())
+        return {
+            instance._key: dict(
+                instance._request_queue.stats(),
+                breaker=instance._breaker.state,
+                breaker_failures=instance._breaker.failures,
+                cache_entries=len(instance.__signal_cache),
+                block_connections=len(instance._block_clients)
+            )
+            for instance in instances
+        }
+
+    @classmethod
+    def __start_reaper(cls) -> None:
+        if cls.__reaper is None:
+            cls.__reaper = threading.Thread(target=cls.__reap_loop, name="plc-reaper", daemon=True)
+            cls.__reaper.start()
+
+    @classmethod
+    def __reap_loop(cls) -> None:
+        while True:
+            cls.__reaper_wakeup.wait(REAP_INTERVAL)
+            cls.__reaper_wakeup.clear()
+            try:
+                cls.reap()
+            except Exception as e:
+                logger.error(f"Error reaping PLC connections: {str(e)}")
+
+    @classmethod
+    def reap(cls, idle_timeout: float = None, max_connections: int = None) -> None:
+        """Disconnect idle and least recently used connections, forgetting PLCs no machine has claimed"""
+        idle_timeout = PLC_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        max_connections = MAX_PLC_CONNECTIONS if max_connections is None else max_connections
+        now = time.monotonic()
+        with cls.__instances_lock:
+            instances = list(cls.__instances.values())
+
+        connected = sorted((i for i in instances if i._plc is not None), key=lambda i: i._last_used)
+        excess = set(connected[:max(0, len(connected) - max_connections)])
+        for instance in instances:
+            if instance not in excess and now - instance._last_used <= idle_timeout:
+                continue
+            if instance._users:
+                if instance._plc is not None:
+                    instance._disconnect_idle()
+                continue
+            with cls.__instances_lock:
+                if cls.__instances.get(instance._key) is not instance or instance._users:
+                    continue
+                del cls.__instances[instance._key]
+            logger.info(f"Dropping unused PLC {instance._key}")
+            instance.close()
+
+    def close(self) -> None:
+        """Disconnect for good; requests on this instance fail from now on"""
+        self._closed.set()
+        if not self._teardown(wait=False):
+            # A request still holds the clients; tear them down once it lets go
+            threading.Thread(target=self._teardown, name=f"plc-close-{self._key}", daemon=True).start()
+
+    def _teardown(self, wait: bool = True) -> bool:
+        """Destroy the clients once the request queue is held; False if it could not be had without `wait`"""
+        while True:
+            try:
+                acquired = self._request_queue.acquire(priority=RequestPriority.CALL, timeout=self._request_timeout)
+            except RequestQueueFullError:
+                acquired = False
+                # Requests that were already queued drain, new ones fail on _closed
+                if wait:
+                    time.sleep(self._retry_delay)
+            if acquired:
+                break
+            if not wait:
+                return False
         try:
-            self._cleanup_connection()
-            self._plc = snap7.client.Client()
-            self._establish_connection()
-        except Exception as e:
-            raise PLCConnectionError(f"Failed to initialize connection: {str(e)}")
+            with self._reconnect_guard:
+                self._cleanup_connection()
+        finally:
+            self._request_queue.release()
+        if self._block_executor is not None:
+            self._block_executor.shutdown(wait=False)
+        logger.info(f"Closed PLC connection {self._key}")
+        return True
+
+    def _disconnect_idle(self) -> bool:
+        """Close the connection without reporting the PLC offline; the next request reconnects"""
+        try:
+            acquired = self._request_queue.acquire(priority=RequestPriority.MONITOR, timeout=0)
+        except RequestQueueFullError:
+            return False
+        if not acquired:
+            return False
+        try:
+            with self._reconnect_guard:
+                if self._reconnect_thread is not None or self._plc is None:
+                    return False
+                self._cleanup_connection()
+                self._dormant = True
+        finally:
+            self._request_queue.release()
+        logger.info(f"Disconnected idle PLC {self._key}")
+        return True
+
+    def _wake(self) -> None:
+        with self._reconnect_guard:
+            if not self._dormant:
+                return
+            self._dormant = False
+            self._first_attempt.clear()
+        self._schedule_reconnect()
     
+    @property
+    def key(self) -> str:
+        return self._key
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed.is_set()
+
+    @property
+    def is_online(self) -> bool:
+        return not self._breaker.is_open
+
+    def wait_first_attempt(self, timeout: float = None) -> bool:
+        """Block until the first background connection attempt has finished, successful or not"""
+        return self._first_attempt.wait(timeout)
+
+    def wait_online(self, timeout: float = None) -> bool:
+        """Block until the background reconnect has succeeded or `timeout` expires"""
+        return self._breaker.wait_closed(timeout)
+
+    def add_health_listener(self, listener: Callable[[bool], None]) -> None:
+        self._breaker.add_listener(listener)
+
+    def remove_health_listener(self, listener: Callable[[bool], None]) -> None:
+        self._breaker.remove_listener(listener)
+
     def _cleanup_connection(self) -> None:
+        self._close_block_clients()
         try:
             if self._plc is not None:
                 try:
@@ -66,35 +341,149 @@ class PLC:
                     except:
                         pass
                     self._plc = None
-            time.sleep(0.1)
         except Exception as e:
-            logger.warning(f"Error during connection cleanup: {str(e)}")
+            logger.warning(f"Error during connection cleanup: {str(e)}", extra={"machine_id": self._host, "error_key": "cleanup"})
             self._plc = None
-    
-    def _establish_connection(self) -> None:
-        for attempt in range(self._max_retries):
+
+    def _schedule_reconnect(self) -> None:
+        with self._reconnect_guard:
+            if self._reconnect_thread is not None or self._closed.is_set():
+                return
+            self._reconnect_thread = threading.Thread(
+                target=self._reconnect_loop,
+                name=f"plc-reconnect-{self._key}",
+                daemon=True
+            )
+            self._reconnect_thread.start()
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self._max_retry_delay, self._retry_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)
+
+    def _reconnect_loop(self) -> None:
+        try:
+            self._reconnect()
+        except Exception as e:
+            logger.error(f"Reconnect loop for PLC at {self._host} stopped: {str(e)}", extra={"machine_id": self._host, "error_key": "reconnect"})
+        finally:
+            with self._reconnect_guard:
+                # A failure after a successful connect may already have scheduled the next loop
+                if self._reconnect_thread is threading.current_thread():
+                    self._reconnect_thread = None
+
+    def _acquire_for_reconnect(self) -> bool:
+        """Wait for the request queue without giving up on a busy PLC; False once the PLC is closed"""
+        while not self._closed.is_set():
             try:
-                if self._plc is None:
-                    self._plc = snap7.client.Client()
-                
-                self._plc.connect(self._host, self._rack, self._slot)
-                
-                if not self._plc.get_connected():
+                if self._request_queue.acquire(priority=RequestPriority.CALL, timeout=self._request_timeout):
+                    return True
+            except RequestQueueFullError:
+                if self._closed.wait(self._retry_delay):
+                    return False
+        return False
+
+    def _reconnect(self) -> None:
+        attempt = 0
+        while not self._closed.is_set():
+            client = snap7.client.Client()
+            try:
+                client.connect(self._host, self._rack, self._slot)
+                if not client.get_connected():
                     raise PLCConnectionError("Connection failed")
-                    
-                logger.info(f"Successfully connected to PLC at {self._host}")
-                return
-                
             except Exception as e:
-                if attempt < self._max_retries - 1:
-                    logger.warning(f"Connection attempt {attempt + 1} failed: {str(e)}. Retrying in {self._retry_delay} seconds...")
+                try:
+                    client.destroy()
+                except:
+                    pass
+                self._first_attempt.set()
+                delay = self._backoff_delay(attempt)
+                attempt += 1
+                logger.warning(
+                    "Connection attempt %d to PLC at %s failed: %s. Retrying in %.1f seconds...",
+                    attempt, self._host, e, delay,
+                    extra={"machine_id": self._host, "error_key": "connect"}
+                )
+                if self._closed.wait(delay):
+                    return
+                continue
+
+            if not self._acquire_for_reconnect():
+                client.destroy()
+                return
+            try:
+                with self._reconnect_guard:
+                    if self._closed.is_set():
+                        client.destroy()
+                        return
                     self._cleanup_connection()
-                    time.sleep(self._retry_delay)
-                else:
-                    raise PLCConnectionError(f"Failed to connect after {self._max_retries} attempts: {str(e)}")
+                    self._plc = client
+                    self._pdu_size = self._negotiated_pdu_size(client)
+                    self._reconnect_thread = None
+                    self._breaker.record_success()
+            finally:
+                self._request_queue.release()
+            self._first_attempt.set()
+            logger.info(f"Successfully connected to PLC at {self._host}")
+            return
+
+    def _negotiated_pdu_size(self, client: snap7.client.Client) -> int:
+        try:
+            return client.get_pdu_length()
+        except Exception as e:
+            logger.warning(f"Could not read negotiated PDU size from {self._host}: {str(e)}", extra={"machine_id": self._host, "error_key": "pdu_size"})
+            return 240
+
+    def _mark_offline(self) -> None:
+        """Tear down the client and hand reconnection to the background thread. Caller holds the request queue."""
+        self._cleanup_connection()
+        with self._reconnect_guard:
+            self._breaker.record_failure()
+        self._schedule_reconnect()
+
+    def _handle_failure(self) -> None:
+        if self._plc is None or not self._plc.get_connected():
+            self._mark_offline()
+
+    def _acquire_request(self) -> None:
+        self._last_used = time.monotonic()
+        if self._closed.is_set():
+            raise PLCConnectionError(f"PLC {self._host} has been closed")
+        if self._dormant:
+            self._wake()
+        if not self._first_attempt.is_set():
+            self._first_attempt.wait(self._connect_timeout)
+        if self._breaker.is_open:
+            raise PLCOfflineError(f"PLC {self._host} is offline, reconnecting in background")
+        try:
+            acquired = self._request_queue.acquire(timeout=self._request_timeout)
+        except RequestQueueFullError as e:
+            raise PLCOperationError(f"PLC {self._host} busy: {str(e)}")
+        if not acquired:
+            raise PLCOperationError(f"Timed out waiting for PLC {self._host} after {self._request_timeout} seconds")
+        if self._plc is None or not self._plc.get_connected():
+            self._mark_offline()
+            self._request_queue.release()
+            raise PLCOfflineError(f"PLC {self._host} is offline, reconnecting in background")
+
+    @staticmethod
+    def _cache_block(area: str, db_number: int) -> str:
+        return str(db_number) if area == "DB" else area
 
-    def _get_cache_key(self, db_number: int, start_address: int, size: int, bit_address: int = None) -> str:
-        return f"{db_number}_{start_address}_{size}_{bit_address if bit_address is not None else 'none'}"
+    def _get_cache_key(self, db_number: int, start_address: int, size: int, bit_address: int = None, area: str = "DB") -> str:
+        return f"{self._cache_block(area, db_number)}_{start_address}_{size}_{bit_address if bit_address is not None else 'none'}"
+
+    def _read_area(self, area: str, db_number: int, start_address: int, size: int) -> bytearray:
+        """Read from a DB or from the I/Q/M area. Caller holds the request queue."""
+        if area == "DB":
+            return self._plc.db_read(db_number, start_address, size)
+        return self._plc.read_area(area_code(area), 0, start_address, size)
+
+    def _write_area(self, area: str, db_number: int, start_address: int, data: bytearray) -> None:
+        """Write to a DB or to the I/Q/M area. Caller holds the request queue."""
+        if area == "DB":
+            self._plc.db_write(db_number, start_address, data)
+        else:
+            self._plc.write_area(area_code(area), 0, start_address, data)
     
     def _cleanup_old_cache(self) -> None:
         current_time = time.time()
@@ -109,67 +498,79 @@ class PLC:
             sorted_cache = sorted(self.__signal_cache.items(), key=lambda x: x[1][0])
             self.__signal_cache = dict(sorted_cache[-self._signal_params['max_cache_entries']:])
 
-    def read_bool(self, db_number: int, start_address: int, bit_address: int) -> bool:
-        cache_key = self._get_cache_key(db_number, start_address, 1, bit_address)
+    def _debounce(self, cache_key: str, current_time: float, current_value: Any) -> Any:
+        """
+            Report a changed value only once it has been read `consecutive_reads`
+            times in a row, so a single glitched read does not propagate.
+
+            Cache entries are `(timestamp, reported value, candidate count, candidate)`.
+        """
+        entry = self.__signal_cache.get(cache_key)
+        if entry is None:
+            self.__signal_cache[cache_key] = (current_time, current_value, 0, current_value)
+            return current_value
+
+        _, reported, count, candidate = entry
+        if self._same_value(current_value, reported):
+            self.__signal_cache[cache_key] = (current_time, reported, 0, reported)
+            return reported
+
+        count = count + 1 if self._same_value(current_value, candidate) else 1
+        if count >= self._signal_params['consecutive_reads']:
+            self.__signal_cache[cache_key] = (current_time, current_value, 0, current_value)
+            return current_value
+        self.__signal_cache[cache_key] = (current_time, reported, count, current_value)
+        self._raw_change.seen = True
+        return reported
+
+    @staticmethod
+    def _same_value(a: Any, b: Any) -> bool:
+        if isinstance(a, float) and isinstance(b, float):
+            return abs(a - b) <= 1e-6  # Small epsilon for float comparison
+        return a == b
+
+    def take_raw_change(self) -> bool:
+        """Whether a read on this thread saw a value still waiting for its debounce since the last call"""
+        seen = getattr(self._raw_change, "seen", False)
+        self._raw_change.seen = False
+        return seen
+
+    def read_bool(self, db_number: int, start_address: int, bit_address: int, area: str = "DB") -> bool:
+        cache_key = self._get_cache_key(db_number, start_address, 1, bit_address, area)
         current_time = time.time()
         
         if cache_key in self.__signal_cache:
-            timestamp, cached_value, consecutive_reads = self.__signal_cache[cache_key]
+            timestamp, cached_value = self.__signal_cache[cache_key][:2]
             if current_time - timestamp < self._signal_params['cache_time']:
                 return cached_value
         
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
-            byte_data = self._plc.db_read(db_number, start_address, 1)
+            byte_data = self._read_area(area, db_number, start_address, 1)
             current_value = get_bool(byte_data, 0, bit_address)
             
-            if cache_key in self.__signal_cache:
-                _, prev_value, consecutive_reads = self.__signal_cache[cache_key]
-                
-                if current_value != prev_value:
-                    self.__signal_cache[cache_key] = (current_time, prev_value, 1)
-                    return prev_value
-                else:
-                    consecutive_reads += 1
-                    if consecutive_reads >= self._signal_params['consecutive_reads']:
-                        self.__signal_cache[cache_key] = (current_time, current_value, consecutive_reads)
-                        return current_value
-                    else:
-                        self.__signal_cache[cache_key] = (current_time, prev_value, consecutive_reads)
-                        return prev_value
-            else:
-                self.__signal_cache[cache_key] = (current_time, current_value, 1)
-                return current_value
+            return self._debounce(cache_key, current_time, current_value)
             
         except Exception as e:
-            logger.error(f"Read bool error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read bool error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read bool error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
             self._cleanup_old_cache()
 
-    def write_bool(self, db_number: int, start_address: int, bit_address: int, value: bool, max_retries: int = None) -> None:
+    def write_bool(self, db_number: int, start_address: int, bit_address: int, value: bool, max_retries: int = None, area: str = "DB") -> None:
         retries = max_retries if max_retries is not None else self._max_retries
         last_error = None
-        cache_key = self._get_cache_key(db_number, start_address, 1, bit_address)
+        cache_key = self._get_cache_key(db_number, start_address, 1, bit_address, area)
         
         for attempt in range(retries):
+            self._acquire_request()
             try:
-                self._lock.acquire(timeout=5.0)
-                if not self._plc or not self._plc.get_connected():
-                    self._initialize_connection()
-                
                 # Read current byte to modify the specific bit
-                current_data = self._plc.db_read(db_number, start_address, 1)
+                current_data = self._read_area(area, db_number, start_address, 1)
                 set_bool(current_data, 0, bit_address, value)
-                self._plc.db_write(db_number, start_address, current_data)
+                self._write_area(area, db_number, start_address, current_data)
                 
                 # Invalidate cache
                 if cache_key in self.__signal_cache:
@@ -179,136 +580,87 @@ class PLC:
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"Write bool attempt {attempt + 1} failed: {str(e)}")
-                self._cleanup_connection()
-                
-                if attempt < retries - 1:
-                    time.sleep(self._retry_delay)
-                else:
-                    logger.error(f"Write bool failed after {retries} attempts: {str(e)}")
-                    raise PLCOperationError(f"Write bool failed after {retries} attempts: {str(last_error)}")
+                logger.warning("Write bool attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
             finally:
-                try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+                self._request_queue.release()
+            
+            if not self.is_online:
+                raise PLCOfflineError(f"Write bool failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+        
+        logger.error("Write bool failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write bool failed after {retries} attempts: {str(last_error)}")
 
-    def read_int(self, db_number: int, start_address: int) -> int:
+    def read_int(self, db_number: int, start_address: int, area: str = "DB") -> int:
         """Read 16-bit signed integer (S7 INT type)"""
-        cache_key = self._get_cache_key(db_number, start_address, 2, None)
+        cache_key = self._get_cache_key(db_number, start_address, 2, None, area)
         current_time = time.time()
         
         if cache_key in self.__signal_cache:
-            timestamp, cached_value, consecutive_reads = self.__signal_cache[cache_key]
+            timestamp, cached_value = self.__signal_cache[cache_key][:2]
             if current_time - timestamp < self._signal_params['cache_time']:
                 return cached_value
         
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
-            byte_data = self._plc.db_read(db_number, start_address, 2)
+            byte_data = self._read_area(area, db_number, start_address, 2)
             current_value = get_int(byte_data, 0)
             
-            # Apply the same caching logic as for bool
-            if cache_key in self.__signal_cache:
-                _, prev_value, consecutive_reads = self.__signal_cache[cache_key]
-                
-                if current_value != prev_value:
-                    self.__signal_cache[cache_key] = (current_time, prev_value, 1)
-                    return prev_value
-                else:
-                    consecutive_reads += 1
-                    if consecutive_reads >= self._signal_params['consecutive_reads']:
-                        self.__signal_cache[cache_key] = (current_time, current_value, consecutive_reads)
-                        return current_value
-                    else:
-                        self.__signal_cache[cache_key] = (current_time, prev_value, consecutive_reads)
-                        return prev_value
-            else:
-                self.__signal_cache[cache_key] = (current_time, current_value, 1)
-                return current_value
+            return self._debounce(cache_key, current_time, current_value)
             
         except Exception as e:
-            logger.error(f"Read int error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read int error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read int error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
             self._cleanup_old_cache()
 
-    def read_dint(self, db_number: int, start_address: int) -> int:
+    def read_dint(self, db_number: int, start_address: int, area: str = "DB") -> int:
         """Read 32-bit signed integer (S7 DINT type)"""
-        cache_key = self._get_cache_key(db_number, start_address, 4, None)
+        cache_key = self._get_cache_key(db_number, start_address, 4, None, area)
         current_time = time.time()
         
         if cache_key in self.__signal_cache:
-            timestamp, cached_value, consecutive_reads = self.__signal_cache[cache_key]
+            timestamp, cached_value = self.__signal_cache[cache_key][:2]
             if current_time - timestamp < self._signal_params['cache_time']:
                 return cached_value
         
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
-            byte_data = self._plc.db_read(db_number, start_address, 4)
-            current_value = get_int(byte_data, 0, 'dint')  # dint for 32-bit integer
+            byte_data = self._read_area(area, db_number, start_address, 4)
+            current_value = get_dint(byte_data, 0)
             
             # Apply caching logic
-            if cache_key in self.__signal_cache:
-                _, prev_value, consecutive_reads = self.__signal_cache[cache_key]
-                
-                if current_value != prev_value:
-                    self.__signal_cache[cache_key] = (current_time, prev_value, 1)
-                    return prev_value
-                else:
-                    consecutive_reads += 1
-                    if consecutive_reads >= self._signal_params['consecutive_reads']:
-                        self.__signal_cache[cache_key] = (current_time, current_value, consecutive_reads)
-                        return current_value
-                    else:
-                        self.__signal_cache[cache_key] = (current_time, prev_value, consecutive_reads)
-                        return prev_value
-            else:
-                self.__signal_cache[cache_key] = (current_time, current_value, 1)
-                return current_value
+            return self._debounce(cache_key, current_time, current_value)
             
         except Exception as e:
-            logger.error(f"Read dint error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read dint error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read dint error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
             self._cleanup_old_cache()
 
-    def write_int(self, db_number: int, start_address: int, value: int, max_retries: int = None, is_dint: bool = False) -> None:
+    def write_int(self, db_number: int, start_address: int, value: int, max_retries: int = None, is_dint: bool = False, area: str = "DB") -> None:
         """Write integer value to PLC (16-bit INT or 32-bit DINT)"""
         size = 4 if is_dint else 2
         retries = max_retries if max_retries is not None else self._max_retries
         last_error = None
-        cache_key = self._get_cache_key(db_number, start_address, size, None)
+        cache_key = self._get_cache_key(db_number, start_address, size, None, area)
         
         for attempt in range(retries):
+            self._acquire_request()
             try:
-                self._lock.acquire(timeout=5.0)
-                if not self._plc or not self._plc.get_connected():
-                    self._initialize_connection()
-                
                 data = bytearray(size)
                 if is_dint:
-                    set_int(data, 0, value, 'dint')
+                    set_dint(data, 0, value)
                 else:
                     set_int(data, 0, value)
                 
-                self._plc.db_write(db_number, start_address, data)
+                self._write_area(area, db_number, start_address, data)
                 
                 # Invalidate cache
                 if cache_key in self.__signal_cache:
@@ -318,83 +670,57 @@ class PLC:
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"Write int attempt {attempt + 1} failed: {str(e)}")
-                self._cleanup_connection()
-                
-                if attempt < retries - 1:
-                    time.sleep(self._retry_delay)
-                else:
-                    logger.error(f"Write int failed after {retries} attempts: {str(e)}")
-                    raise PLCOperationError(f"Write int failed after {retries} attempts: {str(last_error)}")
+                logger.warning("Write int attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
             finally:
-                try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+                self._request_queue.release()
+            
+            if not self.is_online:
+                raise PLCOfflineError(f"Write int failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+        
+        logger.error("Write int failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write int failed after {retries} attempts: {str(last_error)}")
 
-    def read_real(self, db_number: int, start_address: int) -> float:
+    def read_real(self, db_number: int, start_address: int, area: str = "DB") -> float:
         """Read 32-bit floating point value (S7 REAL type)"""
-        cache_key = self._get_cache_key(db_number, start_address, 4, None)
+        cache_key = self._get_cache_key(db_number, start_address, 4, None, area)
         current_time = time.time()
         
         if cache_key in self.__signal_cache:
-            timestamp, cached_value, consecutive_reads = self.__signal_cache[cache_key]
+            timestamp, cached_value = self.__signal_cache[cache_key][:2]
             if current_time - timestamp < self._signal_params['cache_time']:
                 return cached_value
         
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
-            byte_data = self._plc.db_read(db_number, start_address, 4)
+            byte_data = self._read_area(area, db_number, start_address, 4)
             current_value = get_real(byte_data, 0)
             
             # Apply caching logic
-            if cache_key in self.__signal_cache:
-                _, prev_value, consecutive_reads = self.__signal_cache[cache_key]
-                
-                if abs(current_value - prev_value) > 1e-6:  # Small epsilon for float comparison
-                    self.__signal_cache[cache_key] = (current_time, prev_value, 1)
-                    return prev_value
-                else:
-                    consecutive_reads += 1
-                    if consecutive_reads >= self._signal_params['consecutive_reads']:
-                        self.__signal_cache[cache_key] = (current_time, current_value, consecutive_reads)
-                        return current_value
-                    else:
-                        self.__signal_cache[cache_key] = (current_time, prev_value, consecutive_reads)
-                        return prev_value
-            else:
-                self.__signal_cache[cache_key] = (current_time, current_value, 1)
-                return current_value
+            return self._debounce(cache_key, current_time, current_value)
             
         except Exception as e:
-            logger.error(f"Read real error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read real error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read real error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
             self._cleanup_old_cache()
 
-    def write_real(self, db_number: int, start_address: int, value: float, max_retries: int = None) -> None:
+    def write_real(self, db_number: int, start_address: int, value: float, max_retries: int = None, area: str = "DB") -> None:
         """Write 32-bit floating point value (S7 REAL type)"""
         retries = max_retries if max_retries is not None else self._max_retries
         last_error = None
-        cache_key = self._get_cache_key(db_number, start_address, 4, None)
+        cache_key = self._get_cache_key(db_number, start_address, 4, None, area)
         
         for attempt in range(retries):
+            self._acquire_request()
             try:
-                self._lock.acquire(timeout=5.0)
-                if not self._plc or not self._plc.get_connected():
-                    self._initialize_connection()
-                
                 data = bytearray(4)
                 set_real(data, 0, value)
-                self._plc.db_write(db_number, start_address, data)
+                self._write_area(area, db_number, start_address, data)
                 
                 # Invalidate cache
                 if cache_key in self.__signal_cache:
@@ -404,88 +730,62 @@ class PLC:
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"Write real attempt {attempt + 1} failed: {str(e)}")
-                self._cleanup_connection()
-                
-                if attempt < retries - 1:
-                    time.sleep(self._retry_delay)
-                else:
-                    logger.error(f"Write real failed after {retries} attempts: {str(e)}")
-                    raise PLCOperationError(f"Write real failed after {retries} attempts: {str(last_error)}")
+                logger.warning("Write real attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
             finally:
-                try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+                self._request_queue.release()
+            
+            if not self.is_online:
+                raise PLCOfflineError(f"Write real failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+        
+        logger.error("Write real failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write real failed after {retries} attempts: {str(last_error)}")
 
-    def read_string(self, db_number: int, start_address: int, max_length: int = 254) -> str:
+    def read_string(self, db_number: int, start_address: int, max_length: int = 254, area: str = "DB") -> str:
         """Read string value (S7 STRING type)"""
         # S7 strings: 2 bytes header + string content
         # First byte: max length, second byte: actual length
-        cache_key = self._get_cache_key(db_number, start_address, max_length + 2, None)
+        cache_key = self._get_cache_key(db_number, start_address, max_length + 2, None, area)
         current_time = time.time()
         
         if cache_key in self.__signal_cache:
-            timestamp, cached_value, consecutive_reads = self.__signal_cache[cache_key]
+            timestamp, cached_value = self.__signal_cache[cache_key][:2]
             if current_time - timestamp < self._signal_params['cache_time']:
                 return cached_value
         
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
             # Read string header (2 bytes) to get actual length
-            header = self._plc.db_read(db_number, start_address, 2)
+            header = self._read_area(area, db_number, start_address, 2)
             actual_length = header[1]  # Second byte contains actual length
             
             # Read the entire string (header + content)
             total_size = min(actual_length + 2, max_length + 2)
-            byte_data = self._plc.db_read(db_number, start_address, total_size)
-            current_value = get_string(byte_data, 0, actual_length)
+            byte_data = self._read_area(area, db_number, start_address, total_size)
+            current_value = byte_data[2:2 + min(actual_length, max_length)].decode("latin-1")
             
             # Apply caching logic
-            if cache_key in self.__signal_cache:
-                _, prev_value, consecutive_reads = self.__signal_cache[cache_key]
-                
-                if current_value != prev_value:
-                    self.__signal_cache[cache_key] = (current_time, prev_value, 1)
-                    return prev_value
-                else:
-                    consecutive_reads += 1
-                    if consecutive_reads >= self._signal_params['consecutive_reads']:
-                        self.__signal_cache[cache_key] = (current_time, current_value, consecutive_reads)
-                        return current_value
-                    else:
-                        self.__signal_cache[cache_key] = (current_time, prev_value, consecutive_reads)
-                        return prev_value
-            else:
-                self.__signal_cache[cache_key] = (current_time, current_value, 1)
-                return current_value
+            return self._debounce(cache_key, current_time, current_value)
             
         except Exception as e:
-            logger.error(f"Read string error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read string error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read string error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
             self._cleanup_old_cache()
 
-    def write_string(self, db_number: int, start_address: int, value: str, max_length: int = 254, max_retries: int = None) -> None:
+    def write_string(self, db_number: int, start_address: int, value: str, max_length: int = 254, max_retries: int = None, area: str = "DB") -> None:
         """Write string value (S7 STRING type)"""
         retries = max_retries if max_retries is not None else self._max_retries
         last_error = None
-        cache_key = self._get_cache_key(db_number, start_address, max_length + 2, None)
+        cache_key = self._get_cache_key(db_number, start_address, max_length + 2, None, area)
         
         for attempt in range(retries):
+            self._acquire_request()
             try:
-                self._lock.acquire(timeout=5.0)
-                if not self._plc or not self._plc.get_connected():
-                    self._initialize_connection()
-                
                 # Prepare string data with header
                 str_length = min(len(value), max_length)
                 data = bytearray(str_length + 2)  # 2 bytes for header
@@ -496,7 +796,7 @@ class PLC:
                 for i, char in enumerate(value[:str_length]):
                     data[i + 2] = ord(char)
                 
-                self._plc.db_write(db_number, start_address, data)
+                self._write_area(area, db_number, start_address, data)
                 
                 # Invalidate cache
                 if cache_key in self.__signal_cache:
@@ -506,75 +806,388 @@ class PLC:
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"Write string attempt {attempt + 1} failed: {str(e)}")
-                self._cleanup_connection()
-                
-                if attempt < retries - 1:
-                    time.sleep(self._retry_delay)
-                else:
-                    logger.error(f"Write string failed after {retries} attempts: {str(e)}")
-                    raise PLCOperationError(f"Write string failed after {retries} attempts: {str(last_error)}")
+                logger.warning("Write string attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
             finally:
+                self._request_queue.release()
+            
+            if not self.is_online:
+                raise PLCOfflineError(f"Write string failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+        
+        logger.error("Write string failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write string failed after {retries} attempts: {str(last_error)}")
+
+    @staticmethod
+    def encode(signal_type: str, value: Any, max_length: int = 254) -> bytearray:
+        """PLC representation of a non-bool value, as written by the matching write_* method"""
+        if signal_type == "int":
+            data = bytearray(2)
+            set_int(data, 0, value)
+        elif signal_type == "dint":
+            data = bytearray(4)
+            set_dint(data, 0, value)
+        elif signal_type == "real":
+            data = bytearray(4)
+            set_real(data, 0, value)
+        elif signal_type == "string":
+            str_length = min(len(value), max_length)
+            data = bytearray([max_length, str_length]) + bytearray(ord(char) for char in value[:str_length])
+        else:
+            raise ValueError(f"Unsupported signal type: {signal_type}")
+        return data
+
+    def _plan_multi_write(self, items: List[Tuple[int, int, Any, int]]) -> Tuple[List[list], List[tuple]]:
+        """Merge byte writes into contiguous runs (later items win) and pack them with the bit writes into requests"""
+        byte_values: Dict[Tuple[str, int, int], int] = {}
+        variables = []
+        for item in items:
+            db_number, start_address, data, bit_address = item[:4]
+            area = item_area(item, 4)
+            if bit_address is not None:
+                variables.append((S7WLBit, area, db_number, start_address * 8 + bit_address, bytearray([1 if data else 0])))
+                continue
+            for index, byte in enumerate(data):
+                byte_values[(area, db_number, start_address + index)] = byte
+
+        runs = []
+        for area, db_number, address in sorted(byte_values):
+            value = byte_values[(area, db_number, address)]
+            if runs and runs[-1][:2] == (area, db_number) and runs[-1][2] + len(runs[-1][3]) == address:
+                runs[-1][3].append(value)
+            else:
+                runs.append((area, db_number, address, bytearray([value])))
+        variables = [(S7WLByte, area, db_number, address, data) for area, db_number, address, data in runs] + variables
+
+        budget = self._pdu_size - WRITE_PDU_OVERHEAD + MULTI_WRITE_ITEM_OVERHEAD
+        requests, oversized = [], []
+        for variable in variables:
+            cost = MULTI_WRITE_ITEM_OVERHEAD + len(variable[4]) + len(variable[4]) % 2
+            if cost > budget:
+                oversized.append(variable)
+                continue
+            if not requests or len(requests[-1]) >= MAX_MULTI_VARS or sum(c for c, _ in requests[-1]) + cost > budget:
+                requests.append([])
+            requests[-1].append((cost, variable))
+        return [[variable for _, variable in request] for request in requests], oversized
+
+    def _write_multi_request(self, variables: List[tuple]) -> None:
+        items = (S7DataItem * len(variables))()
+        buffers = []
+        for item, (word_len, area, db_number, start, data) in zip(items, variables):
+            buffer = (c_uint8 * len(data)).from_buffer(data)
+            buffers.append(buffer)
+            item.Area = area_code(area).value
+            item.WordLen = word_len
+            item.DBNumber = db_number if area == "DB" else 0
+            item.Start = start
+            item.Amount = len(data)
+            item.pData = cast(buffer, POINTER(c_uint8))
+        check_error(self._plc._library.Cli_WriteMultiVars(self._plc._pointer, byref(items), c_int32(len(variables))), context="client")
+        for item in items:
+            check_error(item.Result, context="client")
+
+    def _plan_multi_read(self, ranges: List[Tuple[int, int, int]]) -> Tuple[List[List[int]], List[int]]:
+        """Group range indexes into requests whose parameters and response each fit one PDU"""
+        max_items = min(MAX_MULTI_VARS, max(1, (self._pdu_size - MULTI_READ_ITEM_OVERHEAD) // MULTI_READ_ITEM_OVERHEAD))
+        budget = self._pdu_size - READ_PDU_OVERHEAD + 4
+        requests, oversized, used = [], [], 0
+        for index, range_ in enumerate(ranges):
+            size = range_[2]
+            cost = 4 + size + size % 2
+            if cost > budget:
+                oversized.append(index)
+                continue
+            if not requests or len(requests[-1]) >= max_items or used + cost > budget:
+                requests.append([])
+                used = 0
+            requests[-1].append(index)
+            used += cost
+        return requests, oversized
+
+    def _read_multi_request(self, ranges: List[Tuple[int, int, int]], buffers: List[bytearray]) -> None:
+        items = (S7DataItem * len(ranges))()
+        targets = []
+        for item, range_, buffer in zip(items, ranges, buffers):
+            db_number, start, size = range_[:3]
+            area = item_area(range_, 3)
+            target = (c_uint8 * size).from_buffer(buffer)
+            targets.append(target)
+            item.Area = area_code(area).value
+            item.WordLen = S7WLByte
+            item.DBNumber = db_number if area == "DB" else 0
+            item.Start = start
+            item.Amount = size
+            item.pData = cast(target, POINTER(c_uint8))
+        check_error(self._plc._library.Cli_ReadMultiVars(self._plc._pointer, byref(items), c_int32(len(ranges))), context="client")
+        for item in items:
+            check_error(item.Result, context="client")
+
+    def read_ranges(self, ranges: List[Tuple[int, int, int]]) -> List[bytearray]:
+        """
+            Read `(db_number, start_address, size)` ranges with as few requests
+            as possible, holding the request queue for all of them. A fourth
+            element selects the area (see AREAS) of ranges outside the DBs.
+
+            Ranges that fit one PDU together are read in a single request and
+            so come from the same PLC cycle; larger ranges fall back to block
+            reads.
+        """
+        buffers = [bytearray(range_[2]) for range_ in ranges]
+        if not ranges:
+            return buffers
+        requests, oversized = self._plan_multi_read(ranges)
+
+        self._acquire_request()
+        try:
+            for indexes in requests:
+                self._read_multi_request([ranges[i] for i in indexes], [buffers[i] for i in indexes])
+            for index in oversized:
+                db_number, start_address, size = ranges[index][:3]
+                jobs = self._split_block(size, max(1, self._pdu_size - READ_PDU_OVERHEAD))
+                self._run_block_jobs(self._read_chunk, db_number, start_address, buffers[index], jobs, item_area(ranges[index], 3))
+            return buffers
+        except Exception as e:
+            logger.error("Read ranges error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
+            raise PLCOperationError(f"Read ranges error: {str(e)}")
+        finally:
+            self._request_queue.release()
+
+    def write_multi(self, items: List[Tuple[int, int, Any, int]], max_retries: int = None) -> None:
+        """
+            Write several values with as few requests as possible.
+
+            Items are `(db_number, start_address, data, bit_address)`, with the
+            area as a fifth element for items outside the DBs. With a bit
+            address `data` is the bool value and only that bit is written,
+            otherwise `data` holds the encoded bytes (see `encode`). Adjacent
+            byte writes are merged and up to MAX_MULTI_VARS variables share
+            one request.
+        """
+        if not items:
+            return
+        requests, oversized = self._plan_multi_write(items)
+        retries = max_retries if max_retries is not None else self._max_retries
+        last_error = None
+
+        for attempt in range(retries):
+            self._acquire_request()
+            try:
+                for variables in requests:
+                    self._write_multi_request(variables)
+                for _, area, db_number, start_address, data in oversized:
+                    self._write_area(area, db_number, start_address, data)
+                for item in items:
+                    db_number, start_address, data, bit_address = item[:4]
+                    self._invalidate_range(db_number, start_address, 1 if bit_address is not None else len(data), item_area(item, 4))
+                return
+
+            except Exception as e:
+                last_error = e
+                logger.warning("Write multi attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
+            finally:
+                self._request_queue.release()
+
+            if not self.is_online:
+                raise PLCOfflineError(f"Write multi failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+
+        logger.error("Write multi failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write multi failed after {retries} attempts: {str(last_error)}")
+
+    @property
+    def pdu_size(self) -> int:
+        return self._pdu_size
+
+    def _close_block_clients(self) -> None:
+        clients, self._block_clients = self._block_clients, []
+        for client in clients:
+            try:
+                client.disconnect()
+                client.destroy()
+            except:
+                pass
+
+    def _open_block_clients(self) -> None:
+        """
+            Open the auxiliary connections for a block transfer before taking the
+            request queue, so a slow connect does not hold up other requests.
+        """
+        if self._block_connections <= 1 or len(self._block_clients) >= self._block_connections - 1 or not self.is_online:
+            return
+        with self._block_lock:
+            while len(self._block_clients) < self._block_connections - 1 and not self._closed.is_set():
+                client = snap7.client.Client()
                 try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+                    client.connect(self._host, self._rack, self._slot)
+                except Exception as e:
+                    logger.warning(f"Could not open auxiliary connection to {self._host}, using {len(self._block_clients) + 1}: {str(e)}", extra={"machine_id": self._host, "error_key": "block_connections"})
+                    try:
+                        client.destroy()
+                    except:
+                        pass
+                    break
+                # Copy on write: transfers holding the request queue iterate it without the lock
+                self._block_clients = self._block_clients + [client]
+
+    def _block_client_pool(self) -> List[snap7.client.Client]:
+        """Main client plus the auxiliary connections already open, up to `block_connections`. Caller holds the request queue."""
+        return [self._plc] + self._block_clients[:self._block_connections - 1]
+
+    @staticmethod
+    def _split_block(size: int, payload: int) -> List[Tuple[int, int]]:
+        return [(offset, min(payload, size - offset)) for offset in range(0, size, payload)]
+
+    @staticmethod
+    def _read_chunk(client: snap7.client.Client, area: str, db_number: int, start_address: int, buffer, offset: int, size: int) -> None:
+        target = (c_uint8 * size).from_buffer(buffer, offset)
+        check_error(client._library.Cli_ReadArea(
+            client._pointer, area_code(area).value, db_number if area == "DB" else 0,
+            start_address + offset, size, S7WLByte, byref(target)
+        ), context="client")
+
+    @staticmethod
+    def _write_chunk(client: snap7.client.Client, area: str, db_number: int, start_address: int, buffer, offset: int, size: int) -> None:
+        source = (c_uint8 * size).from_buffer(buffer, offset)
+        check_error(client._library.Cli_WriteArea(
+            client._pointer, area_code(area).value, db_number if area == "DB" else 0,
+            start_address + offset, size, S7WLByte, byref(source)
+        ), context="client")
+
+    def _run_block_jobs(self, transfer: Callable, db_number: int, start_address: int, buffer, jobs: List[Tuple[int, int]], area: str = "DB") -> None:
+        clients = self._block_client_pool() if len(jobs) > 1 else [self._plc]
+        if len(clients) == 1:
+            for offset, size in jobs:
+                transfer(self._plc, area, db_number, start_address, buffer, offset, size)
+            return
+
+        def run_lane(client, lane):
+            for offset, size in lane:
+                transfer(client, area, db_number, start_address, buffer, offset, size)
 
-    def plc_read(self, db_number: int, start_address: int, size: int) -> bytearray:
+        if self._block_executor is None or self._block_workers < len(clients):
+            if self._block_executor is not None:
+                self._block_executor.shutdown(wait=False)
+            self._block_workers = len(clients)
+            self._block_executor = ThreadPoolExecutor(
+                max_workers=self._block_workers,
+                thread_name_prefix=f"plc-block-{self._key}"
+            )
+        lanes = [jobs[i::len(clients)] for i in range(len(clients))]
+        futures = [self._block_executor.submit(run_lane, client, lane) for client, lane in zip(clients, lanes) if lane]
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                self._close_block_clients()
+                raise error
+
+    def read_block(self, db_number: int, start_address: int, size: int, buffer: Union[bytearray, memoryview] = None, area: str = "DB") -> Union[bytearray, memoryview]:
+        """
+            Read `size` bytes in PDU-sized jobs spread over the pooled connections.
+
+            Data is written straight into `buffer` (allocated when not given),
+            which must be writable and at least `size` bytes long.
+        """
+        if buffer is None:
+            buffer = bytearray(size)
+        elif len(buffer) < size:
+            raise ValueError(f"Buffer of {len(buffer)} bytes is too small for a {size} byte read")
+
+        jobs = self._split_block(size, max(1, self._pdu_size - READ_PDU_OVERHEAD))
+        if len(jobs) > 1:
+            self._open_block_clients()
+        self._acquire_request()
         try:
-            self._lock.acquire(timeout=5.0)
-            if not self._plc or not self._plc.get_connected():
-                self._initialize_connection()
-            
-            return self._plc.db_read(db_number, start_address, size)
+            self._run_block_jobs(self._read_chunk, db_number, start_address, buffer, jobs, area)
+            return buffer
+        except Exception as e:
+            logger.error("Read block error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
+            raise PLCOperationError(f"Read block error: {str(e)}")
+        finally:
+            self._request_queue.release()
+
+    def write_block(self, db_number: int, start_address: int, data: Union[bytes, bytearray, memoryview], area: str = "DB") -> None:
+        """Write `data` in PDU-sized jobs spread over the pooled connections"""
+        if isinstance(data, bytes) or (isinstance(data, memoryview) and data.readonly):
+            data = bytearray(data)
+
+        jobs = self._split_block(len(data), max(1, self._pdu_size - WRITE_PDU_OVERHEAD))
+        if len(jobs) > 1:
+            self._open_block_clients()
+        self._acquire_request()
+        try:
+            self._run_block_jobs(self._write_chunk, db_number, start_address, data, jobs, area)
+            self._invalidate_range(db_number, start_address, len(data), area)
+        except Exception as e:
+            logger.error("Write block error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
+            raise PLCOperationError(f"Write block error: {str(e)}")
+        finally:
+            self._request_queue.release()
+
+    def _invalidate_range(self, db_number: int, start_address: int, size: int, area: str = "DB") -> None:
+        block = self._cache_block(area, db_number)
+        for cache_key in list(self.__signal_cache.keys()):
+            key_block, key_start, key_size, _ = cache_key.split("_")
+            if key_block == block and int(key_start) < start_address + size and int(key_start) + int(key_size) > start_address:
+                self.__signal_cache.pop(cache_key, None)
+
+    def plc_read(self, db_number: int, start_address: int, size: int, area: str = "DB") -> bytearray:
+        if size > self._pdu_size - READ_PDU_OVERHEAD:
+            return self.read_block(db_number, start_address, size, area=area)
+
+        self._acquire_request()
+        try:
+            return self._read_area(area, db_number, start_address, size)
             
         except Exception as e:
-            logger.error(f"Read error: {str(e)}")
-            self._cleanup_connection()
+            logger.error("Read error: %s", e, extra={"machine_id": self._host})
+            self._handle_failure()
             raise PLCOperationError(f"Read error: {str(e)}")
         finally:
-            try:
-                self._lock.release()
-            except RuntimeError:
-                pass
+            self._request_queue.release()
     
-    def plc_write(self, db_number: int, start_address: int, data: bytearray, max_retries: int = None) -> None:
+    def plc_write(self, db_number: int, start_address: int, data: bytearray, max_retries: int = None, area: str = "DB") -> None:
         retries = max_retries if max_retries is not None else self._max_retries
         last_error = None
         
         for attempt in range(retries):
+            self._acquire_request()
             try:
-                self._lock.acquire(timeout=5.0)
-                if not self._plc or not self._plc.get_connected():
-                    self._initialize_connection()
-                
-                self._plc.db_write(db_number, start_address, data)
+                self._write_area(area, db_number, start_address, data)
                 
                 for cache_key in list(self.__signal_cache.keys()):
-                    if cache_key.startswith(f"{db_number}_{start_address}_"):
+                    if cache_key.startswith(f"{self._cache_block(area, db_number)}_{start_address}_"):
                         del self.__signal_cache[cache_key]
                         
                 return
                 
             except Exception as e:
                 last_error = e
-                logger.warning(f"Write attempt {attempt + 1} failed: {str(e)}")
-                self._cleanup_connection()
-                
-                if attempt < retries - 1:
-                    time.sleep(self._retry_delay)
-                else:
-                    logger.error(f"Write failed after {retries} attempts: {str(e)}")
-                    raise PLCOperationError(f"Write failed after {retries} attempts: {str(last_error)}")
+                logger.warning("Write attempt %d failed: %s", attempt + 1, e, extra={"machine_id": self._host})
+                self._handle_failure()
             finally:
-                try:
-                    self._lock.release()
-                except RuntimeError:
-                    pass
+                self._request_queue.release()
+            
+            if not self.is_online:
+                raise PLCOfflineError(f"Write failed, PLC {self._host} is offline: {str(last_error)}")
+            if attempt < retries - 1:
+                time.sleep(self._retry_delay)
+        
+        logger.error("Write failed after %d attempts: %s", retries, last_error, extra={"machine_id": self._host})
+        raise PLCOperationError(f"Write failed after {retries} attempts: {str(last_error)}")
     
     def __del__(self):
         """Cleanup method to properly disconnect from PLC"""
         try:
+            self._closed.set()
             self._cleanup_connection()
+            if self._block_executor is not None:
+                self._block_executor.shutdown(wait=False)
         except Exception as e:
-            logger.error(f"Error during PLC cleanup: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error during PLC cleanup: {str(e)}", extra={"machine_id": self._host, "error_key": "cleanup"})
\ No newline at end of file
@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+# Fixed poll interval of each monitor group when it has no polling configuration
+DEFAULT_INTERVALS = {
+    "on_change": 2.0,
+    "continuous": 5.0,
+    "on_trigger": 0.1,
+}
+
+
+class AdaptivePoller:
+    """
+        Poll interval of one monitor group of a machine.
+
+        Configured from `monitor_signals["polling"][group]`:
+
+            {"adaptive": true, "min_interval": 0.5, "max_interval": 30, "backoff": 2}
+
+        In adaptive mode every cycle without a changed value multiplies the
+        interval by `backoff`, up to `max_interval`; the first change drops it
+        back to `min_interval`, even one the read debounce has not confirmed
+        yet. Otherwise the group polls every `min_interval`.
+    """
+
+    __pollers: Dict[Tuple[str, str], 'AdaptivePoller'] = {}
+    __lock = threading.Lock()
+
+    def __init__(self, uid: str, group: str, config: dict = None):
+        self.uid = uid
+        self.group = group
+        self.cycles = 0
+        self.changed_cycles = 0
+        self.last_cycle = None
+        self.last_change = None
+        # Pollers are created on their monitor thread
+        self.thread_id = threading.get_ident()
+        self.configure(config)
+
+    @classmethod
+    def for_monitor(cls, uid: str, group: str, monitor_config: dict) -> 'AdaptivePoller':
+        poller = cls(uid, group, (monitor_config.get("polling") or {}).get(group))
+        with cls.__lock:
+            cls.__pollers[(uid, group)] = poller
+        return poller
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__pollers.get((self.uid, self.group)) is self:
+                del self.__pollers[(self.uid, self.group)]
+
+    @classmethod
+    def all_metrics(cls) -> Dict[str, Dict[str, dict]]:
+        with cls.__lock:
+            pollers = list(cls.__pollers.values())
+        metrics = {}
+        for poller in pollers:
+            metrics.setdefault(poller.uid, {})[poller.group] = poller.metrics()
+        return metrics
+
+    @classmethod
+    def by_thread(cls) -> Dict[int, 'AdaptivePoller']:
+        with cls.__lock:
+            return {poller.thread_id: poller for poller in cls.__pollers.values()}
+
+    def configure(self, config: dict = None) -> None:
+        config = config or {}
+        self.adaptive = bool(config.get("adaptive", False))
+        self.min_interval = max(0.05, float(config.get("min_interval", DEFAULT_INTERVALS.get(self.group, 2.0))))
+        default_max = self.min_interval * 16 if self.adaptive else self.min_interval
+        self.max_interval = max(self.min_interval, float(config.get("max_interval", default_max)))
+        self.backoff = max(1.0, float(config.get("backoff", 2.0)))
+        self.interval = self.min_interval
+
+    def record_cycle(self, changed: bool) -> float:
+        now = time.time()
+        self.cycles += 1
+        self.last_cycle = now
+        if changed:
+            self.changed_cycles += 1
+            self.last_change = now
+            self.interval = self.min_interval
+        elif self.adaptive:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
+
+    def wait(self, stop_event: threading.Event, refresh_event: threading.Event) -> None:
+        """Sleep for the current interval, returning early when the monitor is stopped or reconfigured"""
+        deadline = time.monotonic() + self.interval
+        while not stop_event.is_set() and not refresh_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            stop_event.wait(min(remaining, 0.5))
+
+    def metrics(self) -> dict:
+        return {
+            "adaptive": self.adaptive,
+            "interval": self.interval,
+            "polls_per_minute": round(60.0 / self.interval, 2) if self.interval > 0 else None,
+            "min_interval": self.min_interval,
+            "max_interval": self.max_interval,
+            "cycles": self.cycles,
+            "changed_cycles": self.changed_cycles,
+            "last_cycle": self.last_cycle,
+            "last_change": self.last_change,
+        }
@@ -0,0 +1,198 @@
+import fnmatch
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+from snap7.util import get_bool, get_dint, get_int, get_real
+from plc import AREAS, READ_PDU_OVERHEAD
+
+SIGNAL_SIZES = {
+    "bool": 1,
+    "int": 2,
+    "dint": 4,
+    "real": 4,
+}
+
+# Process images are small and read as a whole, whatever the gaps between signals
+PROCESS_IMAGE_AREAS = ("PE", "PA")
+AREA_GROUP_PREFIX = "area:"
+
+
+def signal_area(signal_config: dict) -> str:
+    area = signal_config.get("area") or "DB"
+    if area not in AREAS:
+        raise ValueError(f"Unsupported area: {area}")
+    return area
+
+
+def signal_span(signal_config: dict) -> Tuple[int, int, int]:
+    """`(db_number, offset, size)` of the bytes holding a signal; db_number is 0 outside the DBs"""
+    signal_type = signal_config.get("type")
+    if signal_type == "string":
+        size = int(signal_config.get("max_length", 254)) + 2
+    elif signal_type in SIGNAL_SIZES:
+        size = SIGNAL_SIZES[signal_type]
+    else:
+        raise ValueError(f"Unsupported signal type: {signal_type}")
+    db_number = int(signal_config.get("db_number", 0)) if signal_area(signal_config) == "DB" else 0
+    return db_number, int(signal_config["offset"]), size
+
+
+def decode_value(signal_config: dict, data: bytearray, offset: int) -> Any:
+    """Value of a signal whose bytes start at `offset` in `data`"""
+    signal_type = signal_config.get("type")
+    if signal_type == "bool":
+        return get_bool(data, offset, int(signal_config["bit_pos"]))
+    if signal_type == "int":
+        return get_int(data, offset)
+    if signal_type == "dint":
+        return get_dint(data, offset)
+    if signal_type == "real":
+        return get_real(data, offset)
+    if signal_type == "string":
+        max_length = int(signal_config.get("max_length", 254))
+        length = min(data[offset + 1], max_length)
+        return data[offset + 2:offset + 2 + length].decode("latin-1")
+    raise ValueError(f"Unsupported signal type: {signal_type}")
+
+
+class ReadPlan:
+    """
+        The fewest byte ranges covering a set of signals.
+
+        Signals of one DB (or of the marker area) closer than `max_gap` bytes
+        share a range; signals of the input and output images share one range
+        per image however far apart they are. Ranges are kept within
+        `max_range` bytes so each fits a single PDU and the plan can be read
+        with `PLC.read_ranges` in as few requests as the PLC allows. Ranges
+        outside the DBs carry their area as a fourth element.
+    """
+
+    def __init__(self, signals_config: dict, names: Iterable[str], max_gap: int = 32, max_range: int = None):
+        spans = []
+        for name in names:
+            signal_config = signals_config.get(name)
+            if signal_config is None:
+                raise ValueError(f"Invalid signal: {name}")
+            spans.append(((signal_area(signal_config),) + signal_span(signal_config), name, signal_config))
+        spans.sort(key=lambda span: span[0])
+
+        self.ranges: List[tuple] = []
+        self._layout: Dict[str, Tuple[int, int, dict]] = {}
+        last_area = None
+        for (area, db_number, offset, size), name, signal_config in spans:
+            if self.ranges and area == last_area:
+                last_db, last_start, last_size = self.ranges[-1][:3]
+                end = max(last_start + last_size, offset + size)
+                gap = offset - (last_start + last_size)
+                if (last_db == db_number and (gap <= max_gap or area in PROCESS_IMAGE_AREAS)
+                        and (max_range is None or end - last_start <= max_range)):
+                    self.ranges[-1] = (last_db, last_start, end - last_start) + self.ranges[-1][3:]
+                    self._layout[name] = (len(self.ranges) - 1, offset - last_start, signal_config)
+                    continue
+            self.ranges.append((db_number, offset, size) if area == "DB" else (db_number, offset, size, area))
+            self._layout[name] = (len(self.ranges) - 1, 0, signal_config)
+            last_area = area
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._layout)
+
+    @property
+    def signals(self) -> Dict[str, dict]:
+        return {name: signal_config for name, (_, _, signal_config) in self._layout.items()}
+
+    def decode(self, buffers: List[bytearray]) -> Dict[str, Any]:
+        return {
+            name: decode_value(signal_config, buffers[index], offset)
+            for name, (index, offset, signal_config) in self._layout.items()
+        }
+
+
+def resolve_area(signals_config: dict, area: str, catalog=None) -> List[str]:
+    """Every configured (and catalog) signal of the PE, PA or MK area, by address"""
+    if area not in AREAS or area == "DB":
+        raise ValueError(f"Unsupported area: {area}")
+    names = {
+        name: None for name, config in signals_config.items()
+        if isinstance(config, dict) and config.get("type") and config.get("area") == area
+    }
+    if catalog is not None:
+        names.update((name, None) for name, _ in catalog.in_range(0, 0, 1 << 16, area))
+    return list(names)
+
+
+def resolve_group(signals_config: dict, group: str, catalog=None) -> List[str]:
+    """
+        Signal names of a group declared in `signals_configuration["groups"]`.
+
+        Members are signal names or fnmatch patterns (`"qb_*"`, `"drive?_state"`),
+        expanded in declaration order without duplicates. With a signal
+        catalog, members also match catalog signals; patterns only scan the
+        catalog names sharing their literal prefix.
+
+        `area:PE`, `area:PA` and `area:MK` need no declaration and hold every
+        signal of the input image, output image and marker area.
+    """
+    members = (signals_config.get("groups") or {}).get(group)
+    if members is None and group.startswith(AREA_GROUP_PREFIX):
+        return resolve_area(signals_config, group[len(AREA_GROUP_PREFIX):], catalog)
+    if members is None:
+        raise ValueError(f"Invalid group: {group}")
+    if isinstance(members, str):
+        members = [members]
+    signals = [name for name, config in signals_config.items() if isinstance(config, dict) and config.get("type")]
+    names = {}
+    for member in members:
+        if member in signals_config or (catalog is not None and not any(c in member for c in "*?[") and member in catalog):
+            names[member] = None
+            continue
+        matches = fnmatch.filter(signals, member)
+        if catalog is not None:
+            prefix = re.split(r"[*?\[]", member, 1)[0]
+            matches += fnmatch.filter(catalog.names(prefix), member)
+        if not matches:
+            raise ValueError(f"Group {group} member {member} matches no signal")
+        names.update((name, None) for name in matches)
+    return list(names)
+
+
+class GroupPlans:
+    """
+        Compiled read plans of named signal groups, per machine.
+
+        A plan is rebuilt only when the machine's raw `signals_configuration`,
+        its signal catalog or its PLC's PDU size changes, so reading a group
+        costs one lookup plus the PLC requests.
+    """
+
+    __plans: Dict[Tuple[str, str], Tuple[tuple, ReadPlan]] = {}
+    __lock = threading.Lock()
+
+    @classmethod
+    def get(cls, uid: str, group: str, raw_config: str, pdu_size: int, max_gap: int = 32, catalog=None) -> ReadPlan:
+        version = (hash(raw_config), len(raw_config), pdu_size, id(catalog))
+        cached = cls.__plans.get((uid, group))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        plan = cls.compile(json.loads(raw_config), group, pdu_size, max_gap, catalog)
+        with cls.__lock:
+            cls.__plans[(uid, group)] = (version, plan)
+        return plan
+
+    @staticmethod
+    def compile(signals_config: dict, group: str, pdu_size: int, max_gap: int = 32, catalog=None) -> ReadPlan:
+        names = resolve_group(signals_config, group, catalog)
+        if catalog is not None:
+            signals_config = dict(signals_config, **catalog.signals_config(name for name in names if name not in signals_config))
+        return ReadPlan(signals_config, names, max_gap=max_gap, max_range=pdu_size - READ_PDU_OVERHEAD)
+
+    @classmethod
+    def discard(cls, uid: str) -> None:
+        with cls.__lock:
+            for key in [key for key in cls.__plans if key[0] == uid]:
+                del cls.__plans[key]
+
+    @classmethod
+    def size(cls) -> int:
+        return len(cls.__plans)
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 import os
 import redis
+import threading
 from logger_setup import LoggerSetup
 import time
 import json
@@ -35,25 +36,34 @@ class RedisDriver(object):
         serv.publish(channel, message)
 
     @classmethod
-    def thread_subscribe(cls, channel: str, callback):
+    def thread_subscribe(cls, channel: str, callback, server=None, idle_timeout: float = 30.0, ready=None):
         """
             Thread Subscriber function for redis pubsub
             Run it in thread pool or seperate thread
+
+            Blocks on the pubsub socket until a message arrives, then drains
+            every message already pending before blocking again.
         """
 
         try:
-            pubsub = cls.server.pubsub(ignore_subscribe_messages=True)
+            pubsub = (server or cls.get_server()).pubsub(ignore_subscribe_messages=True)
             pubsub.subscribe(f'{channel}')
+            if ready is not None:
+                ready.set()
             while True:
                 try:
-                    message = pubsub.get_message(timeout=0.01)
-                    if message and message.get('data'):
-                        logger.error(message['data'])
-                        json.loads(message['data'])
-                        callback(json.loads(message['data']))
+                    batch = []
+                    message = pubsub.get_message(timeout=idle_timeout)
+                    while message is not None:
+                        batch.append(message)
+                        message = pubsub.get_message(timeout=0)
+                    for message in batch:
+                        cls.__dispatch(channel, message, callback)
+                except redis.ConnectionError as e:
+                    logger.error(f"Redis connection lost on {channel}, resubscribing: {str(e)}")
+                    time.sleep(1)
                 except Exception as e:
                     logger.critical(f"Error in RedisDriver.thread_subscribe: {str(e)}")
-                time.sleep(0.00001)
         except Exception as e:
             logger.critical(f"============= CRITICAL ERROR ===============  ")
             logger.critical(f"=======================MAIN EVENT LISTENER STOPPED=========================")
@@ -62,6 +72,34 @@ class RedisDriver(object):
 
         return
 
+    @classmethod
+    def __dispatch(cls, channel: str, message: dict, callback):
+        data = message.get('data')
+        if not data:
+            return
+        try:
+            payload = json.loads(data)
+        except ValueError as e:
+            logger.error(f"Dropping malformed message on {channel}: {str(e)}")
+            return
+        logger.debug(f"Message received on {channel}")
+        try:
+            callback(payload)
+        except Exception as e:
+            logger.critical(f"Error in RedisDriver.thread_subscribe callback: {str(e)}")
+
+    @classmethod
+    def start_subscriber(cls, channel: str, callback, server=None, ready=None) -> threading.Thread:
+        thread = threading.Thread(
+            target=cls.thread_subscribe,
+            args=(channel, callback),
+            kwargs={"server": server, "ready": ready},
+            name=f"subscriber-{channel}",
+            daemon=True
+        )
+        thread.start()
+        return thread
+
     @classmethod
     def close_server(cls):
         if hasattr(cls, 'server'):
@@ -0,0 +1,143 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class RequestPriority:
+    CALL = 0
+    ACK = 1
+    MONITOR = 2
+
+
+class RequestQueueFullError(Exception):
+    pass
+
+
+_context = threading.local()
+
+
+def current_priority() -> int:
+    return getattr(_context, "priority", RequestPriority.MONITOR)
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run PLC requests issued by the current thread at the given priority"""
+    previous = getattr(_context, "priority", None)
+    _context.priority = priority
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _context.priority
+        else:
+            _context.priority = previous
+
+
+class _Waiter:
+    __slots__ = ("priority", "enqueued_at", "sequence", "thread_id")
+
+    def __init__(self, priority: int, sequence: int):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.sequence = sequence
+        self.thread_id = threading.get_ident()
+
+
+class PLCRequestQueue:
+    """
+        Exclusive access to a PLC connection, granted by priority.
+
+        Waiters are served lowest priority value first. A waiter gains one
+        priority level for every `aging_interval` seconds it has waited so
+        background requests cannot be starved by a steady stream of calls.
+    """
+
+    def __init__(self, max_depth: int = 64, aging_interval: float = 0.5):
+        self._condition = threading.Condition(threading.Lock())
+        self._waiters: List[_Waiter] = []
+        self._owner: Optional[int] = None
+        self._acquired_at: Optional[float] = None
+        self._sequence = 0
+        self._max_depth = max_depth
+        self._aging_interval = aging_interval
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> int:
+        return waiter.priority - int((now - waiter.enqueued_at) / self._aging_interval)
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        if not self._waiters:
+            return None
+        now = time.monotonic()
+        return min(
+            self._waiters,
+            key=lambda w: (self._effective_priority(w, now), w.enqueued_at, w.sequence)
+        )
+
+    def acquire(self, priority: int = None, timeout: float = None) -> bool:
+        if priority is None:
+            priority = current_priority()
+        with self._condition:
+            if self._owner is None and not self._waiters:
+                self._grant()
+                return True
+
+            if len(self._waiters) >= self._max_depth:
+                raise RequestQueueFullError(
+                    f"PLC request queue full ({self._max_depth} pending requests)"
+                )
+
+            self._sequence += 1
+            waiter = _Waiter(priority, self._sequence)
+            self._waiters.append(waiter)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while self._owner is not None or self._next_waiter() is not waiter:
+                    wait_for = self._aging_interval
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait_for = min(wait_for, remaining)
+                    self._condition.wait(wait_for)
+                self._grant()
+                return True
+            finally:
+                self._waiters.remove(waiter)
+                self._condition.notify_all()
+
+    def _grant(self) -> None:
+        self._owner = threading.get_ident()
+        self._acquired_at = time.monotonic()
+
+    def release(self) -> None:
+        with self._condition:
+            if self._owner != threading.get_ident():
+                raise RuntimeError("Cannot release a PLC request slot that is not held")
+            self._owner = None
+            self._acquired_at = None
+            self._condition.notify_all()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    def stats(self) -> dict:
+        """Current owner and waiters, for diagnostics; thread ids match `threading.get_ident()`"""
+        with self._condition:
+            now = time.monotonic()
+            return {
+                "owner": self._owner,
+                "held_seconds": None if self._acquired_at is None else now - self._acquired_at,
+                "max_depth": self._max_depth,
+                "waiters": [
+                    {
+                        "thread": waiter.thread_id,
+                        "priority": waiter.priority,
+                        "effective_priority": self._effective_priority(waiter, now),
+                        "waited_seconds": now - waiter.enqueued_at
+                    }
+                    for waiter in sorted(self._waiters, key=lambda w: w.sequence)
+                ]
+            }
@@ -0,0 +1,155 @@
+import inspect
+import queue
+import socketserver
+import threading
+import xmlrpc.server
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+BUSY_RESPONSE = b"HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+# Argument names that identify the machine a registered function acts on
+UID_PARAMETERS = ("uid", "machine_uid", "machine_id")
+BATCH_METHODS = ("system.multicall", "execute_batch")
+
+
+class RPCThreading(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class PooledXMLRPCServer(xmlrpc.server.SimpleXMLRPCServer):
+    """
+        XML-RPC server handling requests on `workers` fixed threads.
+
+        Accepted connections wait in a queue of `queue_size`; when it is full
+        the connection is answered with 503 instead of spawning yet another
+        thread. `system.multicall` and `execute_batch` run their calls on a
+        separate pool, in parallel across machines and in order per machine.
+    """
+
+    def __init__(self, addr, workers: int = 16, queue_size: int = 64, batch_workers: int = 8, **kwargs):
+        self.request_queue_size = max(self.request_queue_size, queue_size)
+        super().__init__(addr, **kwargs)
+        self._requests = queue.Queue(maxsize=queue_size)
+        self._batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix="rpc-batch")
+        self._uid_positions: Dict[str, Optional[int]] = {}
+        self._workers = [
+            threading.Thread(target=self._work, name=f"rpc-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self.register_multicall_functions()
+        self.register_function(self.execute_batch, "execute_batch")
+
+    def process_request(self, request, client_address):
+        try:
+            self._requests.put_nowait((request, client_address))
+        except queue.Full:
+            logger.warning(f"XML-RPC queue full, rejecting request from {client_address[0]}")
+            try:
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._requests.put(None)
+        self._batch_executor.shutdown(wait=False)
+
+    def pending(self) -> int:
+        return self._requests.qsize()
+
+    def _uid_position(self, method: str) -> Optional[int]:
+        if method not in self._uid_positions:
+            position = None
+            func = self.funcs.get(method)
+            if func is not None:
+                try:
+                    names = list(inspect.signature(func).parameters)
+                except (TypeError, ValueError):
+                    names = []
+                position = next((names.index(name) for name in UID_PARAMETERS if name in names), None)
+            self._uid_positions[method] = position
+        return self._uid_positions[method]
+
+    def _machine_of(self, index: int, call: dict):
+        position = self._uid_position(call.get("methodName"))
+        params = call.get("params") or []
+        if position is None or position >= len(params):
+            # Calls not tied to a machine are independent of each other
+            return ("call", index)
+        return ("machine", str(params[position]))
+
+    def _run_batch(self, calls: List[dict]) -> List[Any]:
+        """`(result, None)` or `(None, error)` per call, in call order"""
+        groups: Dict[tuple, List[int]] = {}
+        for index, call in enumerate(calls):
+            if call.get("methodName") in BATCH_METHODS:
+                raise ValueError(f"{call.get('methodName')} cannot be nested in a batch")
+            groups.setdefault(self._machine_of(index, call), []).append(index)
+        results: List[Any] = [None] * len(calls)
+
+        def run_group(indexes):
+            for index in indexes:
+                call = calls[index]
+                try:
+                    results[index] = (self._dispatch(call["methodName"], call.get("params") or []), None)
+                except Exception as e:
+                    results[index] = (None, e)
+
+        futures = [self._batch_executor.submit(run_group, indexes) for indexes in groups.values()]
+        for future in futures:
+            future.result()
+        return results
+
+    def system_multicall(self, call_list):
+        responses = []
+        for result, error in self._run_batch(call_list):
+            if error is None:
+                responses.append([result])
+            elif isinstance(error, xmlrpc.server.Fault):
+                responses.append({"faultCode": error.faultCode, "faultString": error.faultString})
+            else:
+                responses.append({"faultCode": 1, "faultString": f"{type(error)}:{error}"})
+        return responses
+
+    def execute_batch(self, calls):
+        """
+            Run several calls in one round trip, e.g.
+
+                [{"methodName": "ping", "params": ["S7PLC_001"]},
+                 {"methodName": "get_machine_config", "params": ["S7PLC_001"]}]
+
+            returning `[True, result]` or `[False, error]` per call.
+        """
+        return [
+            [True, result] if error is None else [False, str(error)]
+            for result, error in self._run_batch(calls)
+        ]
+
+
+def create_rpc_server(addr, workers: int = 0, queue_size: int = 64, batch_workers: int = 8, **kwargs):
+    """Pooled server when `workers` is set, otherwise the thread-per-request server"""
+    if workers > 0:
+        logger.info(f"XML-RPC server on {workers} workers, queue of {queue_size}")
+        return PooledXMLRPCServer(addr, workers=workers, queue_size=queue_size, batch_workers=batch_workers, **kwargs)
+    return RPCThreading(addr, **kwargs)
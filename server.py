@@ -1,17 +1,20 @@
-import xmlrpc.server, socketserver
 import os, json,yaml
 from connection.config import add_machine_config, get_machine_config, delete_machine_config
 from response import create_response
-from monitor_functions import stop_thread, StoppableThread, MONITOR_FUNCTIONS_MAP
+from monitor_functions import release_machine, stop_thread, StoppableThread, MONITOR_FUNCTIONS_MAP
 from call_functions import CALL_FUNCTIONS_MAP
 from errors import send_error
 from logger_setup import LoggerSetup
-from app import app
+from app import app, RPC_BATCH_WORKERS, RPC_QUEUE_SIZE, RPC_WORKERS, WARMUP_WORKERS
+from redis_driver import RedisDriver
+from sharding import WARMUP_CHANNEL
+from polling import AdaptivePoller
+from rpc_server import create_rpc_server
+from warmup import ConnectionWarmup
+import diagnostics
+import signal_catalog
 logger = LoggerSetup.get_logger()
 
-class RPCThreading(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer): 
-    pass
-
 class S7commServer():
     
     detail_json = None 
@@ -19,7 +22,10 @@ class S7commServer():
     
     def create_server(self):
         port = int(os.environ.get("S7comm_MACHINE_MODULE_PORT", 1029))
-        self.server = RPCThreading(("0.0.0.0", port), allow_none=True)
+        self.server = create_rpc_server(
+            ("0.0.0.0", port), workers=RPC_WORKERS, queue_size=RPC_QUEUE_SIZE,
+            batch_workers=RPC_BATCH_WORKERS, allow_none=True
+        )
         print("xmlrpc server running at", port)
         
     def yaml_loader():
@@ -69,12 +75,13 @@ class S7commServer():
     @staticmethod
     def add_machine(uid: str, machine_name: str, config: str):
         resp = add_machine_config(uid, machine_name, config)
-        StoppableThread.reconnect(uid)
+        StoppableThread.reconfigure(uid)
         return [resp, "achine added Successfully"]
     
     @staticmethod
     def delete_machine(uid: str):
         resp = delete_machine_config(uid)
+        release_machine(uid)
         return [True, resp]
     
     @staticmethod
@@ -142,9 +149,33 @@ class S7commServer():
             
     def start_server(self):
         self.server.serve_forever()
-if __name__ == '__main__':
+
+def register_module_functions(app):
     for i in CALL_FUNCTIONS_MAP:
         app.register_call_function(i, CALL_FUNCTIONS_MAP[i])
     for i in MONITOR_FUNCTIONS_MAP:
         app.register_monitor_function(i, MONITOR_FUNCTIONS_MAP[i])
+    app.add_machine_listener(StoppableThread.reconfigure)
+    app.add_removal_listener(release_machine)
+
+if __name__ == '__main__':
+    register_module_functions(app)
+    signal_catalog.preload(app.get_all_machine())
+    warmup = ConnectionWarmup(app, max_workers=WARMUP_WORKERS)
+
+    def warmup_status():
+        return warmup.status()
+
+    def monitor_metrics():
+        return AdaptivePoller.all_metrics()
+
+    app.register_xml_function(warmup_status)
+    app.register_xml_function(monitor_metrics)
+    diagnostics.register(app)
+    if app.shard_count and not app.is_worker:
+        from supervisor import WorkerSupervisor
+        RedisDriver.start_subscriber(WARMUP_CHANNEL, warmup.merge, server=app.redis_server)
+        WorkerSupervisor(app, app.shard_count).start()
+    else:
+        warmup.start()
     app.start()
\ No newline at end of file
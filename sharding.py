@@ -0,0 +1,79 @@
+import hashlib
+import json
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+READY_CHANNEL = "s7comm_shard_ready"
+WARMUP_CHANNEL = "s7comm_shard_warmup"
+
+
+def shard_for(uid: str, shard_count: int) -> int:
+    """
+        Rendezvous hash of `uid` onto `shard_count` workers.
+
+        The owner of a machine only depends on its uid and the worker count,
+        so adding or removing machines never moves the others.
+    """
+    best_shard, best_score = 0, -1
+    for shard in range(shard_count):
+        digest = hashlib.blake2b(f"{shard}:{uid}".encode(), digest_size=8).digest()
+        score = int.from_bytes(digest, "big")
+        if score > best_score:
+            best_shard, best_score = shard, score
+    return best_shard
+
+
+def shard_channel(channel: str, shard: int) -> str:
+    return f"{channel}_shard_{shard}"
+
+
+def control_channel(module_name: str, shard: int) -> str:
+    return f"{module_name}_shard_control_{shard}"
+
+
+def assignment(uids: Iterable[str], shard_count: int) -> Dict[int, List[str]]:
+    shards = {shard: [] for shard in range(shard_count)}
+    for uid in uids:
+        shards[shard_for(uid, shard_count)].append(uid)
+    return shards
+
+
+class ShardRouter:
+    """
+        Forwards call and monitor messages to the worker that owns the machine.
+
+        Monitor requests are remembered so they can be replayed when a worker
+        restarts and has lost its monitor threads.
+    """
+
+    def __init__(self, shard_count: int, publish: Callable[[str, str], None]):
+        self.shard_count = shard_count
+        self._publish = publish
+        self._monitor_requests: Dict[Tuple[str, str], Tuple[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def route(self, channel: str, message: dict) -> None:
+        uid = str(message.get("machine_id"))
+        if channel.endswith("_monitor_functions"):
+            with self._lock:
+                self._monitor_requests[(uid, message.get("function_name"))] = (channel, message)
+        self._publish(shard_channel(channel, shard_for(uid, self.shard_count)), json.dumps(message))
+
+    def replay(self, shard: int) -> int:
+        with self._lock:
+            requests = [
+                (channel, message) for (uid, _), (channel, message) in self._monitor_requests.items()
+                if shard_for(uid, self.shard_count) == shard
+            ]
+        for channel, message in requests:
+            self._publish(shard_channel(channel, shard), json.dumps(message))
+        logger.info(f"Replayed {len(requests)} monitor requests to shard {shard}")
+        return len(requests)
+
+    def forget(self, uid: str) -> None:
+        with self._lock:
+            for key in [key for key in self._monitor_requests if key[0] == uid]:
+                del self._monitor_requests[key]
@@ -0,0 +1,290 @@
+import atexit
+import json
+import os
+import re
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+MAGIC = b"S7SV"
+LAYOUT_VERSION = 1
+STATE_LIVE = 1
+STATE_RETIRED = 2
+
+# magic, layout version, state, directory length, slot count, data offset, data size, sequence
+HEADER = struct.Struct("<4sIIIIIIQ")
+SEQUENCE_OFFSET = HEADER.size - 8
+SEQUENCE = struct.Struct("<Q")
+TIMESTAMP = struct.Struct("<d")
+
+VALUE_FORMATS = {
+    "bool": "<q",
+    "int": "<q",
+    "dint": "<q",
+    "real": "<d",
+}
+
+
+def enabled() -> bool:
+    return os.environ.get("S7COMM_SHARED_VALUES", "").lower() in ("1", "true", "yes")
+
+
+def segment_name(uid: str) -> str:
+    return "s7comm_" + re.sub(r"[^A-Za-z0-9_]", "_", str(uid))
+
+
+def signal_plan(signals_config: dict) -> List[Tuple[str, str, int]]:
+    """(name, type, max_length) for every addressable signal, in a stable order"""
+    plan = []
+    for name in sorted(signals_config):
+        config = signals_config[name]
+        if isinstance(config, dict) and config.get("type"):
+            plan.append((name, config["type"], int(config.get("max_length", 254))))
+    return plan
+
+
+def build_layout(plan: List[Tuple[str, str, int]]) -> Tuple[List[dict], int]:
+    """
+        Every slot is an 8-byte timestamp followed by the value. Numbers take
+        8 bytes; strings take a 2-byte length and `max_length` bytes. Slots
+        are 8-byte aligned.
+    """
+    slots = []
+    offset = 0
+    for name, signal_type, max_length in plan:
+        size = TIMESTAMP.size + (2 + max_length if signal_type == "string" else 8)
+        slots.append({"name": name, "type": signal_type, "offset": offset, "size": size, "max_length": max_length})
+        offset += (size + 7) & ~7
+    return slots, offset
+
+
+class SharedValueTable:
+    """
+        Latest monitored values of one machine in a named shared-memory segment.
+
+        The segment starts with a fixed header, then a JSON directory of slots,
+        then the data area. Writers bump the sequence counter to an odd value,
+        write, then bump it back to even; readers retry whenever they see an
+        odd counter or a counter that moved while they copied.
+    """
+
+    __tables: Dict[str, "SharedValueTable"] = {}
+    __tables_lock = threading.Lock()
+
+    def __init__(self, uid: str, plan: List[Tuple[str, str, int]]):
+        self.uid = uid
+        self.plan = plan
+        self._lock = threading.Lock()
+        self._slots, data_size = build_layout(plan)
+        self._index = {slot["name"]: slot for slot in self._slots}
+        directory = json.dumps(self._slots).encode()
+        data_offset = (HEADER.size + len(directory) + 7) & ~7
+        name = segment_name(uid)
+        self._unlink_stale(name)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=data_offset + max(data_size, 8))
+        buf = self._shm.buf
+        buf[HEADER.size:HEADER.size + len(directory)] = directory
+        self._data_offset = data_offset
+        self._sequence = 0
+        self._retired = False
+        HEADER.pack_into(buf, 0, MAGIC, LAYOUT_VERSION, STATE_LIVE, len(directory), len(self._slots), data_offset, data_size, 0)
+        logger.info(f"Shared value table {name} created with {len(self._slots)} slots")
+
+    @staticmethod
+    def _unlink_stale(name: str) -> None:
+        # A segment left behind by a crashed process would make create fail
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return
+        stale.close()
+        stale.unlink()
+
+    @classmethod
+    def publish(cls, uid: str, signals_config: dict, samples: Dict[str, Tuple[Any, float]]) -> None:
+        if not samples:
+            return
+        plan = signal_plan(signals_config)
+        with cls.__tables_lock:
+            table = cls.__tables.get(uid)
+            if table is None or table.plan != plan:
+                if table is not None:
+                    table.retire()
+                table = cls.__tables[uid] = cls(uid, plan)
+        table.write(samples)
+
+    @classmethod
+    def owns(cls, uid: str) -> bool:
+        return uid in cls.__tables
+
+    @classmethod
+    def discard(cls, uid: str) -> None:
+        with cls.__tables_lock:
+            table = cls.__tables.pop(uid, None)
+        if table is not None:
+            table.retire()
+
+    @classmethod
+    def discard_all(cls) -> None:
+        with cls.__tables_lock:
+            tables = list(cls.__tables.values())
+            cls.__tables.clear()
+        for table in tables:
+            table.retire()
+
+    def write(self, samples: Dict[str, Tuple[Any, float]]) -> None:
+        with self._lock:
+            if self._retired:
+                return
+            buf = self._shm.buf
+            self._sequence += 1
+            SEQUENCE.pack_into(buf, SEQUENCE_OFFSET, self._sequence)
+            try:
+                for name, (value, timestamp) in samples.items():
+                    slot = self._index.get(name)
+                    if slot is None or value is None:
+                        continue
+                    self._write_slot(buf, slot, value, timestamp)
+            finally:
+                self._sequence += 1
+                SEQUENCE.pack_into(buf, SEQUENCE_OFFSET, self._sequence)
+
+    def _write_slot(self, buf, slot: dict, value: Any, timestamp: float) -> None:
+        offset = self._data_offset + slot["offset"]
+        TIMESTAMP.pack_into(buf, offset, timestamp)
+        offset += TIMESTAMP.size
+        if slot["type"] == "string":
+            encoded = str(value).encode("utf-8")[:slot["max_length"]]
+            struct.pack_into("<H", buf, offset, len(encoded))
+            buf[offset + 2:offset + 2 + len(encoded)] = encoded
+        elif slot["type"] == "real":
+            struct.pack_into("<d", buf, offset, float(value))
+        else:
+            struct.pack_into("<q", buf, offset, int(value))
+
+    def retire(self) -> None:
+        """Flag the segment so attached readers reopen, then remove it"""
+        with self._lock:
+            if self._retired:
+                return
+            self._retired = True
+        try:
+            struct.pack_into("<I", self._shm.buf, 8, STATE_RETIRED)
+            self._shm.close()
+            self._shm.unlink()
+        except (FileNotFoundError, BufferError, ValueError) as e:
+            logger.warning(f"Error retiring shared value table for {self.uid}: {e}")
+
+
+class SharedValueReader:
+    """
+        Lock-free reader for a machine's shared value table.
+
+            reader = SharedValueReader("machine-1")
+            values = reader.read()            # {signal: (value, timestamp)}
+            value, ts = reader.get("Speed")
+    """
+
+    def __init__(self, uid: str, timeout: float = 1.0):
+        self.uid = uid
+        self._timeout = timeout
+        self._shm = None
+        self._open()
+
+    @staticmethod
+    def _attach(uid: str) -> shared_memory.SharedMemory:
+        name = segment_name(uid)
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            pass
+        # Before Python 3.13 attaching registers the segment with this process'
+        # resource tracker, which would unlink it when the reader exits
+        shm = shared_memory.SharedMemory(name=name)
+        if SharedValueTable.owns(uid):
+            return shm
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+    def _open(self) -> None:
+        shm = self._attach(self.uid)
+        magic, version, state, directory_length, _, data_offset, data_size, _ = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            shm.close()
+            raise ValueError(f"Segment {segment_name(self.uid)} is not a shared value table")
+        slots = json.loads(bytes(shm.buf[HEADER.size:HEADER.size + directory_length]))
+        if self._shm is not None:
+            self._shm.close()
+        self._shm = shm
+        self._data_offset = data_offset
+        self._data_size = data_size
+        self._slots = slots
+        self._index = {slot["name"]: slot for slot in slots}
+
+    @property
+    def signals(self) -> List[str]:
+        return [slot["name"] for slot in self._slots]
+
+    def _state(self) -> int:
+        return struct.unpack_from("<I", self._shm.buf, 8)[0]
+
+    def _snapshot(self) -> bytes:
+        deadline = time.monotonic() + self._timeout
+        while True:
+            if self._state() == STATE_RETIRED:
+                self._open()
+            buf = self._shm.buf
+            before = SEQUENCE.unpack_from(buf, SEQUENCE_OFFSET)[0]
+            if not before & 1:
+                data = bytes(buf[self._data_offset:self._data_offset + self._data_size])
+                if SEQUENCE.unpack_from(buf, SEQUENCE_OFFSET)[0] == before:
+                    return data
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No consistent snapshot of {self.uid} within {self._timeout} seconds")
+            time.sleep(0)
+
+    @staticmethod
+    def _decode(data: bytes, slot: dict) -> Optional[Tuple[Any, float]]:
+        offset = slot["offset"]
+        timestamp = TIMESTAMP.unpack_from(data, offset)[0]
+        if timestamp == 0:
+            return None
+        offset += TIMESTAMP.size
+        if slot["type"] == "string":
+            length = struct.unpack_from("<H", data, offset)[0]
+            value = data[offset + 2:offset + 2 + length].decode("utf-8", errors="replace")
+        else:
+            value = struct.unpack_from(VALUE_FORMATS.get(slot["type"], "<q"), data, offset)[0]
+            if slot["type"] == "bool":
+                value = bool(value)
+        return value, timestamp
+
+    def read(self, names: Iterable[str] = None) -> Dict[str, Tuple[Any, float]]:
+        """Consistent snapshot of `names` (all signals by default); unset signals are left out"""
+        data = self._snapshot()
+        slots = self._slots if names is None else [self._index[name] for name in names if name in self._index]
+        values = {}
+        for slot in slots:
+            sample = self._decode(data, slot)
+            if sample is not None:
+                values[slot["name"]] = sample
+        return values
+
+    def get(self, name: str) -> Optional[Tuple[Any, float]]:
+        return self.read([name]).get(name)
+
+    def close(self) -> None:
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+atexit.register(SharedValueTable.discard_all)
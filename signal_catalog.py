@@ -0,0 +1,559 @@
+import argparse
+import csv
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+MAGIC = b"S7SC"
+CATALOG_VERSION = 1
+
+# magic, version, signal count, records offset, strings offset, strings size,
+# address index offset, DB directory offset, DB directory entries
+HEADER = struct.Struct("<4sIIIIIIII")
+# name offset, name length, db number, byte offset, type code, bit, max length, area code
+RECORD = struct.Struct("<IHHIBBHB3x")
+ADDRESS_ENTRY = struct.Struct("<I")
+# area code, db number, first address index entry, entry count
+DB_ENTRY = struct.Struct("<BxHII")
+
+TYPE_CODES = {"bool": 1, "int": 2, "dint": 3, "real": 4, "string": 5}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+AREA_CODES = {"DB": 0, "PE": 1, "PA": 2, "MK": 3}
+AREA_NAMES = {code: name for name, code in AREA_CODES.items()}
+
+# S7 data types the module can read, by their TIA / STEP 7 names
+S7_TYPES = {"bool": "bool", "int": "int", "dint": "dint", "real": "real", "string": "string"}
+
+ADDRESS_PATTERNS = (
+    (re.compile(r"^%?DB(\d+)\.DB([XBWD])(\d+)(?:\.([0-7]))?$", re.I), None),
+    (re.compile(r"^%?([IE])([XBWD]?)(\d+)(?:\.([0-7]))?$", re.I), "PE"),
+    (re.compile(r"^%?([QA])([XBWD]?)(\d+)(?:\.([0-7]))?$", re.I), "PA"),
+    (re.compile(r"^%?(M)([XBWD]?)(\d+)(?:\.([0-7]))?$", re.I), "MK"),
+)
+
+
+def parse_type(data_type: str) -> Tuple[Optional[str], int]:
+    """`(signal type, max_length)` of an S7 data type name, type None when the module cannot read it"""
+    data_type = (data_type or "").strip().strip('"')
+    match = re.match(r"^(w?string)\s*(?:\[\s*(\d+)\s*\])?$", data_type, re.I)
+    if match:
+        if match.group(1).lower() != "string":
+            return None, 0
+        return "string", int(match.group(2) or 254)
+    return S7_TYPES.get(data_type.lower()), 0
+
+
+def parse_address(address: str) -> Optional[Tuple[str, int, int, Optional[int]]]:
+    """`(area, db_number, offset, bit)` of `%DB10.DBX4.1`, `%DB10.DBW2`, `%I0.3`, `%MW20`..."""
+    address = (address or "").strip().replace(" ", "")
+    for pattern, area in ADDRESS_PATTERNS:
+        match = pattern.match(address)
+        if match is None:
+            continue
+        if area is None:
+            db_number, size, offset, bit = match.groups()
+            return "DB", int(db_number), int(offset), int(bit) if bit is not None else None
+        _, size, offset, bit = match.groups()
+        return area, 0, int(offset), int(bit) if bit is not None else None
+    return None
+
+
+def make_signal(signal_type: str, area: str, db_number: int, offset: int, bit: Optional[int], max_length: int) -> dict:
+    config = {"type": signal_type, "db_number": db_number, "offset": offset}
+    if signal_type == "bool":
+        config["bit_pos"] = bit or 0
+    if signal_type == "string":
+        config["max_length"] = max_length or 254
+    if area != "DB":
+        config["area"] = area
+    return config
+
+
+def tag_from_columns(name: str, data_type: str, address: str) -> Optional[dict]:
+    signal_type, max_length = parse_type(data_type)
+    location = parse_address(address)
+    if not name or signal_type is None or location is None:
+        return None
+    area, db_number, offset, bit = location
+    return make_signal(signal_type, area, db_number, offset, bit, max_length)
+
+
+def read_csv_tags(source: io.TextIOBase) -> Iterator[Tuple[str, dict]]:
+    """
+        Tags of a CSV tag table: either a TIA Portal / STEP 7 export with
+        name, data type and logical address columns, or explicit
+        `name,type,db_number,offset,bit_pos,max_length` columns.
+    """
+    sample = source.read(8192)
+    source.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(source, dialect)
+    header = [column.strip().strip('"').lower() for column in next(reader, [])]
+
+    def column(*names):
+        return next((header.index(name) for name in names if name in header), None)
+
+    name_col = column("name", "tag", "symbol")
+    type_col = column("data type", "datatype", "type")
+    address_col = column("logical address", "address", "logicaladdress")
+    if name_col is None or type_col is None:
+        raise ValueError(f"Unrecognized tag table header: {header}")
+    explicit = {key: column(key) for key in ("db_number", "offset", "bit_pos", "max_length", "area")}
+
+    for row in reader:
+        if len(row) <= max(name_col, type_col):
+            continue
+        name = row[name_col].strip().strip('"')
+        if address_col is not None and address_col < len(row) and row[address_col].strip():
+            config = tag_from_columns(name, row[type_col], row[address_col])
+        elif explicit["db_number"] is not None and explicit["offset"] is not None:
+            def value(key, default=None):
+                index = explicit[key]
+                return row[index].strip() if index is not None and index < len(row) and row[index].strip() else default
+            signal_type, max_length = parse_type(row[type_col])
+            if signal_type is None:
+                continue
+            bit = value("bit_pos")
+            config = make_signal(
+                signal_type, value("area", "DB").upper(), int(value("db_number", 0)), int(value("offset")),
+                int(bit) if bit is not None else None, int(value("max_length", max_length or 254))
+            )
+        else:
+            config = None
+        if config is not None:
+            yield name, config
+
+
+def read_xml_tags(source) -> Iterator[Tuple[str, dict]]:
+    """Tags of a TIA Openness tag table export (`SW.Tags.PlcTag` with Name, DataTypeName and LogicalAddress)"""
+    for _, element in ET.iterparse(source, events=("end",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag not in ("PlcTag", "SW.Tags.PlcTag", "Tag"):
+            continue
+        fields = dict(element.attrib)
+        for child in element.iter():
+            child_tag = child.tag.rsplit("}", 1)[-1]
+            if child_tag in ("Name", "DataTypeName", "DataType", "LogicalAddress") and child.text:
+                fields.setdefault(child_tag, child.text.strip())
+        config = tag_from_columns(
+            fields.get("Name", ""),
+            fields.get("DataTypeName") or fields.get("DataType", ""),
+            fields.get("LogicalAddress", "")
+        )
+        if config is not None:
+            yield fields["Name"], config
+        element.clear()
+
+
+# Byte size of the S7 elementary types in a standard (non-optimized) DB
+DB_TYPE_SIZES = {
+    "byte": 1, "char": 1, "sint": 1, "usint": 1,
+    "int": 2, "word": 2, "uint": 2, "date": 2, "s5time": 2, "wchar": 2,
+    "dint": 4, "dword": 4, "udint": 4, "real": 4, "time": 4, "time_of_day": 4, "tod": 4,
+    "lreal": 8, "lint": 8, "lword": 8, "ulint": 8, "date_and_time": 8, "dt": 8, "ltime": 8,
+    "dtl": 12,
+}
+
+DB_DECLARATION = re.compile(r"^\s*\"?([A-Za-z_][\w]*)\"?\s*(?:\{[^}]*\})?\s*:\s*(.+?)\s*(?::=.*)?;?\s*$")
+DB_ARRAY = re.compile(r"^array\s*\[\s*(-?\d+)\s*\.\.\s*(-?\d+)\s*\]\s*of\s+(.+)$", re.I)
+
+
+class _DBLayout:
+    """Byte/bit cursor following the S7 rules for standard DBs"""
+
+    def __init__(self):
+        self.bit = 0
+
+    def align_byte(self) -> None:
+        self.bit = (self.bit + 7) // 8 * 8
+
+    def align_word(self) -> None:
+        self.align_byte()
+        if (self.bit // 8) % 2:
+            self.bit += 8
+
+    def take_bool(self) -> Tuple[int, int]:
+        position = (self.bit // 8, self.bit % 8)
+        self.bit += 1
+        return position
+
+    def take(self, size: int) -> int:
+        if size == 1:
+            self.align_byte()
+        else:
+            self.align_word()
+        offset = self.bit // 8
+        self.bit += size * 8
+        return offset
+
+
+def read_db_source(source: io.TextIOBase, db_number: int = None) -> Iterator[Tuple[str, dict]]:
+    """
+        Tags of a STEP 7 / TIA DB source (`DATA_BLOCK ... STRUCT ... END_STRUCT`),
+        with offsets computed like a standard DB. Members are named
+        `Block.member`, nested structs `Block.outer.inner` and arrays
+        `Block.name[i]`.
+    """
+    layout = _DBLayout()
+    path: List[str] = []
+    in_struct = False
+    block = None
+    for raw_line in source:
+        line = raw_line.split("//", 1)[0].strip()
+        if not line:
+            continue
+        upper = line.upper()
+        if upper.startswith("DATA_BLOCK"):
+            block = line[len("DATA_BLOCK"):].strip().strip('"')
+            match = re.match(r"^DB\s*(\d+)$", block, re.I)
+            if match and db_number is None:
+                db_number = int(match.group(1))
+            continue
+        if upper.startswith("BEGIN") or upper.startswith("END_DATA_BLOCK"):
+            break
+        if upper.rstrip(";") == "STRUCT" and not in_struct:
+            in_struct = True
+            continue
+        if not in_struct:
+            continue
+        if upper.startswith("END_STRUCT"):
+            layout.align_word()
+            if path:
+                path.pop()
+            else:
+                in_struct = False
+            continue
+        match = DB_DECLARATION.match(line)
+        if match is None:
+            continue
+        if db_number is None:
+            raise ValueError("DB number not found in source, pass db_number")
+        name, data_type = match.group(1), match.group(2).strip().rstrip(";").strip()
+        if data_type.upper() == "STRUCT":
+            layout.align_word()
+            path.append(name)
+            continue
+        full_name = ".".join(([block] if block else []) + path + [name])
+        array = DB_ARRAY.match(data_type)
+        if array:
+            low, high, element_type = int(array.group(1)), int(array.group(2)), array.group(3).strip()
+            layout.align_word()
+            for index in range(low, high + 1):
+                yield from _db_element(layout, f"{full_name}[{index}]", element_type, db_number)
+            layout.align_word()
+        else:
+            yield from _db_element(layout, full_name, data_type, db_number)
+
+
+def _db_element(layout: _DBLayout, name: str, data_type: str, db_number: int) -> Iterator[Tuple[str, dict]]:
+    signal_type, max_length = parse_type(data_type)
+    lowered = data_type.lower()
+    if lowered == "bool":
+        offset, bit = layout.take_bool()
+        yield name, make_signal("bool", "DB", db_number, offset, bit, 0)
+        return
+    string = re.match(r"^w?string\s*(?:\[\s*(\d+)\s*\])?$", lowered)
+    if string:
+        length = int(string.group(1) or 254)
+        size = length + 2 if lowered.startswith("string") else 2 * length + 4
+        offset = layout.take(size)
+    elif lowered in DB_TYPE_SIZES:
+        offset = layout.take(DB_TYPE_SIZES[lowered])
+    else:
+        raise ValueError(f"Unsupported DB element type for {name}: {data_type}")
+    if signal_type is not None:
+        yield name, make_signal(signal_type, "DB", db_number, offset, None, max_length)
+
+
+def read_tags(path: str, db_number: int = None) -> Iterator[Tuple[str, dict]]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".xml":
+        with open(path, "rb") as source:
+            yield from read_xml_tags(source)
+    elif extension in (".db", ".scl", ".awl", ".udt"):
+        with open(path, "r", encoding="utf-8-sig", errors="replace") as source:
+            yield from read_db_source(source, db_number)
+    else:
+        with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as source:
+            yield from read_csv_tags(source)
+
+
+def build_catalog(tags: Iterable[Tuple[str, dict]], path: str) -> int:
+    """Write `(name, signal_config)` pairs as a catalog file; returns the number of signals"""
+    entries = {}
+    for name, config in tags:
+        entries[name.encode("utf-8")] = config
+    names = sorted(entries)
+
+    strings = bytearray()
+    records = bytearray(RECORD.size * len(names))
+    addresses = []
+    for index, name in enumerate(names):
+        config = entries[name]
+        area = AREA_CODES[config.get("area", "DB")]
+        RECORD.pack_into(
+            records, index * RECORD.size, len(strings), len(name), int(config.get("db_number", 0)),
+            int(config["offset"]), TYPE_CODES[config["type"]], int(config.get("bit_pos") or 0),
+            int(config.get("max_length", 0)), area
+        )
+        strings += name
+        addresses.append((area, int(config.get("db_number", 0)), int(config["offset"]), int(config.get("bit_pos") or 0), index))
+    addresses.sort()
+
+    address_index = bytearray(ADDRESS_ENTRY.size * len(addresses))
+    directory = []
+    for position, (area, db_number, _, _, index) in enumerate(addresses):
+        ADDRESS_ENTRY.pack_into(address_index, position * ADDRESS_ENTRY.size, index)
+        if directory and directory[-1][:2] == [area, db_number]:
+            directory[-1][3] += 1
+        else:
+            directory.append([area, db_number, position, 1])
+    db_directory = b"".join(DB_ENTRY.pack(*entry) for entry in directory)
+
+    records_offset = HEADER.size
+    strings_offset = records_offset + len(records)
+    address_offset = (strings_offset + len(strings) + 3) & ~3
+    directory_offset = address_offset + len(address_index)
+    header = HEADER.pack(MAGIC, CATALOG_VERSION, len(names), records_offset, strings_offset, len(strings),
+                         address_offset, directory_offset, len(directory))
+
+    # Written aside and renamed so processes that mapped the old file keep a valid view
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(header)
+        out.write(records)
+        out.write(strings)
+        out.write(b"\0" * (address_offset - strings_offset - len(strings)))
+        out.write(address_index)
+        out.write(db_directory)
+    os.replace(temporary, path)
+    return len(names)
+
+
+class SignalCatalog:
+    """
+        Read-only, memory-mapped view of a catalog file.
+
+            catalog = SignalCatalog.load("plant.s7cat")
+            catalog.get("Line1.Press.Force")          # signal config dict
+            catalog.in_range(10, 0, 64)               # signals of DB10 bytes 0..63
+
+        Lookups binary-search the mapped indexes; only the signals asked for
+        are turned into Python objects.
+    """
+
+    __catalogs: Dict[str, Tuple[tuple, "SignalCatalog"]] = {}
+    __lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as source:
+            self._mmap = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self._count, self._records, self._strings, _,
+         self._addresses, self._directory, self._db_count) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != CATALOG_VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a signal catalog")
+
+    @classmethod
+    def load(cls, path: str) -> "SignalCatalog":
+        """Shared catalog for `path`, remapped when the file is replaced"""
+        stat = os.stat(path)
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = cls.__catalogs.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with cls.__lock:
+            cached = cls.__catalogs.get(path)
+            if cached is None or cached[0] != version:
+                catalog = cls(path)
+                cls.__catalogs[path] = (version, catalog)
+                logger.info(f"Mapped signal catalog {path} with {len(catalog)} signals")
+            return cls.__catalogs[path][1]
+
+    @classmethod
+    def for_machine(cls, machine_config: dict) -> Optional["SignalCatalog"]:
+        path = (machine_config or {}).get("signal_catalog")
+        return cls.load(path) if path else None
+
+    @classmethod
+    def loaded(cls) -> Dict[str, int]:
+        """Signal count of every mapped catalog"""
+        return {path: len(catalog) for path, (_, catalog) in list(cls.__catalogs.items())}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name.encode("utf-8")) is not None
+
+    def _name(self, index: int) -> bytes:
+        name_offset, name_length = struct.unpack_from("<IH", self._mmap, self._records + index * RECORD.size)
+        start = self._strings + name_offset
+        return self._mmap[start:start + name_length]
+
+    def _config(self, index: int) -> dict:
+        _, _, db_number, offset, type_code, bit, max_length, area = RECORD.unpack_from(self._mmap, self._records + index * RECORD.size)
+        return make_signal(TYPE_NAMES[type_code], AREA_NAMES[area], db_number, offset, bit, max_length)
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, key: bytes) -> Optional[int]:
+        index = self._lower_bound(key)
+        if index < self._count and self._name(index) == key:
+            return index
+        return None
+
+    def get(self, name: str) -> Optional[dict]:
+        index = self._find(name.encode("utf-8"))
+        return None if index is None else self._config(index)
+
+    def names(self, prefix: str = "") -> Iterator[str]:
+        """Signal names in sorted order, starting with `prefix`"""
+        key = prefix.encode("utf-8")
+        for index in range(self._lower_bound(key), self._count):
+            name = self._name(index)
+            if not name.startswith(key):
+                return
+            yield name.decode("utf-8")
+
+    def _db_slice(self, area: int, db_number: int) -> Tuple[int, int]:
+        low, high = 0, self._db_count
+        while low < high:
+            middle = (low + high) // 2
+            entry_area, entry_db, start, count = DB_ENTRY.unpack_from(self._mmap, self._directory + middle * DB_ENTRY.size)
+            if (entry_area, entry_db) < (area, db_number):
+                low = middle + 1
+            elif (entry_area, entry_db) > (area, db_number):
+                high = middle
+            else:
+                return start, count
+        return 0, 0
+
+    def _address_record(self, position: int) -> int:
+        return ADDRESS_ENTRY.unpack_from(self._mmap, self._addresses + position * ADDRESS_ENTRY.size)[0]
+
+    def _offset(self, index: int) -> int:
+        return struct.unpack_from("<I", self._mmap, self._records + index * RECORD.size + 8)[0]
+
+    def in_range(self, db_number: int, start: int, end: int, area: str = "DB") -> Iterator[Tuple[str, dict]]:
+        """Signals whose byte offset lies in `[start, end)` of a DB (or of the I/Q/M area), by address"""
+        first, count = self._db_slice(AREA_CODES[area], 0 if area != "DB" else db_number)
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            if self._offset(self._address_record(middle)) < start:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, first + count):
+            index = self._address_record(position)
+            if self._offset(index) >= end:
+                return
+            yield self._name(index).decode("utf-8"), self._config(index)
+
+    def databases(self) -> List[Tuple[str, int, int]]:
+        """`(area, db_number, signal count)` of every DB in the catalog"""
+        return [
+            (AREA_NAMES[area], db_number, count)
+            for area, db_number, _, count in (
+                DB_ENTRY.unpack_from(self._mmap, self._directory + i * DB_ENTRY.size) for i in range(self._db_count)
+            )
+        ]
+
+    def signals_config(self, names: Iterable[str]) -> Dict[str, dict]:
+        """Signal configs of `names` found in the catalog, for building read plans"""
+        configs = {}
+        for name in names:
+            config = self.get(name)
+            if config is not None:
+                configs[name] = config
+        return configs
+
+
+def load_signals_config(machine_config: dict) -> dict:
+    # Machines with a signal catalog may leave signals_configuration empty
+    return json.loads(machine_config.get("signals_configuration") or "{}")
+
+
+def lookup_signal(machine_config: dict, signals_config: dict, name: str) -> Optional[dict]:
+    """Signal config from `signals_configuration`, falling back to the machine's catalog"""
+    config = signals_config.get(name)
+    if config is None and machine_config.get("signal_catalog"):
+        config = SignalCatalog.for_machine(machine_config).get(name)
+    return config
+
+
+def with_catalog(machine_config: dict, signals_config: dict, names: Iterable[str]) -> dict:
+    """`signals_config` plus the catalog entries of those `names` it does not define itself"""
+    if not machine_config.get("signal_catalog"):
+        return signals_config
+    missing = [name for name in names if name not in signals_config]
+    if not missing:
+        return signals_config
+    return dict(signals_config, **SignalCatalog.for_machine(machine_config).signals_config(missing))
+
+
+def preload(machines: Dict[str, dict]) -> None:
+    """Map the catalogs of all configured machines up front"""
+    for uid, machine_config in machines.items():
+        try:
+            SignalCatalog.for_machine(machine_config)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot map signal catalog of {uid}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile tag tables into a signal catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("import", help="Compile CSV / XML / DB source tag tables")
+    build.add_argument("sources", nargs="+")
+    build.add_argument("-o", "--output", required=True)
+    build.add_argument("--db", type=int, help="DB number for DB sources that name their DB symbolically")
+    lookup = commands.add_parser("lookup", help="Look a signal up by name, name prefix or DB range")
+    lookup.add_argument("catalog")
+    lookup.add_argument("--name")
+    lookup.add_argument("--prefix")
+    lookup.add_argument("--db", type=int)
+    lookup.add_argument("--start", type=int, default=0)
+    lookup.add_argument("--end", type=int, default=65536)
+    arguments = parser.parse_args()
+
+    if arguments.command == "import":
+        def all_tags():
+            for source in arguments.sources:
+                yield from read_tags(source, arguments.db)
+        print(f"{build_catalog(all_tags(), arguments.output)} signals written to {arguments.output}")
+    else:
+        catalog = SignalCatalog(arguments.catalog)
+        if arguments.name:
+            print(json.dumps(catalog.get(arguments.name)))
+        elif arguments.prefix is not None:
+            for name in catalog.names(arguments.prefix):
+                print(name)
+        elif arguments.db is not None:
+            for name, config in catalog.in_range(arguments.db, arguments.start, arguments.end):
+                print(name, json.dumps(config))
+        else:
+            for area, db_number, count in catalog.databases():
+                print(area, db_number, count)
@@ -0,0 +1,55 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+
+class SignalSnapshot:
+    """
+        Latest values sampled by the running monitors, per PLC.
+
+        Writers build the next buffer from the current one and swap the
+        reference in a single assignment, so readers never take a lock and
+        never observe a half-published monitor cycle.
+    """
+
+    __buffers: Dict[str, Dict[tuple, Tuple[Any, float]]] = {}
+    __lock = threading.Lock()
+
+    @staticmethod
+    def address(signal_config: dict) -> tuple:
+        return (
+            signal_config.get("area", "DB"),
+            int(signal_config.get("db_number", 0)),
+            int(signal_config.get("offset", 0)),
+            signal_config.get("type"),
+            signal_config.get("bit_pos"),
+            signal_config.get("max_length", 254),
+        )
+
+    @classmethod
+    def publish(cls, plc_key: str, samples: Dict[tuple, Tuple[Any, float]]) -> None:
+        if not samples:
+            return
+        with cls.__lock:
+            buffer = dict(cls.__buffers.get(plc_key, {}))
+            buffer.update(samples)
+            cls.__buffers[plc_key] = buffer
+
+    @classmethod
+    def get(cls, plc_key: str, signal_config: dict, max_age: float) -> Optional[Tuple[Any, float]]:
+        buffer = cls.__buffers.get(plc_key)
+        if not buffer:
+            return None
+        sample = buffer.get(cls.address(signal_config))
+        if sample is None or time.time() - sample[1] > max_age:
+            return None
+        return sample
+
+    @classmethod
+    def discard(cls, plc_key: str) -> None:
+        with cls.__lock:
+            cls.__buffers.pop(plc_key, None)
+
+    @classmethod
+    def size(cls) -> Dict[str, int]:
+        return {plc_key: len(buffer) for plc_key, buffer in cls.__buffers.items()}
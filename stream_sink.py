@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Tuple
+import redis
+from logger_setup import LoggerSetup
+
+logger = LoggerSetup.get_logger()
+
+EVENTS = "events"
+ERRORS = "errors"
+
+
+def enabled() -> bool:
+    return os.environ.get("S7COMM_STREAMS", "").lower() in ("1", "true", "yes")
+
+
+def stream_key(prefix: str, kind: str, machine_id: str = None) -> str:
+    """`s7comm:events` for every machine, `s7comm:events:<machine_id>` for one"""
+    if machine_id is None:
+        return f"{prefix}:{kind}"
+    return f"{prefix}:{kind}:{machine_id}"
+
+
+def encode_fields(payload: dict) -> Dict[str, str]:
+    # Stream fields are flat strings, so every value is stored as JSON
+    return {key: json.dumps(value) for key, value in payload.items() if value is not None}
+
+
+class StreamSink:
+    """
+        Appends monitor events and errors to Redis Streams.
+
+        Entries are buffered and written by one background thread with a
+        pipelined XADD per stream, trimmed to roughly `maxlen` entries
+        (`MAXLEN ~`) so retention stays bounded without exact trimming cost.
+        Every entry goes to the module-wide stream and, with `per_machine`,
+        to the machine's own stream. While Redis is unreachable up to
+        `max_pending` entries are kept and the oldest are dropped beyond that.
+    """
+
+    def __init__(self, server: redis.Redis, prefix: str = "s7comm", maxlen: int = 100000,
+                 per_machine: bool = True, batch_size: int = 500, flush_interval: float = 0.05,
+                 max_pending: int = 50000):
+        self._server = server
+        self.prefix = prefix
+        self.maxlen = maxlen
+        self.per_machine = per_machine
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._pending: Deque[Tuple[str, str, Dict[str, str]]] = deque()
+        self._max_pending = max_pending
+        self._condition = threading.Condition(threading.Lock())
+        self._stopped = False
+        self._in_flight = 0
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._flush_loop, name="stream-sink", daemon=True)
+        self._thread.start()
+
+    def add(self, kind: str, machine_id: str, payload: dict) -> None:
+        fields = encode_fields(dict(payload, ts=time.time()))
+        with self._condition:
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append((kind, str(machine_id), fields))
+            if len(self._pending) >= self._batch_size:
+                self._condition.notify()
+
+    def add_event(self, event_name: str, machine_id: str, response, event_type: str = "monitor") -> None:
+        self.add(EVENTS, machine_id, {
+            "event_name": event_name,
+            "event_data": response,
+            "machine_id": machine_id,
+            "event_type": event_type
+        })
+
+    def add_error(self, machine_id: str, payload: dict) -> None:
+        self.add(ERRORS, machine_id, payload)
+
+    def _take(self) -> List[Tuple[str, str, Dict[str, str]]]:
+        with self._condition:
+            if len(self._pending) < self._batch_size and not self._stopped:
+                self._condition.wait(self._flush_interval)
+            batch = []
+            while self._pending and len(batch) < self._batch_size:
+                batch.append(self._pending.popleft())
+            self._in_flight = len(batch)
+            return batch
+
+    def _requeue(self, batch) -> None:
+        with self._condition:
+            room = self._max_pending - len(self._pending)
+            if room < len(batch):
+                self.dropped += len(batch) - max(room, 0)
+                batch = batch[len(batch) - max(room, 0):]
+            self._pending.extendleft(reversed(batch))
+            self._in_flight = 0
+
+    def _write(self, batch) -> None:
+        pipe = self._server.pipeline(transaction=False)
+        for kind, machine_id, fields in batch:
+            pipe.xadd(stream_key(self.prefix, kind), fields, maxlen=self.maxlen, approximate=True)
+            if self.per_machine:
+                pipe.xadd(stream_key(self.prefix, kind, machine_id), fields, maxlen=self.maxlen, approximate=True)
+        pipe.execute()
+
+    def _flush_loop(self) -> None:
+        while True:
+            batch = self._take()
+            if not batch:
+                if self._stopped:
+                    return
+                continue
+            try:
+                self._write(batch)
+                with self._condition:
+                    self.written += len(batch)
+                    self._in_flight = 0
+            except redis.RedisError as e:
+                logger.error(f"Stream sink write failed, retrying {len(batch)} entries: {e}")
+                self._requeue(batch)
+                time.sleep(1)
+            except Exception as e:
+                logger.critical(f"Stream sink dropped {len(batch)} entries: {e}")
+                with self._condition:
+                    self.dropped += len(batch)
+                    self._in_flight = 0
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every buffered entry has been written to Redis"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify()
+        while time.monotonic() < deadline:
+            with self._condition:
+                if not self._pending and not self._in_flight:
+                    return True
+            time.sleep(self._flush_interval)
+        return False
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._condition:
+            pending = len(self._pending)
+        return {"pending": pending, "written": self.written, "dropped": self.dropped}
+
+
+class StreamConsumer:
+    """
+        Batch reader for one of the sink's streams in a consumer group.
+
+            consumer = StreamConsumer(server, "s7comm:events", "historian", "historian-1")
+            for entry_id, entry in consumer.read():
+                store(entry)
+            consumer.ack()
+
+        Entries delivered but not acknowledged before a restart are read again
+        first, so nothing is lost when a consumer goes down mid-batch.
+    """
+
+    def __init__(self, server: redis.Redis, stream: str, group: str, consumer: str,
+                 batch_size: int = 1000, block_ms: int = 1000, start_id: str = "0"):
+        self._server = server
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self._batch_size = batch_size
+        self._block_ms = block_ms
+        self._backlog_id = "0"
+        self._unacked: List[str] = []
+        self.ensure_group(start_id)
+
+    def ensure_group(self, start_id: str = "0") -> None:
+        try:
+            self._server.xgroup_create(self.stream, self.group, id=start_id, mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @staticmethod
+    def decode(fields: Dict[str, str]) -> dict:
+        return {key: json.loads(value) for key, value in fields.items()}
+
+    def read(self, count: int = None) -> List[Tuple[str, dict]]:
+        """Next batch of `(entry_id, entry)`, this consumer's unacknowledged entries first"""
+        count = count or self._batch_size
+        if self._backlog_id is not None:
+            response = self._server.xreadgroup(self.group, self.consumer, {self.stream: self._backlog_id}, count=count)
+            entries = response[0][1] if response else []
+            if entries:
+                self._backlog_id = entries[-1][0]
+                return self._track(entries)
+            self._backlog_id = None
+        response = self._server.xreadgroup(self.group, self.consumer, {self.stream: ">"}, count=count, block=self._block_ms)
+        return self._track(response[0][1] if response else [])
+
+    def _track(self, entries) -> List[Tuple[str, dict]]:
+        batch = [(entry_id, self.decode(fields)) for entry_id, fields in entries if fields]
+        self._unacked.extend(entry_id for entry_id, _ in entries)
+        return batch
+
+    def ack(self, entry_ids: Iterable[str] = None) -> int:
+        """Acknowledge `entry_ids`, or everything read so far"""
+        if entry_ids is None:
+            entry_ids, self._unacked = self._unacked, []
+        else:
+            entry_ids = list(entry_ids)
+            acked = set(entry_ids)
+            self._unacked = [entry_id for entry_id in self._unacked if entry_id not in acked]
+        if not entry_ids:
+            return 0
+        return self._server.xack(self.stream, self.group, *entry_ids)
+
+    def claim_stale(self, min_idle_ms: int = 60000) -> List[Tuple[str, dict]]:
+        """Take over entries another consumer of the group read but never acknowledged"""
+        response = self._server.xautoclaim(self.stream, self.group, self.consumer, min_idle_ms, count=self._batch_size)
+        return self._track(response[1] if len(response) > 1 else [])
@@ -0,0 +1,162 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from typing import Dict, Set
+from logger_setup import LoggerSetup
+from redis_driver import RedisDriver
+from sharding import READY_CHANNEL, WARMUP_CHANNEL, assignment, control_channel, shard_for
+
+logger = LoggerSetup.get_logger()
+
+
+def run_worker(shard: int, shard_count: int):
+    """Entry point of a worker process; owns the machines hashed onto `shard`"""
+    from app import app, WARMUP_WORKERS
+    from server import register_module_functions
+    from monitor_functions import StoppableThread, release_machine
+    from warmup import ConnectionWarmup
+    import signal_catalog
+
+    register_module_functions(app)
+    signal_catalog.preload(app.get_all_machine())
+    warmup = ConnectionWarmup(app, max_workers=WARMUP_WORKERS, owns=lambda uid: shard_for(uid, shard_count) == shard)
+    warmup.add_listener(lambda status: app.publish_to_some_other_topic(
+        WARMUP_CHANNEL, json.dumps({"shard": shard, "machines": status})
+    ))
+    warmup.start()
+
+    def handle_control(message):
+        action = message.get("action")
+        uid = message.get("uid")
+        if action == "remove_machine":
+            release_machine(uid)
+        elif action == "reconfigure":
+            StoppableThread.reconfigure(uid)
+
+    control_ready = threading.Event()
+    RedisDriver.start_subscriber(control_channel(app.module_name, shard), handle_control, server=app.redis_server, ready=control_ready)
+    for ready in app.subscriptions_ready + [control_ready]:
+        ready.wait(10)
+    app.publish_to_some_other_topic(READY_CHANNEL, json.dumps({"shard": shard, "pid": os.getpid()}))
+    logger.info(f"Worker {shard}/{shard_count} ready (pid {os.getpid()})")
+
+    parent = multiprocessing.parent_process()
+    while parent is None or parent.is_alive():
+        time.sleep(1)
+
+
+class WorkerSupervisor:
+    """
+        Starts one worker process per shard from the front process, restarts
+        workers that die and tells workers when machines they own are removed.
+    """
+
+    def __init__(self, app, shard_count: int, check_interval: float = 1.0, max_restart_delay: float = 30.0):
+        self._app = app
+        self._shard_count = shard_count
+        self._check_interval = check_interval
+        self._max_restart_delay = max_restart_delay
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._restarts: Dict[int, int] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._spawn_lock = threading.Lock()
+        self._machines: Set[str] = set()
+        self._config_mtime = None
+
+    def start(self) -> None:
+        self._machines = set(self._app.get_all_machine().keys())
+        for shard, uids in assignment(self._machines, self._shard_count).items():
+            logger.info(f"Shard {shard} owns {len(uids)} machines")
+            self._spawn(shard)
+        RedisDriver.start_subscriber(READY_CHANNEL, self._on_ready, server=self._app.redis_server)
+        self._app.add_machine_listener(self._on_machine_changed)
+        threading.Thread(target=self._watch, name="worker-supervisor", daemon=True).start()
+
+    def _spawn(self, shard: int) -> None:
+        # Spawned children re-import the main module, so the shard has to be in
+        # the environment before start() for app.py to build a worker manager
+        with self._spawn_lock:
+            overrides = {
+                "S7COMM_SHARD": str(shard),
+                "S7COMM_WORKERS": str(self._shard_count),
+                "LOG_FILE": os.path.join(os.getcwd(), f"system.shard{shard}.log"),
+            }
+            saved = {key: os.environ.get(key) for key in overrides}
+            os.environ.update(overrides)
+            try:
+                process = self._context.Process(
+                    target=run_worker,
+                    args=(shard, self._shard_count),
+                    name=f"s7comm-worker-{shard}",
+                    daemon=True
+                )
+                process.start()
+            finally:
+                for key, value in saved.items():
+                    if value is None:
+                        os.environ.pop(key, None)
+                    else:
+                        os.environ[key] = value
+        self._processes[shard] = process
+        logger.info(f"Started worker {shard} (pid {process.pid})")
+
+    def _on_ready(self, message):
+        shard = message.get("shard")
+        if shard not in self._processes:
+            return
+        self._restarts[shard] = 0
+        if self._app.router is not None:
+            self._app.router.replay(shard)
+
+    def _on_machine_changed(self, uid):
+        self._send_control(uid, "reconfigure")
+
+    def _send_control(self, uid, action):
+        shard = shard_for(uid, self._shard_count)
+        self._app.publish_to_some_other_topic(
+            control_channel(self._app.module_name, shard),
+            json.dumps({"action": action, "uid": uid})
+        )
+
+    def _watch(self) -> None:
+        while True:
+            try:
+                self._check_workers()
+                self._check_machines()
+            except Exception as e:
+                logger.error(f"Error in worker supervisor: {e}")
+            time.sleep(self._check_interval)
+
+    def _check_workers(self) -> None:
+        now = time.monotonic()
+        for shard, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            if shard not in self._restart_at:
+                restarts = self._restarts.get(shard, 0)
+                delay = min(self._max_restart_delay, 2 ** restarts)
+                self._restart_at[shard] = now + delay
+                logger.error(f"Worker {shard} exited with code {process.exitcode}, restarting in {delay} seconds")
+            elif now >= self._restart_at[shard]:
+                del self._restart_at[shard]
+                self._restarts[shard] = self._restarts.get(shard, 0) + 1
+                self._spawn(shard)
+
+    def _check_machines(self) -> None:
+        mtime = os.path.getmtime(self._app.config_file_path)
+        if mtime == self._config_mtime:
+            return
+        self._config_mtime = mtime
+        machines = set(self._app.get_all_machine().keys())
+        for uid in self._machines - machines:
+            logger.info(f"Machine {uid} removed, releasing it on shard {shard_for(uid, self._shard_count)}")
+            if self._app.router is not None:
+                self._app.router.forget(uid)
+            self._send_control(uid, "remove_machine")
+        if machines != self._machines:
+            counts = {shard: len(uids) for shard, uids in assignment(machines, self._shard_count).items()}
+            logger.info(f"Machine assignment updated: {counts}")
+        self._machines = machines
@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+import pytest
+from sdk_machine_module.integrator_manager import IntegratorManager
+from app import S7commIntegratorManager
+from dispatcher import CallFunctionDispatcher
+
+SIGNALS = {
+    "speed": {"type": "int", "db_number": 1, "offset": 0, "coalesce_window": 5.0},
+    "mode": {"type": "int", "db_number": 1, "offset": 2},
+    "setpoint": {"type": "int", "db_number": 1, "offset": 4, "coalesce_window": 0.3},
+}
+
+
+class StubAggregator:
+    def resolve(self, machine_id, function):
+        return 0
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """Manager without Redis or XML-RPC: the handler applies writes, responses are recorded"""
+    manager = S7commIntegratorManager.__new__(S7commIntegratorManager)
+    manager._S7commIntegratorManager__superseded = threading.local()
+    manager.error_aggregator = StubAggregator()
+    manager.get_machine_config = lambda uid: {"host": "127.0.0.1", "signals_configuration": json.dumps(SIGNALS)}
+    manager.applied = []
+    manager.responses = []
+
+    def call_function_response(message):
+        kargs = json.loads(message["args"])
+        manager.applied.append((kargs["signal"], kargs["value"]))
+        manager.send_call_function_response(
+            "send_signal_response", message["machine_id"], {"sync_id": message["sync_id"]},
+            {"success": True, "signal": kargs["signal"], "value": kargs["value"]}
+        )
+
+    def record_response(self, event_name, machine_id, sync_context, response):
+        manager.responses.append((sync_context["sync_id"], response))
+
+    manager._IntegratorManager__call_function_response = call_function_response
+    monkeypatch.setattr(IntegratorManager, "send_call_function_response", record_response)
+    return manager
+
+
+def send_signal(sync_id, signal, value):
+    return {
+        "function_name": "send_signal",
+        "machine_id": "m1",
+        "sync_id": sync_id,
+        "args": json.dumps({"signal": signal, "value": value}),
+    }
+
+
+def run(manager, messages, expected_responses, timeout=10.0):
+    dispatcher = CallFunctionDispatcher(manager._run_call_function, coalesce=manager._coalesce_key)
+    started = time.monotonic()
+    for message in messages:
+        dispatcher.submit(message)
+    while len(manager.responses) < expected_responses and time.monotonic() - started < timeout:
+        time.sleep(0.01)
+    elapsed = time.monotonic() - started
+    dispatcher.shutdown()
+    return elapsed
+
+
+def test_burst_collapses_to_last_write(manager):
+    messages = [send_signal(f"s{value}", "setpoint", value) for value in range(1, 6)]
+    run(manager, messages, expected_responses=5)
+
+    assert manager.applied == [("setpoint", 5)]
+    responses = dict(manager.responses)
+    assert set(responses) == {"s1", "s2", "s3", "s4", "s5"}
+    assert "coalesced" not in responses["s5"]
+    for sync_id in ("s1", "s2", "s3", "s4"):
+        assert responses[sync_id]["coalesced"] is True
+        assert responses[sync_id]["value"] == 5
+
+
+def test_other_signal_closes_window_early(manager):
+    messages = [send_signal("s1", "speed", 1), send_signal("s2", "speed", 2), send_signal("s3", "mode", 7)]
+    elapsed = run(manager, messages, expected_responses=3)
+
+    # The 5 s window of speed ends as soon as the write to mode is queued
+    assert elapsed < 2.0
+    assert manager.applied == [("speed", 2), ("mode", 7)]
+    responses = dict(manager.responses)
+    assert responses["s1"] == {"success": True, "signal": "speed", "value": 2, "coalesced": True}
+    assert "coalesced" not in responses["s2"]
+    assert "coalesced" not in responses["s3"]
@@ -0,0 +1,55 @@
+import ctypes
+import threading
+import time
+import pytest
+import snap7
+from plc import PLC
+
+
+@pytest.fixture
+def snap7_server():
+    server = snap7.server.Server(log=False)
+    db = (ctypes.c_uint8 * 16)()
+    server.register_area(snap7.types.srvAreaDB, 1, db)
+    server.start()
+    yield server
+    server.stop()
+    server.destroy()
+
+
+def test_release_machine_keeps_client_of_busy_request(snap7_server):
+    plc = PLC("127.0.0.1", 0, 1, uid="busy_machine", request_timeout=0.2, retry_delay=0.1)
+    assert plc.wait_online(5)
+
+    holding = threading.Event()
+    released = threading.Event()
+    seen = {}
+
+    def hold_queue():
+        plc._acquire_request()
+        try:
+            holding.set()
+            released.wait(5)
+            seen["client"] = plc._plc
+            seen["data"] = plc._read_area("DB", 1, 0, 4)
+        finally:
+            plc._request_queue.release()
+
+    holder = threading.Thread(target=hold_queue)
+    holder.start()
+    assert holding.wait(5)
+
+    PLC.release_machine("busy_machine")
+    assert plc.is_closed
+    # The holder still owns the queue, so its client must survive the close
+    assert plc._plc is not None
+
+    released.set()
+    holder.join(5)
+    assert seen["client"] is not None
+    assert bytes(seen["data"]) == bytes(4)
+
+    deadline = time.monotonic() + 5
+    while plc._plc is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert plc._plc is None
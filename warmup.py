@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+from logger_setup import LoggerSetup
+from monitor_functions import connection_params
+from plc import PLC
+
+logger = LoggerSetup.get_logger()
+
+
+class ConnectionWarmup:
+    """
+        Opens the PLC connection of every configured machine at startup so the
+        first call or monitor of a machine does not wait for it.
+
+        At most `max_workers` PLCs are connecting at any time. Machines sharing
+        a PLC share its connection. `status()` reports per machine whether the
+        PLC is `pending`, `online`, `offline` (still retrying in the background)
+        or `failed` (unusable configuration), and stays current after warm-up.
+    """
+
+    PENDING = "pending"
+    ONLINE = "online"
+    OFFLINE = "offline"
+    FAILED = "failed"
+
+    def __init__(self, app, max_workers: int = 8, timeout: float = 30.0, owns: Callable[[str], bool] = None):
+        self._app = app
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._owns = owns
+        self._status: Dict[str, str] = {}
+        self._listeners: List[Callable[[Dict[str, str]], None]] = []
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+
+    def add_listener(self, listener: Callable[[Dict[str, str]], None]) -> None:
+        """`listener(status)` is called when warm-up finishes and whenever a machine changes state afterwards"""
+        self._listeners.append(listener)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="plc-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def run(self) -> None:
+        started = time.monotonic()
+        targets: Dict[Tuple[str, int, int], List[str]] = {}
+        for uid, machine_config in self._app.get_all_machine().items():
+            if self._owns is not None and not self._owns(uid):
+                continue
+            try:
+                params = connection_params(machine_config)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Cannot warm up {uid}, invalid connection configuration: {e}", extra={"machine_id": uid, "error_key": "warmup"})
+                self._set([uid], self.FAILED, notify=False)
+                continue
+            targets.setdefault(params, []).append(uid)
+            self._set([uid], self.PENDING, notify=False)
+
+        logger.info(f"Warming up {len(targets)} PLC connections for {sum(map(len, targets.values()))} machines")
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="plc-warmup") as pool:
+            for params, uids in targets.items():
+                pool.submit(self._connect, params, uids)
+
+        status = self.status()
+        counts = {state: list(status.values()).count(state) for state in set(status.values())}
+        logger.info(f"Warm-up finished in {time.monotonic() - started:.1f} seconds: {counts}")
+        self.done.set()
+        self._notify()
+
+    def _connect(self, params: Tuple[str, int, int], uids: List[str]) -> None:
+        try:
+            for uid in uids:
+                plc = PLC(*params, uid=uid)
+            plc.wait_first_attempt(self._timeout)
+            self._set(uids, self.ONLINE if plc.is_online else self.OFFLINE, notify=False)
+            plc.add_health_listener(lambda online: self._set(uids, self.ONLINE if online else self.OFFLINE))
+        except Exception as e:
+            logger.error(f"Warm-up of {params[0]} failed: {e}", extra={"machine_id": params[0], "error_key": "warmup"})
+            self._set(uids, self.FAILED, notify=False)
+
+    def _set(self, uids: List[str], state: str, notify: bool = True) -> None:
+        with self._lock:
+            for uid in uids:
+                self._status[uid] = state
+        if notify and self.done.is_set():
+            self._notify()
+
+    def _notify(self) -> None:
+        status = self.status()
+        for listener in self._listeners:
+            try:
+                listener(status)
+            except Exception as e:
+                logger.error(f"Error in warm-up listener: {e}")
+
+    def merge(self, message: dict) -> None:
+        """Take in the `{"machines": status}` report of a worker process"""
+        with self._lock:
+            self._status.update(message.get("machines", {}))
+
+    def status(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._status)